@@ -25,8 +25,11 @@ function get_command_by_name {
       collectminio)
         command="poetry run python3 backend.py collectminio"
         ;;
+      rebuildcatalog)
+        command="poetry run python3 backend.py rebuildcatalog"
+        ;;
       *)
-        echo "usage: $0 [backend|collectstatic|worker]"
+        echo "usage: $0 [backend|collectstatic|collectminio|rebuildcatalog|worker]"
         exit 1
   esac
 }
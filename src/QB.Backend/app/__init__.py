@@ -1,6 +1,7 @@
 from flask import Flask
 from .config import Config
 from .extensions import init_extensions
+from .utils.session import init_session_interface
 
 def create_app():
     app = Flask(__name__)
@@ -12,6 +13,7 @@ def create_app():
     )
     app.config['SERVER_NAME'] = Config.SERVER_NAME
     app.config['PREFERRED_URL_SCHEME'] = 'https' if Config.BACKEND_TLS else 'http'
+    init_session_interface(app)
     # Инициализация внешних сервисов (база данных, Redis, S3)
     init_extensions(app)
 
@@ -6,6 +6,10 @@ class Config:
     SESSION_COOKIE_SECURE = os.getenv('SESSION_COOKIE_SECURE', 'True').lower() == 'true'
     SESSION_COOKIE_HTTPONLY = os.getenv('SESSION_COOKIE_HTTPONLY', 'True').lower() == 'true'
     SESSION_COOKIE_SAMESITE = os.getenv('SESSION_COOKIE_SAMESITE', 'None')
+    # Хранение сессии: cookie (подписанная cookie Flask) или redis (в cookie только идентификатор сессии)
+    SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'cookie').lower()
+    # Скользящий срок жизни сессии в Redis (секунды)
+    SESSION_LIFETIME = int(os.getenv('SESSION_LIFETIME', 86400))
     BACKEND_PORT = int(os.getenv("BACKEND_PORT", 5000))
     BACKEND_TLS = os.getenv("BACKEND_TLS", "True").lower() == "true"
     BACKEND_SSL_CERT = os.getenv("BACKEND_SSL_CERT", "/opt/app-root/etc/certificate.crt")
@@ -20,6 +24,11 @@ class Config:
     DB_PASSWORD = os.getenv("DB_PASSWORD")
     POSTGRES_SSL = os.getenv("POSTGRES_SSL", "False").lower() == "true"
     POSTGRES_CACHE_TTL = int(os.getenv("POSTGRES_CACHE_TTL", 10))
+    # Пул соединений PostgreSQL
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 1))
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 10))
+    DB_POOL_MAX_AGE = int(os.getenv("DB_POOL_MAX_AGE", 1800))  # Время жизни соединения в секундах
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 5))  # Ожидание свободного соединения в секундах
 
     # Redis
     REDIS_HOST = os.getenv("REDIS_HOST", "quotation-book-redis")
@@ -27,6 +36,25 @@ class Config:
     REDIS_PASSWORD = os.getenv("REDIS_PASS")
     REDIS_SSL = os.getenv("REDIS_SSL", "False").lower() == "true"
     USERINFO_CACHE_TTL = int(os.getenv("USERINFO_CACHE_TTL", 20))
+    # L1 кэш userinfo в памяти процесса (размер и TTL в секундах, TTL ограничен USERINFO_CACHE_TTL)
+    USERINFO_L1_CACHE_SIZE = int(os.getenv("USERINFO_L1_CACHE_SIZE", 1024))
+    USERINFO_L1_CACHE_TTL = int(os.getenv("USERINFO_L1_CACHE_TTL", 5))
+    # Кэш отклоненных токенов: повторная проверка недействительного токена не идет в Keycloak
+    # (TTL в секундах и размер кэша в памяти процесса)
+    REJECTED_TOKEN_CACHE_TTL = int(os.getenv("REJECTED_TOKEN_CACHE_TTL", 30))
+    REJECTED_TOKEN_CACHE_SIZE = int(os.getenv("REJECTED_TOKEN_CACHE_SIZE", 4096))
+    # Объединение параллельных обновлений токенов одной сессии: время жизни блокировки,
+    # время хранения результата обновления и ожидание результата другими запросами (секунды).
+    # Блокировка живет не меньше таймаута запроса в Keycloak (KEYCLOAK_CONNECT_TIMEOUT + KEYCLOAK_READ_TIMEOUT)
+    TOKEN_REFRESH_LOCK_TTL = int(os.getenv("TOKEN_REFRESH_LOCK_TTL", 30))
+    TOKEN_REFRESH_RESULT_TTL = int(os.getenv("TOKEN_REFRESH_RESULT_TTL", 30))
+    TOKEN_REFRESH_WAIT_TIMEOUT = float(os.getenv("TOKEN_REFRESH_WAIT_TIMEOUT", 3))
+    # Токены обновляются заранее, если до истечения access_token осталось меньше указанного (секунды)
+    TOKEN_REFRESH_WINDOW = int(os.getenv("TOKEN_REFRESH_WINDOW", 30))
+    # Пул соединений Redis (один на процесс)
+    REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+    REDIS_POOL_TIMEOUT = int(os.getenv("REDIS_POOL_TIMEOUT", 5))
+    REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
 
     CA_CERTIFICATE = os.getenv("CA_CERTIFICATE", "False")
 
@@ -39,6 +67,20 @@ class Config:
     KEYCLOAK_CLIENT_SECRET = os.getenv("KEYCLOAK_CLIENT_SECRET", "QuotationBookSecret123!")
     KEYCLOAK_REALM = os.getenv("KEYCLOAK_REALM", "quotation-book")
     KEYCLOAK_REDIRECT_URI = os.getenv("KEYCLOAK_REDIRECT_URI", "https://localhost:8443/auth/callback")
+    # HTTP-сессия для запросов к Keycloak: размер пула keep-alive соединений и таймауты (секунды)
+    KEYCLOAK_HTTP_POOL_SIZE = int(os.getenv("KEYCLOAK_HTTP_POOL_SIZE", 10))
+    KEYCLOAK_CONNECT_TIMEOUT = float(os.getenv("KEYCLOAK_CONNECT_TIMEOUT", 3))
+    KEYCLOAK_READ_TIMEOUT = float(os.getenv("KEYCLOAK_READ_TIMEOUT", 10))
+    # Проверка токена в /auth/validate: userinfo - запросом к Keycloak, jwt - локально по JWKS realm'а
+    AUTH_VALIDATION_MODE = os.getenv("AUTH_VALIDATION_MODE", "userinfo").lower()
+    # Ожидаемые aud и iss access token'а (iss по умолчанию берется из discovery-документа)
+    KEYCLOAK_TOKEN_AUDIENCE = os.getenv("KEYCLOAK_TOKEN_AUDIENCE", "account")
+    KEYCLOAK_ISSUER = os.getenv("KEYCLOAK_ISSUER")
+    # Допустимое расхождение часов при проверке exp/iat (секунды)
+    KEYCLOAK_TOKEN_LEEWAY = int(os.getenv("KEYCLOAK_TOKEN_LEEWAY", 10))
+    # Время жизни кэша JWKS и минимальный интервал обновления при неизвестном kid (секунды)
+    KEYCLOAK_JWKS_CACHE_TTL = int(os.getenv("KEYCLOAK_JWKS_CACHE_TTL", 300))
+    KEYCLOAK_JWKS_MIN_REFRESH_INTERVAL = int(os.getenv("KEYCLOAK_JWKS_MIN_REFRESH_INTERVAL", 10))
 
     # Minio S3 (общие для backend и worker)
     MINIO_ENDPOINT = f"{os.getenv('MINIO_URL', 'http://quotation-book-minio')}:{os.getenv('MINIO_PORT', '9000')}"
@@ -46,6 +88,45 @@ class Config:
     MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "changeme")
     MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "library") # Проверь это значение
     MINIO_SSL_VERIFY = os.getenv("MINIO_SSL_VERIFY", "true").lower() == "true"
+    # Настройки клиента S3 (один клиент и пул HTTP-соединений на процесс)
+    S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", 50))
+    S3_CONNECT_TIMEOUT = int(os.getenv("S3_CONNECT_TIMEOUT", 5))
+    S3_READ_TIMEOUT = int(os.getenv("S3_READ_TIMEOUT", 60))
+    S3_MAX_ATTEMPTS = int(os.getenv("S3_MAX_ATTEMPTS", 3))
+    S3_RETRY_MODE = os.getenv("S3_RETRY_MODE", "standard")
+
+    # Библиотека: размер страницы списка книг
+    LIBRARY_PAGE_SIZE = int(os.getenv("LIBRARY_PAGE_SIZE", 24))
+    LIBRARY_MAX_PAGE_SIZE = int(os.getenv("LIBRARY_MAX_PAGE_SIZE", 100))
+    # Размер блока при потоковой отдаче PDF из S3 (байт)
+    DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", 256 * 1024))
+    # Количество символов текста книги на странице просмотра
+    BOOK_PREVIEW_CHARS = int(os.getenv("BOOK_PREVIEW_CHARS", 2000))
+    # Размер блока при чтении PDF из S3 Range-запросами (постраничный просмотр)
+    PDF_RANGE_READ_SIZE = int(os.getenv("PDF_RANGE_READ_SIZE", 256 * 1024))
+    # Кэш извлеченного текста книг: размер LRU в памяти процесса, TTL в памяти и в Redis (секунды)
+    BOOK_TEXT_CACHE_SIZE = int(os.getenv("BOOK_TEXT_CACHE_SIZE", 256))
+    BOOK_TEXT_CACHE_TTL = int(os.getenv("BOOK_TEXT_CACHE_TTL", 3600))
+    BOOK_TEXT_REDIS_TTL = int(os.getenv("BOOK_TEXT_REDIS_TTL", 7 * 24 * 3600))
+    # Режим отдачи книг: proxy - через Flask, redirect - 302 на presigned URL MinIO,
+    # accel - X-Accel-Redirect во внутренний location nginx, который сам забирает файл из MinIO
+    LIBRARY_DOWNLOAD_MODE = os.getenv("LIBRARY_DOWNLOAD_MODE", "proxy").lower()
+    # Адрес MinIO, доступный браузеру (например https://minio.example.com). Подпись presigned URL
+    # привязана к хосту, поэтому для режима redirect ссылки подписываются сразу на этот адрес;
+    # без него режим redirect не используется и книги отдаются через Flask
+    MINIO_PUBLIC_ENDPOINT = os.getenv("MINIO_PUBLIC_ENDPOINT", "").rstrip('/')
+    # Время жизни presigned URL (секунды)
+    LIBRARY_PRESIGNED_URL_EXPIRES = int(os.getenv("LIBRARY_PRESIGNED_URL_EXPIRES", 300))
+    # Внутренний location nginx для режима accel
+    LIBRARY_ACCEL_LOCATION = os.getenv("LIBRARY_ACCEL_LOCATION", "/internal/minio/")
+    # SSE-поток статусов задач: интервал heartbeat, длительность соединения (секунды)
+    # и задержка переподключения клиента (миллисекунды)
+    TASK_STREAM_HEARTBEAT_INTERVAL = int(os.getenv("TASK_STREAM_HEARTBEAT_INTERVAL", 15))
+    TASK_STREAM_MAX_DURATION = int(os.getenv("TASK_STREAM_MAX_DURATION", 300))
+    TASK_STREAM_RETRY_MS = int(os.getenv("TASK_STREAM_RETRY_MS", 3000))
+    # Максимум одновременных SSE-потоков на процесс: каждый держит соединение Redis pub/sub
+    # из отдельного пула, сверх лимита клиент получает 503 и переходит на опрос
+    TASK_STREAM_MAX_CONNECTIONS = int(os.getenv("TASK_STREAM_MAX_CONNECTIONS", 20))
 
     # RabbitMQ (общие для backend и worker)
     RABBITMQ_HOST = os.getenv("RABBITMQ_HOST", "quotation-book-rabbitmq")
@@ -53,6 +134,27 @@ class Config:
     RABBITMQ_USER = os.getenv("RABBITMQ_USER", "gpn-admin")
     RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", "changeme")
     RABBITMQ_VHOST = os.getenv("RABBITMQ_VHOST", "/")
+    # Publisher задач в backend: число каналов и ожидание свободного канала в секундах
+    RABBITMQ_PUBLISHER_POOL_SIZE = int(os.getenv("RABBITMQ_PUBLISHER_POOL_SIZE", 4))
+    RABBITMQ_PUBLISHER_TIMEOUT = int(os.getenv("RABBITMQ_PUBLISHER_TIMEOUT", 5))
+    # Worker: число процессов и prefetch_count по очередям в формате "очередь=число,очередь=число"
+    # (по умолчанию процессов столько, сколько CPU, для больших книг и половина CPU для остальных очередей)
+    WORKER_CONCURRENCY = os.getenv("WORKER_CONCURRENCY", "")
+    WORKER_PREFETCH = os.getenv("WORKER_PREFETCH", "")
+    # Worker: nice процессов по очередям в том же формате (по умолчанию 10 для больших книг, 0 для остальных)
+    WORKER_NICENESS = os.getenv("WORKER_NICENESS", "")
+    # Время на завершение текущих задач при остановке worker'а (секунды)
+    WORKER_SHUTDOWN_TIMEOUT = int(os.getenv("WORKER_SHUTDOWN_TIMEOUT", 25))
+    # Worker: heartbeat соединения с RabbitMQ (секунды). Задачи выполняются вне потока соединения,
+    # поэтому heartbeat обслуживается и во время длительной генерации
+    RABBITMQ_WORKER_HEARTBEAT = int(os.getenv("RABBITMQ_WORKER_HEARTBEAT", 30))
+    # Worker: минимальный интервал записи промежуточного прогресса задачи в Redis (секунды)
+    TASK_PROGRESS_INTERVAL = float(os.getenv("TASK_PROGRESS_INTERVAL", 1))
+    # Worker: повтор упавших задач с экспоненциальной задержкой (TASK_RETRY_BASE_DELAY * 2^(n-1),
+    # не больше TASK_RETRY_MAX_DELAY секунд); после TASK_MAX_ATTEMPTS попыток задача уходит в очередь .dlq
+    TASK_MAX_ATTEMPTS = int(os.getenv("TASK_MAX_ATTEMPTS", 5))
+    TASK_RETRY_BASE_DELAY = int(os.getenv("TASK_RETRY_BASE_DELAY", 5))
+    TASK_RETRY_MAX_DELAY = int(os.getenv("TASK_RETRY_MAX_DELAY", 300))
 
     # flask
     SERVER_NAME = f"{KEYCLOAK_EXTERNAL_HOST}:{KEYCLOAK_EXTERNAL_PORT}"
\ No newline at end of file
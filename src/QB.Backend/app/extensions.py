@@ -1,7 +1,13 @@
 """Инициализация внешних сервисов (база данных, Redis, S3)."""
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 import redis
 import boto3
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
 from .config import Config
 import logging
@@ -10,11 +16,18 @@ logger = logging.getLogger(__name__)
 
 # Глобальные клиенты/пулы
 db_pool = None
+redis_pool = None
 redis_client = None
+redis_pubsub_client = None
 s3_client = None
+s3_presign_client = None
 
-def get_db_connection():
-    """Получение соединения с PostgreSQL."""
+_db_lock = threading.Lock()
+_redis_lock = threading.Lock()
+_s3_lock = threading.Lock()
+
+def _db_connection_params():
+    """Параметры подключения к PostgreSQL."""
     conn_params = {
         'host': Config.DB_HOST,
         'port': Config.DB_PORT,
@@ -27,80 +40,266 @@ def get_db_connection():
         if Config.CA_CERTIFICATE and Config.CA_CERTIFICATE.lower() != "false":
             conn_params['sslrootcert'] = Config.CA_CERTIFICATE
         logger.info(f"Подключение к PostgreSQL с параметами SSL...")
-    conn = psycopg2.connect(**conn_params)
+    return conn_params
+
+def get_db_connection():
+    """Получение отдельного (не из пула) соединения с PostgreSQL."""
+    conn = psycopg2.connect(**_db_connection_params())
     logger.info(f"Используется SSL: {conn.get_dsn_parameters().get('sslmode', 'none')}")
     return conn
 
+class DatabasePool:
+    """Ограниченный пул соединений PostgreSQL с таймаутом ожидания и временем жизни соединений."""
+
+    def __init__(self, minconn, maxconn, max_age, timeout, **conn_params):
+        self.maxconn = maxconn
+        self.max_age = max_age
+        self.timeout = timeout
+        self._pool = ThreadedConnectionPool(minconn, maxconn, **conn_params)
+        # Семафор ограничивает число выданных соединений и даёт ожидание с таймаутом,
+        # вместо мгновенного PoolError у ThreadedConnectionPool
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._created_at = {id(conn): time.monotonic() for conn in self._pool._pool}
+        self._in_use = 0
+
+    def _is_expired(self, conn):
+        """Проверяет, что соединение закрыто или превысило максимальное время жизни."""
+        if conn.closed:
+            return True
+        created_at = self._created_at.setdefault(id(conn), time.monotonic())
+        return bool(self.max_age) and time.monotonic() - created_at > self.max_age
+
+    def _discard(self, conn):
+        """Закрывает соединение и удаляет его из пула."""
+        self._created_at.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    def getconn(self):
+        """Выдаёт соединение из пула, ожидая освобождения не дольше timeout секунд."""
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolError(f"Нет свободных соединений PostgreSQL за {self.timeout} с")
+        try:
+            conn = self._pool.getconn()
+            if self._is_expired(conn):
+                logger.info("Соединение PostgreSQL устарело, переподключение")
+                self._discard(conn)
+                conn = self._pool.getconn()
+                self._created_at[id(conn)] = time.monotonic()
+            with self._lock:
+                self._in_use += 1
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        """Возвращает соединение в пул, откатывая незавершённую транзакцию."""
+        try:
+            close = bool(conn.closed)
+            if not close and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except Exception:
+                    close = True
+            if close:
+                self._discard(conn)
+            else:
+                self._pool.putconn(conn)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        """Закрывает все соединения пула."""
+        self._pool.closeall()
+        self._created_at.clear()
+
+    def stats(self):
+        """Статистика использования пула."""
+        with self._lock:
+            in_use = self._in_use
+        return {
+            'initialized': True,
+            'max_connections': self.maxconn,
+            'open_connections': len(self._created_at),
+            'in_use_connections': in_use
+        }
+
+def get_db_pool():
+    """Получение общего (на процесс) пула соединений PostgreSQL."""
+    global db_pool
+    if db_pool is None:
+        with _db_lock:
+            if db_pool is None:
+                db_pool = DatabasePool(
+                    Config.DB_POOL_MIN_SIZE,
+                    Config.DB_POOL_MAX_SIZE,
+                    max_age=Config.DB_POOL_MAX_AGE,
+                    timeout=Config.DB_POOL_TIMEOUT,
+                    **_db_connection_params()
+                )
+                logger.info(f"Создан пул соединений PostgreSQL (max_connections={Config.DB_POOL_MAX_SIZE})")
+    return db_pool
+
+@contextmanager
+def db_connection():
+    """Контекстный менеджер: соединение из пула PostgreSQL, возвращаемое в пул по выходу."""
+    pool = get_db_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    finally:
+        pool.putconn(conn)
+
+def get_db_pool_stats():
+    """Статистика использования пула соединений PostgreSQL."""
+    if db_pool is None:
+        return {'initialized': False}
+    return db_pool.stats()
+
+def _create_redis_pool(max_connections=None):
+    """Создание пула соединений с Redis."""
+    pool_params = {
+        'host': Config.REDIS_HOST,
+        'port': Config.REDIS_PORT,
+        'password': Config.REDIS_PASSWORD,
+        'decode_responses': True,
+        'socket_connect_timeout': 5,
+        'socket_timeout': 5,
+        'retry_on_timeout': True,
+        'max_connections': max_connections or Config.REDIS_MAX_CONNECTIONS,
+        'timeout': Config.REDIS_POOL_TIMEOUT,
+        # Соединение проверяется PING'ом только если простаивало дольше интервала
+        'health_check_interval': Config.REDIS_HEALTH_CHECK_INTERVAL
+    }
+    # Проверка на использование SSL при подключение к Redis.
+    if Config.REDIS_SSL and Config.CA_CERTIFICATE and Config.CA_CERTIFICATE.lower() != "false":
+        pool_params.update(
+            connection_class=redis.SSLConnection,
+            ssl_cert_reqs=None,
+            ssl_ca_certs=Config.CA_CERTIFICATE
+        )
+    # BlockingConnectionPool ждёт освобождения соединения, а не падает при исчерпании пула
+    return redis.BlockingConnectionPool(**pool_params)
+
 def get_redis_connection():
-    """Получение соединения с Redis."""
+    """Получение общего (на процесс) клиента Redis, работающего через пул соединений."""
+    global redis_pool, redis_client
+    if redis_client is not None:
+        return redis_client
     try:
-        # Проверка на использование SSL при подключение к Redis.
-        if Config.REDIS_SSL and Config.CA_CERTIFICATE and Config.CA_CERTIFICATE.lower() != "false":
-            redis_conn = redis.Redis(
-                host=Config.REDIS_HOST,
-                port=Config.REDIS_PORT,
-                password=Config.REDIS_PASSWORD,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                retry_on_timeout=True,
-                ssl_cert_reqs=None,
-                ssl=True,
-                ssl_ca_certs=Config.CA_CERTIFICATE
-            )
-        else:
-            redis_conn = redis.Redis(
-                host=Config.REDIS_HOST,
-                port=Config.REDIS_PORT,
-                password=Config.REDIS_PASSWORD,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                retry_on_timeout=True
-            )
-        redis_conn.ping()
-        return redis_conn
+        with _redis_lock:
+            if redis_client is None:
+                redis_pool = _create_redis_pool()
+                redis_client = redis.Redis(connection_pool=redis_pool)
+                logger.info(f"Создан пул соединений Redis (max_connections={Config.REDIS_MAX_CONNECTIONS})")
+        return redis_client
     except Exception as e:
         logger.error(f"Ошибка подключения к Redis: {e}")
         raise
 
+def get_redis_pubsub_connection():
+    """Клиент Redis для долгих подписок pub/sub (SSE) с отдельным пулом соединений.
+
+    Подписка держит соединение все время потока, поэтому не должна занимать общий пул.
+    """
+    global redis_pubsub_client
+    if redis_pubsub_client is not None:
+        return redis_pubsub_client
+    with _redis_lock:
+        if redis_pubsub_client is None:
+            redis_pubsub_client = redis.Redis(
+                connection_pool=_create_redis_pool(Config.TASK_STREAM_MAX_CONNECTIONS))
+            logger.info(f"Создан пул соединений Redis pub/sub "
+                        f"(max_connections={Config.TASK_STREAM_MAX_CONNECTIONS})")
+    return redis_pubsub_client
+
+def get_redis_pool_stats():
+    """Статистика использования пула соединений Redis."""
+    if redis_pool is None:
+        return {'initialized': False}
+    try:
+        # Внутренние атрибуты BlockingConnectionPool: в другой версии redis-py их может не быть
+        idle_connections = len([conn for conn in list(redis_pool.pool.queue) if conn])
+        created_connections = len(redis_pool._connections)
+    except AttributeError:
+        return {'initialized': True}
+    return {
+        'initialized': True,
+        'max_connections': redis_pool.max_connections,
+        'created_connections': created_connections,
+        'in_use_connections': created_connections - idle_connections,
+        'idle_connections': idle_connections
+    }
+
+def _create_s3_client(endpoint_url=None):
+    """Создание клиента S3 (Minio) с настроенным пулом HTTP-соединений."""
+    endpoint_url = endpoint_url or Config.MINIO_ENDPOINT
+    client_params = {
+        'endpoint_url': endpoint_url,
+        'aws_access_key_id': Config.MINIO_ACCESS_KEY,
+        'aws_secret_access_key': Config.MINIO_SECRET_KEY,
+        'config': BotoConfig(
+            max_pool_connections=Config.S3_MAX_POOL_CONNECTIONS,
+            connect_timeout=Config.S3_CONNECT_TIMEOUT,
+            read_timeout=Config.S3_READ_TIMEOUT,
+            retries={'max_attempts': Config.S3_MAX_ATTEMPTS, 'mode': Config.S3_RETRY_MODE}
+        )
+    }
+    use_ssl = endpoint_url.startswith('https')
+    # Проверка на использование SSL при подключение к S3.
+    if use_ssl and Config.MINIO_SSL_VERIFY and Config.CA_CERTIFICATE and Config.CA_CERTIFICATE.lower() != "false":
+        client_params['verify'] = Config.CA_CERTIFICATE
+    return boto3.client('s3', **client_params)
+
 def get_s3_client():
-    """Получение клиента S3 (Minio)."""
+    """Получение общего (на процесс) клиента S3 (Minio)."""
+    global s3_client
+    if s3_client is not None:
+        return s3_client
     try:
-        use_ssl = Config.MINIO_ENDPOINT.startswith('https')
-        # Проверка на использование SSL при подключение к S3.
-        if use_ssl and Config.MINIO_SSL_VERIFY and Config.CA_CERTIFICATE and Config.CA_CERTIFICATE.lower() != "false":
-            client = boto3.client(
-                's3',
-                endpoint_url=Config.MINIO_ENDPOINT,
-                aws_access_key_id=Config.MINIO_ACCESS_KEY,
-                aws_secret_access_key=Config.MINIO_SECRET_KEY,
-                verify=Config.CA_CERTIFICATE
-            )
-        else:
-            client = boto3.client(
-                's3',
-                endpoint_url=Config.MINIO_ENDPOINT,
-                aws_access_key_id=Config.MINIO_ACCESS_KEY,
-                aws_secret_access_key=Config.MINIO_SECRET_KEY,
-            )
-        return client
+        # Создание клиента boto3 не потокобезопасно, поэтому под блокировкой
+        with _s3_lock:
+            if s3_client is None:
+                s3_client = _create_s3_client()
+                logger.info(f"Создан клиент S3 (max_pool_connections={Config.S3_MAX_POOL_CONNECTIONS})")
+        return s3_client
     except Exception as e:
         logger.error(f"Ошибка создания S3 клиента: {e}")
         return None
 
+def get_s3_presign_client():
+    """Клиент S3 для подписи ссылок, которые открывает браузер (MINIO_PUBLIC_ENDPOINT).
+
+    Запросов к MinIO не выполняет: подпись считается локально, но включает хост endpoint'а.
+    """
+    global s3_presign_client
+    if not Config.MINIO_PUBLIC_ENDPOINT:
+        return None
+    if s3_presign_client is not None:
+        return s3_presign_client
+    try:
+        with _s3_lock:
+            if s3_presign_client is None:
+                s3_presign_client = _create_s3_client(Config.MINIO_PUBLIC_ENDPOINT)
+        return s3_presign_client
+    except Exception as e:
+        logger.error(f"Ошибка создания S3 клиента для presigned URL: {e}")
+        return None
+
 def init_extensions(app):
     """Инициализация внешних сервисов."""
-    global db_pool, redis_client, s3_client
     try:
-        redis_client = get_redis_connection()
-        s3_client = get_s3_client()
-        # Проверка подключения к Redis
-        if redis_client:
-             redis_client.ping()
+        redis_conn = get_redis_connection()
+        s3 = get_s3_client()
+        # Проверка подключения к Redis (один раз при старте, далее - health check пула)
+        if redis_conn:
+             redis_conn.ping()
              logger.info("Подключение к Redis успешно установлено")
         # Проверка подключения к S3
-        if s3_client:
+        if s3:
              logger.info("Клиент S3 (Minio) успешно инициализирован.")
     except Exception as e:
          logger.error(f"Ошибка инициализации расширений: {e}")
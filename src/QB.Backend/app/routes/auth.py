@@ -1,11 +1,20 @@
 """Маршруты для аутентификации через Keycloak."""
 from flask import Blueprint, request, redirect, session, url_for, jsonify
-import requests
 from urllib.parse import urlencode
 from ..config import Config
 # Импортируем функции из extensions и utils
 from ..extensions import get_redis_connection
-from ..utils.task_helpers import cache_userinfo, get_cached_userinfo, invalidate_userinfo_cache
+from ..utils.task_helpers import (
+    cache_userinfo, get_cached_userinfo, invalidate_userinfo_cache,
+    cache_rejected_token, is_token_rejected,
+    acquire_token_refresh_lock, release_token_refresh_lock,
+    store_token_refresh_result, get_token_refresh_result
+)
+from ..services.keycloak_service import (
+    validate_access_token, keycloak_request, realm_url,
+    TOKEN_VALID, TOKEN_EXPIRED, TOKEN_INVALID, TOKEN_UNVERIFIED
+)
+import time
 import logging
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -47,14 +56,7 @@ def auth_callback():
         return "Код авторизации не предоставлен", 400
 
     # Формируем URL для обмена кода на токен
-    token_url = f"https://{Config.KEYCLOAK_HOST}:{Config.KEYCLOAK_PORT}/realms/{Config.KEYCLOAK_REALM}/protocol/openid-connect/token"
-
-    # Настройка SSL-верификации для запроса к Keycloak
-    verify_ssl = True
-    if Config.CA_CERTIFICATE and Config.CA_CERTIFICATE.lower() != "false" and Config.CA_CERTIFICATE != "False":
-        verify_ssl = Config.CA_CERTIFICATE
-    elif Config.CA_CERTIFICATE and (Config.CA_CERTIFICATE.lower() == "false" or Config.CA_CERTIFICATE == "False"):
-        verify_ssl = False
+    token_url = f"{realm_url()}/protocol/openid-connect/token"
 
     # Данные для запроса токена
     token_data = {
@@ -66,7 +68,7 @@ def auth_callback():
     }
     try:
         logging.getLogger(__name__).info(f"Попытка обмена кода на токен по адресу: {token_url}")
-        response = requests.post(token_url, data=token_data, verify=verify_ssl)
+        response = keycloak_request('POST', token_url, data=token_data)
         logging.getLogger(__name__).info(f"Статус ответа токена: {response.status_code}")
 
         if response.status_code != 200:
@@ -76,11 +78,9 @@ def auth_callback():
         token_info = response.json()
 
         if 'access_token' in token_info:
-            # Сохраняем access_token в сессии
-            session['access_token'] = token_info['access_token']
-            # Сохраняем refresh_token, если он предоставлен
+            # Сохраняем токены и срок действия access_token в сессии
+            _store_tokens(token_info)
             if 'refresh_token' in token_info:
-                session['refresh_token'] = token_info['refresh_token']
                 logging.getLogger(__name__).info("Refresh токен успешно получен и сохранен в сессии")
             else:
                 logging.getLogger(__name__).warning("Refresh токен не предсоставился Keycloak.")
@@ -97,6 +97,158 @@ def auth_callback():
         logging.getLogger(__name__).error(f"Ошибка обмена кода на токен: {e}")
         return "Ошибка во время аутентификации", 500
 
+def _store_tokens(tokens):
+    """Сохраняет токены и момент истечения access_token в сессии."""
+    session['access_token'] = tokens['access_token']
+    if tokens.get('refresh_token'):
+        session['refresh_token'] = tokens['refresh_token']
+    if tokens.get('expires_in'):
+        session['access_token_expires_at'] = int(time.time()) + int(tokens['expires_in'])
+    else:
+        session.pop('access_token_expires_at', None)
+
+def _validated_user_response(user_info):
+    """Ответ auth_request для успешно проверенного пользователя."""
+    return "", 200, {
+        'X-Forwarded-User': user_info.get('preferred_username', 'unknown')
+    }
+
+def _validate_locally(access_token):
+    """Проверка токена по JWKS. Claims кэшируются не дольше срока жизни токена."""
+    status, claims = validate_access_token(access_token)
+    if status == TOKEN_VALID:
+        ttl = min(Config.USERINFO_CACHE_TTL, max(int(claims['exp'] - time.time()), 1))
+        cache_userinfo(access_token, claims, ttl)
+    return status, claims
+
+def _fetch_userinfo(access_token):
+    """Запрос userinfo в Keycloak. Возвращает (HTTP статус, userinfo или None)."""
+    response = keycloak_request(
+        'GET',
+        f"{realm_url()}/protocol/openid-connect/userinfo",
+        headers={'Authorization': f'Bearer {access_token}'}
+    )
+    if response.status_code != 200:
+        return response.status_code, None
+    user_info = response.json()
+    # Кэшируем информацию о пользователе в Redis
+    cache_userinfo(access_token, user_info)
+    return 200, user_info
+
+def _request_new_tokens(refresh_token):
+    """Запрос новой пары токенов в Keycloak. Возвращает токены или None."""
+    payload = {
+        'grant_type': 'refresh_token',
+        'refresh_token': refresh_token,
+        'client_id': Config.KEYCLOAK_CLIENT_ID,
+    }
+    # Добавляем client_secret, если он задан
+    if Config.KEYCLOAK_CLIENT_SECRET:
+        payload['client_secret'] = Config.KEYCLOAK_CLIENT_SECRET
+
+    refresh_response = keycloak_request('POST', f"{realm_url()}/protocol/openid-connect/token",
+                                        data=payload)
+    # Ошибка на стороне Keycloak - не отказ в обновлении токена
+    if refresh_response.status_code >= 500:
+        refresh_response.raise_for_status()
+    if refresh_response.status_code != 200:
+        logging.getLogger(__name__).warning(
+            f"Не удалось обновить токен: {refresh_response.status_code}, {refresh_response.text}")
+        return None
+    return refresh_response.json()
+
+def _refresh_tokens(refresh_token):
+    """Обновление токенов с объединением параллельных запросов одной сессии.
+
+    Токены обновляет только запрос, захвативший блокировку в Redis; остальные ждут
+    и используют его результат, а не отправляют в Keycloak тот же refresh_token.
+    """
+    tokens = get_token_refresh_result(refresh_token)
+    if tokens:
+        logging.getLogger(__name__).info("Использованы токены, обновленные параллельным запросом")
+        return tokens
+
+    lock_token = acquire_token_refresh_lock(refresh_token)
+    if lock_token is False:
+        tokens = get_token_refresh_result(refresh_token, timeout=Config.TOKEN_REFRESH_WAIT_TIMEOUT)
+        if tokens:
+            logging.getLogger(__name__).info("Использованы токены, обновленные параллельным запросом")
+            return tokens
+        logging.getLogger(__name__).warning("Параллельное обновление токенов не дало результата, обновляем сами")
+
+    try:
+        tokens = _request_new_tokens(refresh_token)
+        if tokens:
+            store_token_refresh_result(refresh_token, tokens)
+        return tokens
+    finally:
+        if lock_token:
+            release_token_refresh_lock(refresh_token, lock_token)
+
+def _validate_new_token(access_token):
+    """Проверка нового access token'а после обновления. Возвращает userinfo или None."""
+    # Если токены обновил параллельный запрос, userinfo уже в кэше
+    cached_userinfo = get_cached_userinfo(access_token)
+    if cached_userinfo:
+        return cached_userinfo
+    if Config.AUTH_VALIDATION_MODE == 'jwt':
+        status, claims = _validate_locally(access_token)
+        if status == TOKEN_VALID:
+            return claims
+        if status != TOKEN_UNVERIFIED:
+            logging.getLogger(__name__).warning(f"Проверка нового токена не удалась: {status}")
+            return None
+    status, user_info = _fetch_userinfo(access_token)
+    if not user_info:
+        logging.getLogger(__name__).warning(f"Проверка нового токена не удалась: {status}")
+    return user_info
+
+def _refresh_and_validate(access_token, refresh_token):
+    """Обновляет токены по refresh_token и проверяет новый access token.
+
+    Если Keycloak отказал в обновлении, истекший access token попадает в кэш отклоненных.
+    """
+    rejected = True
+    if refresh_token:
+        try:
+            tokens = _refresh_tokens(refresh_token)
+            if tokens:
+                # Сохраняем новые токены в сессии
+                _store_tokens(tokens)
+                logging.getLogger(__name__).info("Токены успешно обновлены")
+                # Повторяем проверку с новым токеном
+                user_info = _validate_new_token(tokens['access_token'])
+                if user_info:
+                    return _validated_user_response(user_info)
+                # Keycloak обновил токены, но новый токен не проверен (например, ключ подписи
+                # еще неизвестен) - это не отказ, старый токен в кэш отклоненных не попадает
+                rejected = False
+        except Exception as refresh_error:
+            rejected = False
+            logging.getLogger(__name__).error(f"Ошибка при попытке обновить токен: {refresh_error}")
+    if rejected:
+        cache_rejected_token(access_token)
+    # Если refresh_token отсутствует или обновление не удалось, очищаем сессию
+    logging.getLogger(__name__).warning(
+        "Не удалось обновить токен или refresh_token отсутствует, очищаем сессию")
+    session.pop('access_token', None)
+    session.pop('refresh_token', None)
+    return "Unauthorized", 401
+
+def _refresh_ahead(refresh_token):
+    """Обновляет токены до истечения access_token. Возвращает ответ или None, если обновить не удалось."""
+    try:
+        tokens = _refresh_tokens(refresh_token)
+        if tokens:
+            _store_tokens(tokens)
+            logging.getLogger(__name__).info("Токены обновлены до истечения срока действия")
+            user_info = _validate_new_token(tokens['access_token'])
+            if user_info:
+                return _validated_user_response(user_info)
+    except Exception as refresh_error:
+        logging.getLogger(__name__).error(f"Ошибка при попытке обновить токен заранее: {refresh_error}")
+    return None
+
 # Маршрут для валидации токена аутентификации и в случаего чего обновляет токен
 # проверяет, авторизован ли текущий пользователь.
 @bp.route('/validate')
@@ -110,90 +262,60 @@ def auth_validate():
         logging.getLogger(__name__).warning("В сессии отсутствует токен доступа для валидации")
         return "Unauthorized", 401
 
+    # Токен скоро истечет - обновляем его заранее, чтобы не ждать отказа Keycloak
+    expires_at = session.get('access_token_expires_at')
+    if refresh_token and expires_at and time.time() >= expires_at - Config.TOKEN_REFRESH_WINDOW:
+        response = _refresh_ahead(refresh_token)
+        if response:
+            return response
+        # Не удалось обновить - больше не пытаемся заранее и проверяем текущий токен как обычно
+        session.pop('access_token_expires_at', None)
+        access_token = session.get('access_token')
+        refresh_token = session.get('refresh_token')
+
     # Сначала проверяем кэш Redis
     cached_userinfo = get_cached_userinfo(access_token)
     if cached_userinfo:
         logging.getLogger(__name__).info("Userinfo получен из кэша")
-        return "", 200, {
-            'X-Forwarded-User': cached_userinfo.get('preferred_username', 'unknown')
-        }
-
-    # Если нет в кэше, проверяем токен через Keycloak
-    userinfo_url = f"https://{Config.KEYCLOAK_HOST}:{Config.KEYCLOAK_PORT}/realms/{Config.KEYCLOAK_REALM}/protocol/openid-connect/userinfo"
+        return _validated_user_response(cached_userinfo)
 
-    # Настройка SSL-верификации
-    verify_ssl = True
-    if Config.CA_CERTIFICATE and Config.CA_CERTIFICATE.lower() != "false" and Config.CA_CERTIFICATE != "False":
-        verify_ssl = Config.CA_CERTIFICATE
-    elif Config.CA_CERTIFICATE and (Config.CA_CERTIFICATE.lower() == "false" or Config.CA_CERTIFICATE == "False"):
-        verify_ssl = False
+    # Недавно отклоненный токен не проверяем в Keycloak повторно
+    if is_token_rejected(access_token):
+        logging.getLogger(__name__).info("Токен недавно отклонен, запрос в Keycloak не выполняется")
+        session.pop('access_token', None)
+        return "Unauthorized", 401
 
     try:
-        response = requests.get(
-            userinfo_url,
-            headers={'Authorization': f'Bearer {access_token}'},
-            verify=verify_ssl
-        )
-
-        if response.status_code == 200:
-            # Получаем информацию о пользователе
-            user_info = response.json()
-            # Кэшируем информацию о пользователе в Redis
-            cache_userinfo(access_token, user_info)
-            return "", 200, {
-                'X-Forwarded-User': user_info.get('preferred_username', 'unknown')
-            }
-
-        elif response.status_code == 401:
+        if Config.AUTH_VALIDATION_MODE == 'jwt':
+            # Локальная проверка подписи и claims; Keycloak нужен только для обновления токена
+            status, claims = _validate_locally(access_token)
+            if status == TOKEN_VALID:
+                return _validated_user_response(claims)
+            if status == TOKEN_EXPIRED:
+                logging.getLogger(__name__).info("Access token истёк, пробуем обновить...")
+                return _refresh_and_validate(access_token, refresh_token)
+            if status == TOKEN_INVALID:
+                cache_rejected_token(access_token)
+                session.pop('access_token', None)
+                return "Unauthorized", 401
+            # Ключи Keycloak недоступны или ключ токена еще неизвестен - проверяем токен через userinfo
+            logging.getLogger(__name__).warning("Токен не проверен по JWKS, проверка через userinfo")
+
+        # Если нет в кэше, проверяем токен через Keycloak
+        status, user_info = _fetch_userinfo(access_token)
+        if user_info:
+            return _validated_user_response(user_info)
+
+        elif status == 401:
             # Access token истёк, пробуем обновить его с помощью refresh_token
             logging.getLogger(__name__).info("Access token истёк, пробуем обновить...")
-            if refresh_token:
-                token_refresh_url = f"https://{Config.KEYCLOAK_HOST}:{Config.KEYCLOAK_PORT}/realms/{Config.KEYCLOAK_REALM}/protocol/openid-connect/token"
-                payload = {
-                    'grant_type': 'refresh_token',
-                    'refresh_token': refresh_token,
-                    'client_id': Config.KEYCLOAK_CLIENT_ID,
-                }
-                # Добавляем client_secret, если он задан
-                if Config.KEYCLOAK_CLIENT_SECRET:
-                    payload['client_secret'] = Config.KEYCLOAK_CLIENT_SECRET
-
-                try:
-                    refresh_response = requests.post(token_refresh_url, data=payload, verify=verify_ssl)
-                    if refresh_response.status_code == 200:
-                        tokens = refresh_response.json()
-                        new_access_token = tokens.get('access_token')
-                        new_refresh_token = tokens.get('refresh_token')
-                        # Сохраняем новые токены в сессии
-                        session['access_token'] = new_access_token
-                        if new_refresh_token:
-                            session['refresh_token'] = new_refresh_token
-                        logging.getLogger(__name__).info("Токены успешно обновлены")
-                        # Повторяем проверку userinfo с новым токеном
-                        retry_response = requests.get(userinfo_url,
-                                                      headers={'Authorization': f'Bearer {new_access_token}'},
-                                                      verify=verify_ssl)
-                        if retry_response.status_code == 200:
-                            user_info = retry_response.json()
-                            cache_userinfo(new_access_token, user_info)
-                            return "", 200, {'X-Forwarded-User': user_info.get('preferred_username', 'unknown')}
-                        else:
-                            logging.getLogger(__name__).warning(
-                                f"Проверка нового токена не удалась: {retry_response.status_code}")
-                    else:
-                        logging.getLogger(__name__).warning(
-                            f"Не удалось обновить токен: {refresh_response.status_code}, {refresh_response.text}")
-                except Exception as refresh_error:
-                    logging.getLogger(__name__).error(f"Ошибка при попытке обновить токен: {refresh_error}")
-            # Если refresh_token отсутствует или обновление не удалось, очищаем сессию
-            logging.getLogger(__name__).warning(
-                "Не удалось обновить токен или refresh_token отсутствует, очищаем сессию")
-            session.pop('access_token', None)
-            session.pop('refresh_token', None)
-            return "Unauthorized", 401
+            return _refresh_and_validate(access_token, refresh_token)
         else:
             # Другая ошибка валидации токена
-            logging.getLogger(__name__).warning(f"Валидация токена не удалась со статусом {response.status_code}")
+            logging.getLogger(__name__).warning(f"Валидация токена не удалась со статусом {status}")
+            # Кэшируем только явный отказ: 400/404/429 не означают, что токен недействителен
+            if status == 403:
+                cache_rejected_token(access_token)
             session.pop('access_token', None)
             return "Unauthorized", 401
 
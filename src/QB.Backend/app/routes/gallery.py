@@ -4,12 +4,13 @@ from ..config import Config
 
 from ..utils.static_files import generate_gallery_html, generate_sample_files
 from ..utils.content_generation import generate_random_image
-from ..utils.task_helpers import get_rabbitmq_connection
+from ..extensions import get_redis_connection
+from ..services.task_publisher import publish_task
+from ..utils.task_status import save_task_status
+from ..utils.queues import IMAGE_GENERATION_QUEUE, task_priority
 import os
 import random
 import uuid
-import json
-import pika
 import time
 import logging
 
@@ -87,41 +88,36 @@ def generate_images_async():
         # Получаем данные из запроса
         data = request.get_json() if request.is_json else {}
         count = data.get('count', 4) if data else 4
+        priority_name = data.get('priority', 'normal') if data else 'normal'
+        priority = task_priority(priority_name)
+        if priority is None:
+            return jsonify({"error": f"Некорректный приоритет: {priority_name}"}), 400
         user_id = session.get('user', request.headers.get('X-Forwarded-User', 'unknown_user'))
         logging.getLogger(__name__).info(
             f"Постановка задачи генерации {count} изображений в очередь от пользователя {user_id}")
 
-        # Создаем подключение к RabbitMQ
-        connection = get_rabbitmq_connection()
-        if not connection:
-            return jsonify({"error": "Сервис генерации временно недоступен"}), 503
-
-        channel = connection.channel()
-        # Объявляем очередь для задач генерации изображений (durable для надежности)
-        queue_name = 'image_generation_queue'
-        channel.queue_declare(queue=queue_name, durable=True)
-
         # Формируем сообщение задачи
         task_message = {
             'task_id': str(uuid.uuid4()),
             'user_id': user_id,
             'count': count,
             'timestamp': time.time(),
-            'type': 'image_generation'
+            'type': 'image_generation',
+            'priority': priority_name
         }
 
-        # Отправляем сообщение в очередь
-        channel.basic_publish(
-            exchange='',
-            routing_key=queue_name,
-            body=json.dumps(task_message, ensure_ascii=True),
-            properties=pika.BasicProperties(
-                delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
-            )
-        )
-        logging.getLogger(__name__).info(
-            f"Задача генерации изображений поставлена в очередь '{queue_name}'. Task ID: {task_message['task_id']}")
-        connection.close()
+        # Отправляем сообщение в очередь через общий publisher процесса
+        if not publish_task(IMAGE_GENERATION_QUEUE, task_message, priority=priority):
+            return jsonify({"error": "Сервис генерации временно недоступен"}), 503
+
+        # Начальный статус - в очереди; задача сразу видна в списке задач пользователя
+        redis_conn = get_redis_connection()
+        if redis_conn:
+            try:
+                save_task_status(redis_conn, task_message['task_id'], 'queued',
+                                 f'Задача генерации {count} изображений поставлена в очередь', 0, user_id=user_id)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Ошибка записи статуса задачи {task_message['task_id']}: {e}")
 
         return jsonify({
             "status": "queued",
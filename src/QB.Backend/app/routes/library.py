@@ -1,23 +1,33 @@
 """Маршруты для работы с электронной библиотекой."""
-from flask import Blueprint, jsonify, redirect, session, Response, request, url_for
-from ..services.s3_service import list_books_from_s3, \
+from flask import Blueprint, jsonify, redirect, session, Response, request, url_for, stream_with_context
+from werkzeug.http import http_date, parse_date
+from ..services.s3_service import list_books_page, generate_download_url, \
     get_s3_client  # extract_text_from_pdf перемещен в content_generation
-from ..utils.content_generation import extract_text_from_pdf  # Импортируем отсюда
+from ..services.book_catalog import register_book
+from ..services.book_text import get_book_text, get_book_page
+from ..services.book_numbers import reserve_book_numbers
 from ..utils.static_files import generate_library_html
-from ..utils.task_helpers import get_rabbitmq_connection
+from ..services.task_publisher import publish_task
+from ..utils.queues import BOOK_GENERATION_QUEUE, LARGE_BOOK_GENERATION_QUEUE, task_priority
+from ..utils.task_status import save_task_status, get_user_tasks, user_task_events_channel
 from ..config import Config
-from ..extensions import get_redis_connection
+from ..extensions import get_redis_connection, get_redis_pubsub_connection
 import os
+import re
 import random
 import uuid
 import json
-import pika
 import time
+import threading
 from botocore.exceptions import ClientError
+from urllib.parse import urlsplit
 import logging
 
 bp = Blueprint('library', __name__, url_prefix='/library')
 
+# Поддерживается только одиночный диапазон байт (bytes=start-end, bytes=start-, bytes=-suffix)
+SINGLE_RANGE_RE = re.compile(r'^bytes=(\d+-\d*|-\d+)$')
+
 
 # Маршрут для библиотеки книг
 @bp.route('/')
@@ -28,10 +38,10 @@ def library():
         logging.getLogger(__name__).warning("В сессии отсутствует токен доступа")
         return redirect(url_for('auth.auth_login'))  # Используем url_for для blueprint'а
     try:
-        # Получаем список книг из S3
-        books = list_books_from_s3()
+        # Получаем первую страницу книг из каталога, остальные страницы подгружаются при прокрутке
+        books, next_cursor = list_books_page()
         # Генерируем HTML страницы библиотеки
-        html_content = generate_library_html(books)
+        html_content = generate_library_html(books, next_cursor)
         if html_content:
             return html_content
         else:
@@ -40,6 +50,27 @@ def library():
         logging.getLogger(__name__).error(f"Ошибка отображения библиотеки: {e}")
         return "<h1>Ошибка загрузки библиотеки</h1>", 500
 
+# API постраничного получения списка книг (keyset-пагинация по имени файла)
+@bp.route('/api/books')
+def api_books():
+    """Получение страницы списка книг в формате JSON."""
+    access_token = session.get('access_token')
+    if not access_token:
+        return jsonify({"error": "Требуется аутентификация"}), 401
+    cursor = request.args.get('cursor') or None
+    limit = request.args.get('limit', Config.LIBRARY_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, Config.LIBRARY_MAX_PAGE_SIZE))
+    try:
+        books, next_cursor = list_books_page(cursor, limit)
+        return jsonify({
+            "status": "success",
+            "books": books,
+            "next_cursor": next_cursor
+        })
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Ошибка получения страницы книг: {e}")
+        return jsonify({"error": "Ошибка получения списка книг"}), 500
+
 # Маршрут для просмотра содержимого книги
 @bp.route('/view/<filename>')
 def view_book(filename):
@@ -54,7 +85,7 @@ def view_book(filename):
         if not s3_client:
             return "<h1>Сервис временно недоступен</h1>", 500
 
-        # Получаем метаданные файла (для отображения заголовка/автора)
+        # Получаем метаданные файла (для отображения заголовка/автора и ETag для кэша текста)
         try:
             head_response = s3_client.head_object(Bucket=Config.MINIO_BUCKET_NAME, Key=filename)
             metadata = head_response.get('Metadata', {})
@@ -62,12 +93,19 @@ def view_book(filename):
             # Если файл не найден
             return "<h1>Файл не найден</h1>", 404
 
-        # Получаем содержимое файла из S3
-        response = s3_client.get_object(Bucket=Config.MINIO_BUCKET_NAME, Key=filename)
-        pdf_bytes = response['Body'].read()
-
-        # Извлекаем текст из PDF
-        book_text = extract_text_from_pdf(pdf_bytes)  # Импортируем из utils.content_generation
+        page_number = request.args.get('page', type=int)
+        if page_number is not None:
+            # Постраничный режим: разбирается только запрошенная страница PDF
+            page = get_book_page(s3_client, filename, head_response['ETag'],
+                                 head_response['ContentLength'], page_number)
+            if page['text'] is None:
+                return "<h1>Страница не найдена</h1>", 404
+            book_text = page['text']
+            pager_html = _book_pager_html(filename, page_number, page['pages'])
+        else:
+            # Текст книги берется из кэша, PDF читается и разбирается только при промахе
+            book_text = get_book_text(s3_client, filename, head_response['ETag'], head_response['ContentLength'])
+            pager_html = f'<a href="/library/view/{filename}?page=1" class="back-button">📖 Читать постранично</a>'
 
         # Генерируем HTML для просмотра книги
         html_content = f'''<!DOCTYPE html>
@@ -125,6 +163,10 @@ def view_book(filename):
             border: 1px solid rgba(255, 255, 255, 0.3);
             font-weight: bold;
         }}
+        .page-info {{
+            padding: 12px 0;
+            font-size: 16px;
+        }}
         .back-button:hover, .download-button:hover {{
             background: rgba(255, 255, 255, 0.3);
             transform: translateY(-2px);
@@ -155,6 +197,7 @@ def view_book(filename):
             <div class="actions">
                 <a href="/library" class="back-button">← Назад к библиотеке</a>
                 <a href="/library/download/{filename}" class="download-button" target="_blank">⬇ Скачать PDF</a>
+                {pager_html}
             </div>
         </div>
         <div class="content">
@@ -169,6 +212,69 @@ def view_book(filename):
         return "<h1>Ошибка при просмотре книги</h1>", 500
 
 
+def _book_pager_html(filename, page_number, page_count):
+    """Навигация постраничного просмотра книги."""
+    links = []
+    if page_number > 1:
+        links.append(f'<a href="/library/view/{filename}?page={page_number - 1}" class="back-button">← Предыдущая</a>')
+    links.append(f'<span class="page-info">Страница {page_number} из {page_count}</span>')
+    if page_number < page_count:
+        links.append(f'<a href="/library/view/{filename}?page={page_number + 1}" class="back-button">Следующая →</a>')
+    return "\n                ".join(links)
+
+def _if_range_conditions(if_range):
+    """Условия S3 для диапазона с валидатором If-Range или None, если диапазон отдавать нельзя.
+
+    Валидатор проверяет сам S3 в том же запросе: при несовпадении он ответит 412.
+    """
+    if not if_range:
+        return {}
+    if if_range.startswith('"'):
+        return {'IfMatch': if_range}
+    if if_range.startswith('W/'):
+        # Для If-Range допустимо только строгое сравнение ETag - слабый никогда не совпадает
+        return None
+    if_range_date = parse_date(if_range)
+    return {'IfUnmodifiedSince': if_range_date} if if_range_date else None
+
+def _object_etag(s3_client, filename, error):
+    """ETag объекта из ответа S3 304, а при его отсутствии - из head_object."""
+    etag = error.response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('etag')
+    if etag:
+        return etag
+    try:
+        return s3_client.head_object(Bucket=Config.MINIO_BUCKET_NAME, Key=filename).get('ETag')
+    except ClientError:
+        return None
+
+def _object_size(s3_client, filename, error):
+    """Размер объекта для Content-Range ответа 416 (S3 сообщает его в ошибке InvalidRange)."""
+    size = error.response.get('Error', {}).get('ActualObjectSize')
+    if size:
+        return size
+    try:
+        return s3_client.head_object(Bucket=Config.MINIO_BUCKET_NAME, Key=filename).get('ContentLength')
+    except ClientError:
+        return None
+
+def _offload_download(filename):
+    """Передает скачивание книги MinIO: редирект на presigned URL или X-Accel-Redirect в nginx."""
+    redirect_mode = Config.LIBRARY_DOWNLOAD_MODE == 'redirect'
+    # Браузер получает ссылку на публичный адрес MinIO, nginx - на внутренний
+    url = generate_download_url(filename, public=redirect_mode)
+    if not url:
+        return jsonify({"error": "Сервис временно недоступен"}), 500
+    if redirect_mode:
+        response = redirect(url, code=302)
+    else:
+        # nginx проксирует внутренний location на MinIO, сохраняя путь и подпись presigned URL
+        parts = urlsplit(url)
+        response = Response(status=200)
+        response.headers['X-Accel-Redirect'] = f"{Config.LIBRARY_ACCEL_LOCATION}{parts.path.lstrip('/')}?{parts.query}"
+    # Ссылка короткоживущая, кэшировать ответ нельзя
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 # Маршрут для скачивания книг
 @bp.route('/download/<filename>')
 def download_book(filename):
@@ -176,31 +282,78 @@ def download_book(filename):
     access_token = session.get('access_token')
     if not access_token:
         return jsonify({"error": "Требуется аутентификация"}), 401
+    # Режим redirect требует адреса MinIO, доступного браузеру; без него книга отдается через Flask
+    if Config.LIBRARY_DOWNLOAD_MODE == 'accel' or (Config.LIBRARY_DOWNLOAD_MODE == 'redirect'
+                                                    and Config.MINIO_PUBLIC_ENDPOINT):
+        return _offload_download(filename)
     try:
         # Получаем клиент S3
         s3_client = get_s3_client()  # Импортируем из services
         if not s3_client:
             return jsonify({"error": "Сервис временно недоступен"}), 500
 
-        # Проверяем существование файла
+        params = {'Bucket': Config.MINIO_BUCKET_NAME, 'Key': filename}
+        # Условные запросы передаем в S3: при совпадении валидатора S3 ответит 304
+        if request.headers.get('If-None-Match'):
+            params['IfNoneMatch'] = request.headers['If-None-Match']
+        elif request.if_modified_since:
+            params['IfModifiedSince'] = request.if_modified_since
+        # Диапазон передаем в S3, если он одиночный; валидатор If-Range S3 проверяет в том же запросе
+        range_params = {}
+        range_header = request.headers.get('Range')
+        if range_header and SINGLE_RANGE_RE.match(range_header):
+            if_range_conditions = _if_range_conditions(request.headers.get('If-Range'))
+            if if_range_conditions is not None:
+                range_params = dict(if_range_conditions, Range=range_header)
+
         try:
-            head_response = s3_client.head_object(Bucket=Config.MINIO_BUCKET_NAME, Key=filename)
-        except ClientError:
+            try:
+                response = s3_client.get_object(**params, **range_params)
+            except ClientError as e:
+                if not range_params or e.response.get('Error', {}).get('Code') not in ('412', 'PreconditionFailed'):
+                    raise
+                # Файл изменился после If-Range - отдаем его целиком
+                response = s3_client.get_object(**params)
+        except ClientError as e:
+            error_code = e.response.get('Error', {}).get('Code')
+            if error_code in ('304', 'NotModified'):
+                # ETag текущей версии объекта, а не присланный клиентом
+                etag = _object_etag(s3_client, filename, e)
+                return Response(status=304, headers={'ETag': etag} if etag else {})
+            if error_code == 'InvalidRange':
+                size = _object_size(s3_client, filename, e)
+                response = jsonify({"error": "Запрошенный диапазон недоступен"})
+                response.status_code = 416
+                if size:
+                    response.headers['Content-Range'] = f'bytes */{size}'
+                return response
             # Если файл не найден
             return jsonify({"error": "Файл не найден"}), 404
 
-        # Получаем содержимое файла из S3
-        response = s3_client.get_object(Bucket=Config.MINIO_BUCKET_NAME, Key=filename)
-        file_content = response['Body'].read()
+        headers = {
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Content-Length': str(response['ContentLength']),
+            'Accept-Ranges': 'bytes',
+            'ETag': response['ETag'],
+            'Last-Modified': http_date(response['LastModified'])
+        }
+        if 'ContentRange' in response:
+            headers['Content-Range'] = response['ContentRange']
+
+        body = response['Body']
+        def generate():
+            """Отдает файл блоками фиксированного размера прямо из тела ответа S3."""
+            try:
+                for chunk in body.iter_chunks(chunk_size=Config.DOWNLOAD_CHUNK_SIZE):
+                    yield chunk
+            finally:
+                body.close()
 
-        # Возвращаем файл как ответ
         return Response(
-            file_content,
+            stream_with_context(generate()),
+            status=206 if 'ContentRange' in response else 200,
             mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Length': str(len(file_content))
-            }
+            headers=headers
         )
     except Exception as e:
         logging.getLogger(__name__).error(f"Ошибка скачивания книги {filename}: {e}")
@@ -221,13 +374,11 @@ def generate_new_books():
             return jsonify({"error": "Сервис временно недоступен"}), 500
 
         new_books = []
-        # Получаем список существующих книг для определения следующего номера
-        try:
-            response = s3_client.list_objects_v2(Bucket=Config.MINIO_BUCKET_NAME)
-            existing_books = [obj for obj in response.get('Contents', []) if obj['Key'].endswith('.pdf')]
-            next_number = len(existing_books) + 1
-        except:
-            next_number = 1
+        # Резервируем номера книг атомарно: параллельные запросы получают непересекающиеся блоки
+        next_number = reserve_book_numbers(3)
+        if next_number is None:
+            # Без Redis номера не уникальны - не генерируем книги с повторяющимися номерами
+            return jsonify({"error": "Сервис временно недоступен"}), 503
 
         # Импортируем функцию генерации PDF
         from ..utils.content_generation import create_random_pdf_book
@@ -247,21 +398,25 @@ def generate_new_books():
                 continue  # Продолжаем с другими книгами, даже если одна не удалась
 
             # Загружаем в Minio S3 (только ASCII в метаданных)
-            s3_client.put_object(
+            metadata = {
+                'title': title,  # Только ASCII
+                'author': author,  # Только ASCII
+                'description': description,  # Только ASCII
+                'generated': 'true',
+                'timestamp': str(int(time.time())),
+                'language': 'en',
+                'book_number': str(book_number)  # Только ASCII
+            }
+            put_response = s3_client.put_object(
                 Bucket=Config.MINIO_BUCKET_NAME,
                 Key=filename,
                 Body=pdf_bytes,
                 ContentType='application/pdf',
-                Metadata={
-                    'title': title,  # Только ASCII
-                    'author': author,  # Только ASCII
-                    'description': description,  # Только ASCII
-                    'generated': 'true',
-                    'timestamp': str(int(time.time())),
-                    'language': 'en',
-                    'book_number': str(book_number)  # Только ASCII
-                }
+                Metadata=metadata
             )
+            # Добавляем книгу в каталог библиотеки
+            # Текст книги не извлекается в запросе: он будет извлечен и закэширован при первом просмотре
+            register_book(filename, len(pdf_bytes), metadata, etag=put_response.get('ETag'))
             new_books.append({
                 'filename': filename,
                 'title': f'Сгенерированная книга {book_number}',
@@ -296,41 +451,36 @@ def generate_books_async():
         # Получаем данные из запроса
         data = request.get_json() if request.is_json else {}
         count = data.get('count', 3) if data else 3
+        priority_name = data.get('priority', 'normal') if data else 'normal'
+        priority = task_priority(priority_name)
+        if priority is None:
+            return jsonify({"error": f"Некорректный приоритет: {priority_name}"}), 400
         user_id = session.get('user', request.headers.get('X-Forwarded-User', 'unknown_user'))
         logging.getLogger(__name__).info(
             f"Постановка задачи генерации {count} книг в очередь от пользователя {user_id}")
 
-        # Создаем подключение к RabbitMQ
-        connection = get_rabbitmq_connection()  # Импортируем из utils.task_helpers
-        if not connection:
-            return jsonify({"error": "Сервис генерации временно недоступен"}), 503
-
-        channel = connection.channel()
-        # Объявляем очередь для задач генерации книг (durable для надежности)
-        queue_name = 'book_generation_queue'
-        channel.queue_declare(queue=queue_name, durable=True)
-
         # Формируем сообщение задачи
         task_message = {
             'task_id': str(uuid.uuid4()),
             'user_id': user_id,
             'count': count,
             'timestamp': time.time(),
-            'type': 'book_generation'
+            'type': 'book_generation',
+            'priority': priority_name
         }
 
-        # Отправляем сообщение в очередь
-        channel.basic_publish(
-            exchange='',
-            routing_key=queue_name,
-            body=json.dumps(task_message, ensure_ascii=True),
-            properties=pika.BasicProperties(
-                delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
-            )
-        )
-        logging.getLogger(__name__).info(
-            f"Задача генерации книг поставлена в очередь '{queue_name}'. Task ID: {task_message['task_id']}")
-        connection.close()
+        # Отправляем сообщение в очередь через общий publisher процесса
+        if not publish_task(BOOK_GENERATION_QUEUE, task_message, priority=priority):
+            return jsonify({"error": "Сервис генерации временно недоступен"}), 503
+
+        # Начальный статус - в очереди; задача сразу видна в списке задач пользователя
+        redis_conn = get_redis_connection()
+        if redis_conn:
+            try:
+                save_task_status(redis_conn, task_message['task_id'], 'queued',
+                                 f'Задача генерации {count} книг поставлена в очередь', 0, user_id=user_id)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Ошибка записи статуса задачи {task_message['task_id']}: {e}")
 
         return jsonify({
             "status": "queued",
@@ -353,44 +503,33 @@ def get_tasks_status():
         if not redis_conn:
             return jsonify({"error": "Сервис временно недоступен"}), 500
 
-        # Получаем все задачи из Redis по шаблону
-        tasks_pattern = "task_status:*"
-        task_keys = redis_conn.keys(tasks_pattern)
+        # Только задачи текущего пользователя по его индексу, без обхода всех ключей Redis
+        user_id = session.get('user', request.headers.get('X-Forwarded-User', 'unknown_user'))
 
         active_tasks = []
         completed_tasks = []
         failed_tasks = []
 
-        for key in task_keys:
-            try:
-                cached_data = redis_conn.get(key)
-                if cached_data:
-                    task_data = json.loads(cached_data)
-                    # Извлекаем task_id из ключа
-                    task_id = key.replace("task_status:", "")
-
-                    if task_data.get('status') == 'completed':
-                        completed_tasks.append({
-                            'task_id': task_id,
-                            'message': task_data.get('message', ''),
-                            'progress': task_data.get('progress', 100)
-                        })
-                    elif task_data.get('status') == 'failed':
-                        failed_tasks.append({
-                            'task_id': task_id,
-                            'message': task_data.get('message', ''),
-                            'progress': task_data.get('progress', 0)
-                        })
-                    else:
-                        # Считаем активными все остальные статусы (started, processing и т.д.)
-                        active_tasks.append({
-                            'task_id': task_id,
-                            'message': task_data.get('message', ''),
-                            'progress': task_data.get('progress', 0)
-                        })
-            except Exception as e:
-                logging.getLogger(__name__).error(f"Ошибка получения данных задачи {key}: {e}")
-                continue  # Продолжаем обработку других задач
+        for task_id, task_data in get_user_tasks(redis_conn, user_id):
+            if task_data.get('status') == 'completed':
+                completed_tasks.append({
+                    'task_id': task_id,
+                    'message': task_data.get('message', ''),
+                    'progress': task_data.get('progress', 100)
+                })
+            elif task_data.get('status') == 'failed':
+                failed_tasks.append({
+                    'task_id': task_id,
+                    'message': task_data.get('message', ''),
+                    'progress': task_data.get('progress', 0)
+                })
+            else:
+                # Считаем активными все остальные статусы (started, processing и т.д.)
+                active_tasks.append({
+                    'task_id': task_id,
+                    'message': task_data.get('message', ''),
+                    'progress': task_data.get('progress', 0)
+                })
 
         return jsonify({
             "status": "success",
@@ -402,6 +541,82 @@ def get_tasks_status():
     except Exception as e:
         logging.getLogger(__name__).error(f"Ошибка получения статуса задач: {e}")
         return jsonify({"error": "Ошибка получения статуса задач"}), 500
+# Свободные места для SSE-потоков процесса (см. TASK_STREAM_MAX_CONNECTIONS)
+_task_stream_slots = threading.BoundedSemaphore(Config.TASK_STREAM_MAX_CONNECTIONS)
+
+def _task_event(task):
+    """Событие SSE с состоянием задачи; id события - время обновления статуса"""
+    return f"id: {task.get('updated_at', 0)}\nevent: task\ndata: {json.dumps(task)}\n\n"
+
+@bp.route('/tasks/stream')
+def stream_tasks_status():
+    """SSE-поток изменений статусов задач пользователя (Redis pub/sub)"""
+    access_token = session.get('access_token')
+    if not access_token:
+        return jsonify({"error": "Требуется аутентификация"}), 401
+    user_id = session.get('user', request.headers.get('X-Forwarded-User', 'unknown_user'))
+    # При переподключении EventSource передает id последнего полученного события
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_event_id = 0
+
+    # Сверх лимита потоков клиент получает 503 и переходит на опрос /library/tasks/status
+    if not _task_stream_slots.acquire(blocking=False):
+        logging.getLogger(__name__).warning("Достигнут лимит SSE-потоков статусов задач")
+        return jsonify({"error": "Слишком много открытых потоков статусов"}), 503
+
+    pubsub = None
+    released = []
+
+    def release():
+        # Вызывается и из генератора, и при закрытии ответа - освобождаем один раз
+        if released:
+            return
+        released.append(True)
+        if pubsub is not None:
+            pubsub.close()
+        _task_stream_slots.release()
+
+    try:
+        # Подписка держит соединение весь поток, поэтому берется из отдельного пула pub/sub
+        pubsub = get_redis_pubsub_connection().pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(user_task_events_channel(user_id))
+        # Снимок читается после подписки, поэтому изменения между ними не теряются
+        tasks = get_user_tasks(get_redis_connection(), user_id)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Ошибка подписки на статусы задач: {e}")
+        release()
+        return jsonify({"error": "Сервис временно недоступен"}), 503
+
+    def generate():
+        try:
+            yield f"retry: {Config.TASK_STREAM_RETRY_MS}\n\n"
+            for task_id, task_data in tasks:
+                if task_data.get('updated_at', 0) >= last_event_id:
+                    yield _task_event(dict(task_data, task_id=task_id))
+            started_at = last_sent_at = time.monotonic()
+            # Соединение периодически закрывается, клиент переподключается с Last-Event-ID
+            while time.monotonic() - started_at < Config.TASK_STREAM_MAX_DURATION:
+                message = pubsub.get_message(timeout=1.0)
+                if message:
+                    yield _task_event(json.loads(message['data']))
+                    last_sent_at = time.monotonic()
+                elif time.monotonic() - last_sent_at >= Config.TASK_STREAM_HEARTBEAT_INTERVAL:
+                    yield ": heartbeat\n\n"
+                    last_sent_at = time.monotonic()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Ошибка потока статусов задач: {e}")
+        finally:
+            release()
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Генератор может не запуститься, если клиент отключился сразу
+    response.call_on_close(release)
+    return response
 @bp.route('/generate-large-books', methods=['POST'])
 def generate_large_books():
     """Генерация больших книг через RabbitMQ с реальным прогрессом(исп. Redis)"""
@@ -413,26 +628,22 @@ def generate_large_books():
         data = request.get_json() if request.is_json else {}
         count = data.get('count', 5) if data else 5  # По умолчанию 5 больших книг
         word_count = data.get('word_count', 5000) if data else 5000  # По умолчанию 5000 слов
+        # Приоритет для всех задач; по умолчанию первые 2 задачи - high, остальные - normal
+        requested_priority = data.get('priority') if data else None
+        if requested_priority is not None and task_priority(requested_priority) is None:
+            return jsonify({"error": f"Некорректный приоритет: {requested_priority}"}), 400
         user_id = session.get('user', request.headers.get('X-Forwarded-User', 'unknown_user'))
         logging.getLogger(__name__).info(
             f"Постановка задачи генерации {count} больших книг ({word_count} слов) в очередь от пользователя {user_id}")
 
         try:
-            # Создаем подключение к RabbitMQ
-            connection = get_rabbitmq_connection()  
-            if not connection:
-                return jsonify({"error": "Сервис генерации временно недоступен"}), 503
-
-            channel = connection.channel()
-            # Объявляем очередь для задач генерации больших книг (durable для надежности)
-            queue_name = 'large_book_generation_queue'
-            channel.queue_declare(queue=queue_name, durable=True)
-
+            queue_name = LARGE_BOOK_GENERATION_QUEUE
             task_ids = []  # Список для отслеживания ID задач
 
             # Ставим несколько задач в очередь
             for i in range(count):
                 task_id = str(uuid.uuid4())  # Генерируем уникальный ID задачи
+                priority_name = requested_priority or ('high' if i < 2 else 'normal')
                 task_message = {
                     'task_id': task_id,
                     'user_id': user_id,
@@ -440,40 +651,22 @@ def generate_large_books():
                     'word_count': word_count,  # Количество слов в книге
                     'timestamp': time.time(),
                     'type': 'large_book_generation',
-                    # Можно добавить приоритет, если нужно
-                    'priority': 'high' if i < 2 else 'normal'  # Первые 2 задачи с высоким приоритетом
+                    'priority': priority_name
                 }
 
-                # Отправляем сообщение в очередь с возможностью установки приоритета
-                channel.basic_publish(
-                    exchange='',
-                    routing_key=queue_name,
-                    body=json.dumps(task_message, ensure_ascii=True),
-                    properties=pika.BasicProperties(
-                        delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
-                        # Устанавливаем приоритет, если он есть в сообщении
-                        priority=1 if i < 2 else 0  # 1 - высокий, 0 - нормальный
-                    )
-                )
+                # Отправляем сообщение в очередь с приоритетом (очередь объявлена с x-max-priority)
+                if not publish_task(queue_name, task_message, priority=task_priority(priority_name)):
+                    return jsonify({"error": "Сервис генерации временно недоступен"}), 503
                 task_ids.append(task_id)  # Добавляем ID задачи в список
-                logging.getLogger(__name__).info(
-                    f"Задача генерации большой книги поставлена в очередь '{queue_name}'. Task ID: {task_id}")
-
-            connection.close()
 
             # Дополнительно: записываем начальный статус задач в Redis для отслеживания
             redis_conn = get_redis_connection()  # Импортируем из extensions
             if redis_conn:
                 for task_id in task_ids:
-                    task_key = f"task_status:{task_id}"
-                    task_data = {
-                        'status': 'queued',  # Начальный статус - в очереди
-                        'message': f'Задача поставлена в очередь для генерации большой книги {task_id}',
-                        'progress': 0,  # Начальный прогресс 0%
-                        'updated_at': int(time.time())
-                    }
-                    # Записываем статус задачи в Redis с TTL 1 час (3600 секунд)
-                    redis_conn.setex(task_key, 3600, json.dumps(task_data))
+                    # Начальный статус - в очереди; задача добавляется в индекс задач пользователя
+                    save_task_status(redis_conn, task_id, 'queued',
+                                     f'Задача поставлена в очередь для генерации большой книги {task_id}', 0,
+                                     user_id=user_id)
 
             # Возвращаем успешный ответ с информацией о поставленных задачах
             return jsonify({
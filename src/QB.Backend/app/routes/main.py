@@ -1,6 +1,10 @@
 """Основные маршруты приложения."""
 from flask import Blueprint, jsonify, redirect, session, request, url_for, render_template_string
 from ..utils.content_generation import get_random_quote
+from ..extensions import get_redis_pool_stats, get_db_pool_stats
+from ..services.task_publisher import get_task_publisher_stats
+from ..services.book_text import get_book_text_cache_stats
+from ..utils.task_helpers import get_userinfo_cache_stats, get_rejected_token_cache_stats
 import logging
 
 bp = Blueprint('main', __name__)
@@ -9,6 +13,21 @@ def check():
     """Маршрут для проверки состояния сервиса (без аутентификации)."""
     return jsonify({"status": "OK"})
 
+@bp.route('/stats')
+def stats():
+    """Статистика использования пулов соединений и кэшей процесса."""
+    access_token = session.get('access_token')
+    if not access_token:
+        return jsonify({"error": "Требуется аутентификация"}), 401
+    return jsonify({
+        "redis": get_redis_pool_stats(),
+        "postgres": get_db_pool_stats(),
+        "rabbitmq_publisher": get_task_publisher_stats(),
+        "book_text_cache": get_book_text_cache_stats(),
+        "userinfo_cache": get_userinfo_cache_stats(),
+        "rejected_token_cache": get_rejected_token_cache_stats()
+    })
+
 @bp.route('/')
 def index():
     """Главная страница приложения."""
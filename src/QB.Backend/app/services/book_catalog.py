@@ -0,0 +1,129 @@
+"""Каталог книг библиотеки в Redis (метаданные без обращения к S3)."""
+import datetime
+import json
+from ..extensions import get_redis_connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Hash: имя файла -> JSON с метаданными книги
+CATALOG_KEY = "library:catalog"
+# Sorted set имён файлов с одинаковым score - лексикографический индекс для keyset-пагинации
+CATALOG_INDEX_KEY = "library:catalog:index"
+# Каталог построен по bucket'у (до этого страницы читаются напрямую из S3)
+CATALOG_BUILT_KEY = "library:catalog:built"
+# Временные ключи перестроения и признак идущего перестроения
+CATALOG_REBUILD_KEY = "library:catalog:rebuild"
+CATALOG_REBUILD_INDEX_KEY = "library:catalog:rebuild:index"
+CATALOG_REBUILDING_KEY = "library:catalog:rebuilding"
+# Блокировка построения каталога (одно перестроение за раз)
+CATALOG_LOCK_KEY = "library:catalog:lock"
+CATALOG_LOCK_TTL = 600
+
+# Книга пишется в каталог и, если идет перестроение, во временные ключи -
+# иначе замена каталога перестроенным потеряла бы книги, загруженные во время обхода bucket'а
+REGISTER_BOOK_SCRIPT = """
+redis.call('hset', KEYS[1], ARGV[1], ARGV[2])
+redis.call('zadd', KEYS[2], 0, ARGV[1])
+if redis.call('exists', KEYS[5]) == 1 then
+    redis.call('hset', KEYS[3], ARGV[1], ARGV[2])
+    redis.call('zadd', KEYS[4], 0, ARGV[1])
+end
+return 1
+"""
+
+# Атомарная замена каталога перестроенным
+FINISH_REBUILD_SCRIPT = """
+if redis.call('exists', KEYS[3]) == 1 then
+    redis.call('rename', KEYS[3], KEYS[1])
+    redis.call('rename', KEYS[4], KEYS[2])
+else
+    redis.call('del', KEYS[1], KEYS[2])
+end
+redis.call('del', KEYS[5])
+redis.call('set', KEYS[6], 1)
+return 1
+"""
+
+_CATALOG_KEYS = (CATALOG_KEY, CATALOG_INDEX_KEY, CATALOG_REBUILD_KEY, CATALOG_REBUILD_INDEX_KEY,
+                 CATALOG_REBUILDING_KEY)
+
+def make_catalog_entry(filename, size, metadata, last_modified=None, etag=None):
+    """Формирует запись каталога из метаданных S3 объекта."""
+    if last_modified is None:
+        last_modified = datetime.datetime.now(datetime.timezone.utc)
+    return {
+        'filename': filename,
+        'size': size,
+        'last_modified': last_modified.isoformat(),
+        'title': metadata.get('title', filename),
+        'author': metadata.get('author', 'Неизвестный автор'),
+        'description': metadata.get('description', 'Описание отсутствует'),
+        'etag': etag
+    }
+
+def register_book(filename, size, metadata, etag=None):
+    """Добавляет загруженную книгу в каталог. Ошибка каталога не прерывает загрузку."""
+    try:
+        redis_conn = get_redis_connection()
+        entry = make_catalog_entry(filename, size, metadata, etag=etag)
+        redis_conn.eval(REGISTER_BOOK_SCRIPT, len(_CATALOG_KEYS), *_CATALOG_KEYS, filename, json.dumps(entry))
+        logger.info(f"Книга {filename} добавлена в каталог")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка добавления книги {filename} в каталог: {e}")
+        return False
+
+def list_catalog_page(cursor=None, limit=24):
+    """Получает страницу книг после cursor (имя последней книги предыдущей страницы).
+
+    Возвращает (книги, cursor следующей страницы) или None, если каталог недоступен или еще не построен.
+    """
+    try:
+        redis_conn = get_redis_connection()
+        min_value = f"({cursor}" if cursor else "-"
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.exists(CATALOG_BUILT_KEY)
+        # Запрашиваем на одну запись больше, чтобы понять, есть ли следующая страница
+        pipe.zrangebylex(CATALOG_INDEX_KEY, min_value, "+", start=0, num=limit + 1)
+        built, filenames = pipe.execute()
+        if not built:
+            return None
+        has_more = len(filenames) > limit
+        filenames = filenames[:limit]
+        if not filenames:
+            return [], None
+        entries = redis_conn.hmget(CATALOG_KEY, filenames)
+        books = [json.loads(entry) for entry in entries if entry]
+        return books, filenames[-1] if has_more else None
+    except Exception as e:
+        logger.error(f"Ошибка чтения каталога книг из Redis: {e}")
+        return None
+
+def is_catalog_built():
+    """Проверяет, построен ли каталог по содержимому bucket'а."""
+    return bool(get_redis_connection().exists(CATALOG_BUILT_KEY))
+
+def start_catalog_rebuild():
+    """Начинает перестроение: очищает временные ключи и включает запись новых книг в них."""
+    pipe = get_redis_connection().pipeline(transaction=True)
+    pipe.delete(CATALOG_REBUILD_KEY, CATALOG_REBUILD_INDEX_KEY)
+    pipe.set(CATALOG_REBUILDING_KEY, 1, ex=CATALOG_LOCK_TTL)
+    pipe.execute()
+
+def abort_catalog_rebuild():
+    """Отменяет перестроение, оставляя текущий каталог."""
+    get_redis_connection().delete(CATALOG_REBUILDING_KEY, CATALOG_REBUILD_KEY, CATALOG_REBUILD_INDEX_KEY)
+
+def finish_catalog_rebuild(books):
+    """Дописывает книги во временные ключи и атомарно (RENAME) заменяет ими каталог."""
+    redis_conn = get_redis_connection()
+    if books:
+        pipe = redis_conn.pipeline(transaction=True)
+        # Книги, зарегистрированные во время обхода bucket'а, уже во временных ключах и не перезаписываются
+        for book in books:
+            pipe.hsetnx(CATALOG_REBUILD_KEY, book['filename'], json.dumps(book))
+        pipe.zadd(CATALOG_REBUILD_INDEX_KEY, {book['filename']: 0 for book in books})
+        pipe.execute()
+    redis_conn.eval(FINISH_REBUILD_SCRIPT, 6, *_CATALOG_KEYS, CATALOG_BUILT_KEY)
+    logger.info(f"Каталог книг перестроен: {len(books)} книг из bucket'а")
@@ -0,0 +1,32 @@
+"""Сквозная нумерация генерируемых книг (счетчик в Redis)."""
+from ..extensions import get_redis_connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Номер последней выданной книги
+BOOK_NUMBER_KEY = "library:book_number"
+
+def book_numbers_seeded():
+    """Проверяет, инициализирован ли счетчик номеров книг."""
+    return bool(get_redis_connection().exists(BOOK_NUMBER_KEY))
+
+def seed_book_numbers(existing_count):
+    """Инициализирует счетчик количеством уже существующих книг, если он еще не задан."""
+    try:
+        seeded = get_redis_connection().set(BOOK_NUMBER_KEY, existing_count, nx=True)
+        if seeded:
+            logger.info(f"Счетчик номеров книг инициализирован значением {existing_count}")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка инициализации счетчика номеров книг: {e}")
+        return False
+
+def reserve_book_numbers(count):
+    """Резервирует непрерывный блок из count номеров книг. Возвращает первый номер или None."""
+    try:
+        last_number = get_redis_connection().incrby(BOOK_NUMBER_KEY, count)
+        return last_number - count + 1
+    except Exception as e:
+        logger.error(f"Ошибка резервирования номеров книг: {e}")
+        return None
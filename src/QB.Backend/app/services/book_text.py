@@ -0,0 +1,179 @@
+"""Кэш извлеченного из PDF текста книг для страницы просмотра."""
+import io
+import json
+from botocore.exceptions import ClientError
+from ..extensions import get_redis_connection
+from ..utils.cache import LRUCache
+from ..utils.content_generation import extract_text_from_pdf, extract_pdf_page_text, PDF_TEXT_ERROR
+from ..config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Суффикс объекта с текстом книги, который worker кладет рядом с PDF
+TEXT_SIDECAR_SUFFIX = ".txt"
+
+# Кэш текста в памяти процесса; ключ содержит ETag, поэтому запись не устаревает при замене файла
+book_text_cache = LRUCache(Config.BOOK_TEXT_CACHE_SIZE, Config.BOOK_TEXT_CACHE_TTL)
+
+class S3RangeReader(io.RawIOBase):
+    """Файловый объект только для чтения поверх S3 объекта: данные читаются Range-запросами.
+
+    Позволяет PdfReader читать xref и нужные страницы, не скачивая весь PDF.
+    """
+
+    def __init__(self, s3_client, key, size, etag=None):
+        self._s3_client = s3_client
+        self._key = key
+        self._size = size
+        self._etag = etag
+        self._position = 0
+        self.range_requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        else:
+            position = self._size + offset
+        self._position = max(0, position)
+        return self._position
+
+    def readinto(self, buffer):
+        if self._position >= self._size or not len(buffer):
+            return 0
+        end = min(self._position + len(buffer), self._size) - 1
+        params = {'Bucket': Config.MINIO_BUCKET_NAME, 'Key': self._key,
+                  'Range': f"bytes={self._position}-{end}"}
+        if self._etag:
+            # Объект не должен измениться между Range-запросами
+            params['IfMatch'] = self._etag
+        data = self._s3_client.get_object(**params)['Body'].read()
+        self.range_requests += 1
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+def open_s3_object(s3_client, key, size, etag=None):
+    """Открывает S3 объект как буферизованный файл с чтением блоками PDF_RANGE_READ_SIZE."""
+    return io.BufferedReader(S3RangeReader(s3_client, key, size, etag), buffer_size=Config.PDF_RANGE_READ_SIZE)
+
+def text_sidecar_key(filename):
+    """Ключ S3 объекта с текстом книги."""
+    return f"{filename}{TEXT_SIDECAR_SUFFIX}"
+
+def book_text_cache_key(filename, etag):
+    """Ключ кэша текста книги: bucket/ключ/ETag объекта."""
+    return "book_text:{}:{}:{}".format(Config.MINIO_BUCKET_NAME, filename, etag.strip('"'))
+
+def _cache_text(cache_key, text):
+    """Сохраняет текст в кэше процесса и в Redis. Ошибка Redis не критична."""
+    book_text_cache.set(cache_key, text)
+    try:
+        get_redis_connection().set(cache_key, text, ex=Config.BOOK_TEXT_REDIS_TTL)
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить текст книги в Redis: {e}")
+
+def store_book_text(s3_client, filename, pdf_bytes, etag):
+    """Извлекает текст только что загруженной книги и сохраняет его рядом с PDF и в кэше.
+
+    Без ETag загруженного PDF sidecar не сохраняется: текст будет извлечен при первом просмотре.
+    """
+    if not etag:
+        logger.warning(f"Нет ETag загруженной книги {filename}, текст не сохранен")
+        return False
+    try:
+        text = extract_text_from_pdf(pdf_bytes)
+        if text == PDF_TEXT_ERROR:
+            return False
+        s3_client.put_object(
+            Bucket=Config.MINIO_BUCKET_NAME,
+            Key=text_sidecar_key(filename),
+            Body=text.encode('utf-8'),
+            ContentType='text/plain; charset=utf-8',
+            # ETag PDF, из которого извлечен текст - для проверки актуальности sidecar
+            Metadata={'source-etag': etag.strip('"')}
+        )
+        _cache_text(book_text_cache_key(filename, etag), text)
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка сохранения текста книги {filename}: {e}")
+        return False
+
+def _read_text_sidecar(s3_client, filename, etag):
+    """Читает текст книги из sidecar объекта, если он соответствует текущему ETag PDF."""
+    try:
+        response = s3_client.get_object(Bucket=Config.MINIO_BUCKET_NAME, Key=text_sidecar_key(filename))
+    except ClientError:
+        return None
+    if response.get('Metadata', {}).get('source-etag') != etag.strip('"'):
+        return None
+    return response['Body'].read().decode('utf-8')
+
+def get_book_text(s3_client, filename, etag, size):
+    """Получает текст книги: кэш процесса -> Redis -> sidecar в S3 -> разбор PDF."""
+    cache_key = book_text_cache_key(filename, etag)
+    text = book_text_cache.get(cache_key)
+    if text is not None:
+        return text
+
+    try:
+        text = get_redis_connection().get(cache_key)
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать текст книги из Redis: {e}")
+        text = None
+    if text is not None:
+        book_text_cache.set(cache_key, text)
+        return text
+
+    text = _read_text_sidecar(s3_client, filename, etag)
+    if text is None:
+        # Текст не был сохранен заранее: читаем из PDF только первые страницы
+        text = extract_text_from_pdf(open_s3_object(s3_client, filename, size, etag))
+        if text == PDF_TEXT_ERROR:
+            return text
+    _cache_text(cache_key, text)
+    return text
+
+def get_book_page(s3_client, filename, etag, size, page_number):
+    """Получает текст одной страницы книги: кэш процесса -> Redis -> разбор только этой страницы PDF.
+
+    Возвращает словарь {'text', 'page', 'pages'}; text равен None, если страницы нет.
+    """
+    cache_key = f"{book_text_cache_key(filename, etag)}:page:{page_number}"
+    page = book_text_cache.get(cache_key)
+    if page is not None:
+        return page
+
+    try:
+        cached = get_redis_connection().get(cache_key)
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать страницу книги из Redis: {e}")
+        cached = None
+    if cached is not None:
+        page = json.loads(cached)
+        book_text_cache.set(cache_key, page)
+        return page
+
+    text, page_count = extract_pdf_page_text(open_s3_object(s3_client, filename, size, etag), page_number)
+    page = {'text': text, 'page': page_number, 'pages': page_count}
+    book_text_cache.set(cache_key, page)
+    try:
+        get_redis_connection().set(cache_key, json.dumps(page), ex=Config.BOOK_TEXT_REDIS_TTL)
+    except Exception as e:
+        logger.warning(f"Не удалось сохранить страницу книги в Redis: {e}")
+    return page
+
+def get_book_text_cache_stats():
+    """Статистика кэша текста книг."""
+    return book_text_cache.stats()
@@ -0,0 +1,176 @@
+"""Локальная проверка access token'ов Keycloak по JWKS realm'а."""
+import threading
+import time
+import jwt
+import requests
+from requests.adapters import HTTPAdapter
+from ..config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Результаты локальной проверки токена
+TOKEN_VALID = "valid"
+TOKEN_EXPIRED = "expired"
+TOKEN_INVALID = "invalid"
+# Проверить токен локально невозможно (Keycloak недоступен, ключи не получены)
+TOKEN_UNVERIFIED = "unverified"
+
+def realm_url():
+    """Внутренний адрес realm'а Keycloak."""
+    return f"https://{Config.KEYCLOAK_HOST}:{Config.KEYCLOAK_PORT}/realms/{Config.KEYCLOAK_REALM}"
+
+def keycloak_verify_ssl():
+    """Настройка SSL-верификации для запросов к Keycloak."""
+    if Config.CA_CERTIFICATE and Config.CA_CERTIFICATE.lower() != "false":
+        return Config.CA_CERTIFICATE
+    if Config.CA_CERTIFICATE:
+        return False
+    return True
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_keycloak_session():
+    """Общая (на процесс) HTTP-сессия для запросов к Keycloak.
+
+    Соединения keep-alive переиспользуются между запросами, поэтому промах кэша
+    в /auth/validate не требует нового TLS-рукопожатия. CA bundle определяется один раз.
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                http_session = requests.Session()
+                http_session.mount('https://', HTTPAdapter(pool_connections=1,
+                                                           pool_maxsize=Config.KEYCLOAK_HTTP_POOL_SIZE))
+                http_session.verify = keycloak_verify_ssl()
+                _http_session = http_session
+    return _http_session
+
+def keycloak_request(method, url, **kwargs):
+    """Запрос к Keycloak через общую сессию с таймаутами подключения и чтения из Config."""
+    kwargs.setdefault('timeout', (Config.KEYCLOAK_CONNECT_TIMEOUT, Config.KEYCLOAK_READ_TIMEOUT))
+    return get_keycloak_session().request(method, url, **kwargs)
+
+class KeycloakMetadataCache:
+    """Кэш discovery-документа и JWKS realm'а.
+
+    Устаревшие данные продолжают использоваться, пока обновление идет в фоне.
+    Токен с неизвестным kid (ротация ключей) приводит к немедленному обновлению,
+    но не чаще, чем раз в min_refresh_interval секунд.
+    """
+
+    def __init__(self, ttl, min_refresh_interval):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._lock = threading.Lock()
+        self._discovery = None
+        self._keys = {}
+        self._fetched_at = 0
+        self._refreshing = False
+
+    def _fetch(self):
+        """Загружает discovery-документ и ключи подписи realm'а."""
+        discovery_response = keycloak_request('GET', f"{realm_url()}/.well-known/openid-configuration")
+        discovery_response.raise_for_status()
+        # jwks_uri из discovery содержит внешний адрес Keycloak, поэтому ключи берем по внутреннему
+        jwks_response = keycloak_request('GET', f"{realm_url()}/protocol/openid-connect/certs")
+        jwks_response.raise_for_status()
+        keys = {}
+        for jwk in jwks_response.json().get('keys', []):
+            if jwk.get('use', 'sig') != 'sig' or 'kid' not in jwk:
+                continue
+            try:
+                keys[jwk['kid']] = jwt.PyJWK(jwk)
+            except jwt.PyJWKError as e:
+                logger.warning(f"Ключ {jwk['kid']} из JWKS Keycloak пропущен: {e}")
+        with self._lock:
+            self._discovery = discovery_response.json()
+            self._keys = keys
+            self._fetched_at = time.monotonic()
+        logger.info(f"JWKS Keycloak обновлен: {len(keys)} ключей")
+
+    def refresh(self):
+        """Синхронно обновляет кэш. Возвращает False, если Keycloak недоступен."""
+        try:
+            self._fetch()
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка получения JWKS Keycloak: {e}")
+            return False
+
+    def _refresh_in_background(self):
+        """Запускает обновление кэша в фоновом потоке (не более одного одновременно)."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            finally:
+                self._refreshing = False
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, kid):
+        """Возвращает (discovery-документ, ключ подписи с идентификатором kid)."""
+        age = time.monotonic() - self._fetched_at
+        if self._discovery is None or (kid not in self._keys and age > self.min_refresh_interval):
+            self.refresh()
+        elif age > self.ttl:
+            self._refresh_in_background()
+        return self._discovery, self._keys.get(kid)
+
+    def stats(self):
+        """Статистика кэша."""
+        return {
+            'keys': len(self._keys),
+            'age': int(time.monotonic() - self._fetched_at) if self._discovery else None
+        }
+
+metadata_cache = KeycloakMetadataCache(Config.KEYCLOAK_JWKS_CACHE_TTL, Config.KEYCLOAK_JWKS_MIN_REFRESH_INTERVAL)
+
+def validate_access_token(access_token):
+    """Проверяет подпись, exp, aud и iss access token'а локально.
+
+    Возвращает (результат проверки, claims токена или None).
+    """
+    try:
+        header = jwt.get_unverified_header(access_token)
+    except jwt.InvalidTokenError as e:
+        logger.warning(f"Некорректный access token: {e}")
+        return TOKEN_INVALID, None
+
+    discovery, signing_key = metadata_cache.get(header.get('kid'))
+    if discovery is None:
+        return TOKEN_UNVERIFIED, None
+    if signing_key is None:
+        # Обновление JWKS могло быть пропущено из-за min_refresh_interval - ключ может оказаться
+        # новым ключом Keycloak, поэтому токен не отклоняется, а проверяется через userinfo
+        logger.warning(f"Access token подписан неизвестным ключом {header.get('kid')}")
+        return TOKEN_UNVERIFIED, None
+
+    try:
+        claims = jwt.decode(
+            access_token,
+            signing_key.key,
+            # Алгоритм берется из ключа, а не из заголовка токена
+            algorithms=[signing_key.algorithm_name],
+            audience=Config.KEYCLOAK_TOKEN_AUDIENCE,
+            issuer=Config.KEYCLOAK_ISSUER or discovery['issuer'],
+            leeway=Config.KEYCLOAK_TOKEN_LEEWAY,
+            options={'require': ['exp', 'iat', 'iss', 'aud']}
+        )
+    except jwt.ExpiredSignatureError:
+        return TOKEN_EXPIRED, None
+    except jwt.InvalidTokenError as e:
+        logger.warning(f"Access token не прошел проверку: {e}")
+        return TOKEN_INVALID, None
+
+    # Токен должен быть выпущен для нашего клиента
+    if claims.get('azp') != Config.KEYCLOAK_CLIENT_ID:
+        logger.warning(f"Access token выпущен для другого клиента: {claims.get('azp')}")
+        return TOKEN_INVALID, None
+    return TOKEN_VALID, claims
@@ -1,63 +1,178 @@
 """Логика работы с Minio S3."""
 import boto3
 from botocore.exceptions import ClientError
-from ..extensions import get_s3_client
+from ..extensions import get_redis_connection, get_s3_client, get_s3_presign_client
+from .book_catalog import (CATALOG_LOCK_KEY, CATALOG_LOCK_TTL, abort_catalog_rebuild, finish_catalog_rebuild,
+                           is_catalog_built, list_catalog_page, register_book, start_catalog_rebuild)
+from .book_text import store_book_text
+from .book_numbers import book_numbers_seeded, seed_book_numbers
 from ..utils.content_generation import create_random_pdf_book
+from ..utils.locks import acquire_lock, release_lock
 from ..config import Config
+import itertools
 import time
 import logging
 
 logger = logging.getLogger(__name__)
-def list_books_from_s3():
-    """Получение списка книг из S3"""
+def iter_bucket_objects(s3_client, start_after=None):
+    """Постраничный обход объектов bucket'а (по 1000 ключей) через continuation token"""
+    params = {'Bucket': Config.MINIO_BUCKET_NAME}
+    if start_after:
+        params['StartAfter'] = start_after
+    while True:
+        response = s3_client.list_objects_v2(**params)
+        # S3 возвращает ключи в лексикографическом порядке, сортировка не требуется
+        yield from response.get('Contents', [])
+        if not response.get('IsTruncated'):
+            return
+        params['ContinuationToken'] = response['NextContinuationToken']
+def seed_book_numbers_from_bucket(s3_client=None):
+    """Однократно инициализирует счетчик номеров книг количеством PDF в bucket'е"""
+    try:
+        if book_numbers_seeded():
+            return True
+        s3_client = s3_client or get_s3_client()
+        if not s3_client:
+            return False
+        existing_count = sum(1 for obj in iter_bucket_objects(s3_client) if obj['Key'].endswith('.pdf'))
+        return seed_book_numbers(existing_count)
+    except Exception as e:
+        logger.error(f"Ошибка инициализации счетчика номеров книг по bucket'у: {e}")
+        return False
+def list_books_from_s3(start_after=None, limit=None):
+    """Получение списка книг из S3 (после ключа start_after, не более limit книг)"""
     try:
         # Органзовываем клиент S3
         s3_client = get_s3_client()
         if not s3_client:
             return []
-        # Получаем список объектов в bucket'е
-        response = s3_client.list_objects_v2(Bucket=Config.MINIO_BUCKET_NAME)
-        books = []
-        # Проверяем, есть ли объекты в ответе
-        if 'Contents' in response:
-            # Сортируем объекты по имени ключа
-            sorted_objects = sorted([obj for obj in response['Contents'] if obj['Key'].endswith('.pdf')],
-                                    key=lambda x: x['Key'])
-            # Проходим по отсортированным объектам и формируем список книг
-            for idx, obj in enumerate(sorted_objects, 1):
-                try:
-                    # Получаем метаданные объекта
-                    head_response = s3_client.head_object(
-                        Bucket=Config.MINIO_BUCKET_NAME,
-                        Key=obj['Key']
-                    )
-                    metadata = head_response.get('Metadata', {})
-                    # Добавляем информацию о книге в список
-                    books.append({
-                        'filename': obj['Key'],
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified'].isoformat(),
-                        # Используем метаданные или значения по умолчанию
-                        'title': metadata.get('title', f'Сгенерированная книга {idx}'),
-                        'author': metadata.get('author', 'Неизвестный автор'),
-                        'description': metadata.get('description', 'Описание отсутствует')
-                    })
-                except Exception as e:
-                    # Логируем ошибку получения метаданных, но продолжаем обработку
-                    logger.error(f"Ошибка получения метаданных для {obj['Key']}: {e}")
-                    # Добавляем книгу с дефолтными значениями
-                    books.append({
-                        'filename': obj['Key'],
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified'].isoformat(),
-                        'title': f'Сгенерированная книга {idx}',
-                        'author': 'GPN',
-                        'description': 'Книга со случайным содержанием'
-                    })
-        return books
+        return _list_bucket_books(s3_client, start_after, limit)
     except Exception as e:
         logger.error(f"Ошибка получения списка книг из S3: {e}")
         return []
+def _list_bucket_books(s3_client, start_after=None, limit=None):
+    """Список книг bucket'а; ошибка листинга пробрасывается вызывающему"""
+    books = []
+    # Обходим все страницы листинга bucket'а, оставляя только PDF
+    pdf_objects = (obj for obj in iter_bucket_objects(s3_client, start_after) if obj['Key'].endswith('.pdf'))
+    if limit:
+        pdf_objects = itertools.islice(pdf_objects, limit)
+    # Проходим по объектам и формируем список книг
+    for idx, obj in enumerate(pdf_objects, 1):
+        try:
+            # Получаем метаданные объекта
+            head_response = s3_client.head_object(
+                Bucket=Config.MINIO_BUCKET_NAME,
+                Key=obj['Key']
+            )
+            metadata = head_response.get('Metadata', {})
+            # Добавляем информацию о книге в список
+            books.append({
+                'filename': obj['Key'],
+                'size': obj['Size'],
+                'last_modified': obj['LastModified'].isoformat(),
+                # Используем метаданные или значения по умолчанию
+                'title': metadata.get('title', f'Сгенерированная книга {idx}'),
+                'author': metadata.get('author', 'Неизвестный автор'),
+                'description': metadata.get('description', 'Описание отсутствует'),
+                'etag': head_response.get('ETag')
+            })
+        except Exception as e:
+            # Логируем ошибку получения метаданных, но продолжаем обработку
+            logger.error(f"Ошибка получения метаданных для {obj['Key']}: {e}")
+            # Добавляем книгу с дефолтными значениями
+            books.append({
+                'filename': obj['Key'],
+                'size': obj['Size'],
+                'last_modified': obj['LastModified'].isoformat(),
+                'title': f'Сгенерированная книга {idx}',
+                'author': 'GPN',
+                'description': 'Книга со случайным содержанием',
+                'etag': None
+            })
+    return books
+def rebuild_catalog_from_bucket(only_if_missing=False):
+    """Перестраивает каталог книг по содержимому bucket'а под блокировкой.
+
+    Возвращает список книг или None, если перестроение не выполнено (при ошибке текущий каталог сохраняется).
+    С only_if_missing уже построенный каталог не перестраивается и возвращается [].
+    """
+    try:
+        redis_conn = get_redis_connection()
+        lock_token = acquire_lock(redis_conn, CATALOG_LOCK_KEY, CATALOG_LOCK_TTL)
+        if not lock_token:
+            logger.warning("Каталог книг уже перестраивается другим процессом")
+            return None
+    except Exception as e:
+        logger.error(f"Ошибка блокировки перестроения каталога книг: {e}")
+        return None
+    try:
+        # Проверяем повторно под блокировкой: каталог мог построить другой процесс
+        if only_if_missing and is_catalog_built():
+            return []
+        s3_client = get_s3_client()
+        if not s3_client:
+            return None
+        start_catalog_rebuild()
+        try:
+            books = _list_bucket_books(s3_client)
+            finish_catalog_rebuild(books)
+        except Exception:
+            abort_catalog_rebuild()
+            raise
+        return books
+    except Exception as e:
+        logger.error(f"Ошибка перестроения каталога книг, текущий каталог сохранен: {e}")
+        return None
+    finally:
+        try:
+            release_lock(redis_conn, CATALOG_LOCK_KEY, lock_token)
+        except Exception as e:
+            logger.error(f"Ошибка снятия блокировки перестроения каталога книг: {e}")
+def seed_catalog_from_bucket():
+    """Однократно строит каталог книг по bucket'у (до этого страницы читаются напрямую из S3)"""
+    try:
+        if is_catalog_built():
+            return True
+    except Exception as e:
+        logger.error(f"Ошибка проверки каталога книг: {e}")
+        return False
+    return rebuild_catalog_from_bucket(only_if_missing=True) is not None
+def list_books_page_from_s3(cursor=None, limit=Config.LIBRARY_PAGE_SIZE):
+    """Получение страницы книг напрямую из S3 (keyset-пагинация по имени файла)"""
+    books = list_books_from_s3(start_after=cursor, limit=limit)
+    return books, books[-1]['filename'] if len(books) == limit else None
+def list_books_page(cursor=None, limit=Config.LIBRARY_PAGE_SIZE):
+    """Получение страницы книг из каталога: (книги, cursor следующей страницы)"""
+    page = list_catalog_page(cursor, limit)
+    if page is None:
+        # Redis недоступен или каталог еще не построен - читаем страницу напрямую из bucket'а
+        return list_books_page_from_s3(cursor, limit)
+    return page
+def generate_download_url(filename, expires_in=None, public=False):
+    """Формирует короткоживущий presigned URL для скачивания книги напрямую из MinIO.
+
+    public=True - ссылка для браузера, подписанная на MINIO_PUBLIC_ENDPOINT;
+    иначе - на внутренний MINIO_ENDPOINT (для nginx в режиме accel).
+    """
+    s3_client = get_s3_presign_client() if public else get_s3_client()
+    if not s3_client:
+        return None
+    try:
+        return s3_client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': Config.MINIO_BUCKET_NAME,
+                'Key': filename,
+                'ResponseContentDisposition': f'attachment; filename="{filename}"',
+                'ResponseContentType': 'application/pdf'
+            },
+            ExpiresIn=expires_in or Config.LIBRARY_PRESIGNED_URL_EXPIRES
+        )
+    except Exception as e:
+        logger.error(f"Ошибка формирования presigned URL для {filename}: {e}")
+        return None
+
 def upload_random_books_to_minio():
     """Загрузка рандомных книг в Minio"""
     try:
@@ -77,21 +192,25 @@ def upload_random_books_to_minio():
                 logger.error(f"Не удалось создать PDF для {filename}")
                 continue
             # Загружаем книгу в Minio S3
-            s3_client.put_object(
+            metadata = {
+                'title': title,
+                'author': author,
+                'description': description,
+                'generated': 'true',
+                'timestamp': str(int(time.time())),
+                'language': 'en',
+                'book_number': str(i)
+            }
+            put_response = s3_client.put_object(
                 Bucket=Config.MINIO_BUCKET_NAME,
                 Key=filename,
                 Body=pdf_bytes,
                 ContentType='application/pdf',
-                Metadata={
-                    'title': title,
-                    'author': author,
-                    'description': description,
-                    'generated': 'true',
-                    'timestamp': str(int(time.time())),
-                    'language': 'en',
-                    'book_number': str(i)
-                }
+                Metadata=metadata
             )
+            etag = put_response.get('ETag')
+            register_book(filename, len(pdf_bytes), metadata, etag=etag)
+            store_book_text(s3_client, filename, pdf_bytes, etag)
             logger.info(f"Загружена рандомная книга: {filename}")
         return True
     except Exception as e:
@@ -122,6 +241,8 @@ def init_minio():
         except Exception as e:
             logger.error(f"Ошибка проверки содержимого bucket'а: {e}")
             upload_random_books_to_minio()
+        # Нумерация новых книг продолжается после уже загруженных
+        seed_book_numbers_from_bucket(s3_client)
         return s3_client
     except Exception as e:
         logger.error(f"Ошибка инициализации Minio: {e}")
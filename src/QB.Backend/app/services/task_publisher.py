@@ -0,0 +1,156 @@
+"""Долгоживущий publisher задач в RabbitMQ."""
+import json
+import queue
+import threading
+import pika
+from ..config import Config
+from ..utils.task_helpers import get_rabbitmq_connection
+from ..utils.queues import declare_queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых соединение/канал пересоздаются и публикация повторяется
+RECONNECT_ERRORS = (pika.exceptions.AMQPConnectionError, pika.exceptions.AMQPChannelError)
+
+class PublisherChannel:
+    """Канал RabbitMQ в режиме publisher confirms со своим соединением.
+
+    BlockingConnection не потокобезопасен, поэтому каждый канал пула
+    владеет отдельным соединением и используется одним потоком за раз.
+    """
+
+    def __init__(self):
+        self.connection = None
+        self.channel = None
+        self.declared_queues = set()
+
+    def ensure_open(self):
+        """Открывает соединение и канал, если они ещё не открыты или были закрыты."""
+        if self.connection is None or self.connection.is_closed:
+            self.connection = get_rabbitmq_connection()
+            if not self.connection:
+                raise pika.exceptions.AMQPConnectionError("Не удалось подключиться к RabbitMQ")
+            self.channel = None
+            self.declared_queues = set()
+        else:
+            # Обслуживаем heartbeat'ы соединения, простаивавшего между публикациями
+            self.connection.process_data_events(time_limit=0)
+        if self.channel is None or self.channel.is_closed:
+            self.channel = self.connection.channel()
+            self.channel.confirm_delivery()
+            self.declared_queues = set()
+
+    def publish(self, queue_name, body, properties):
+        """Публикует сообщение и дожидается подтверждения брокера."""
+        self.ensure_open()
+        # Очередь объявляется один раз на канал, а не на каждую публикацию
+        if queue_name not in self.declared_queues:
+            self._declare_queue(queue_name)
+            self.declared_queues.add(queue_name)
+        self.channel.basic_publish(
+            exchange='',
+            routing_key=queue_name,
+            body=body,
+            properties=properties,
+            mandatory=True
+        )
+
+    def _declare_queue(self, queue_name):
+        """Объявляет очередь; очередь с прежними аргументами проверяется пассивно.
+
+        Пока worker не перенес очередь на новые аргументы (x-max-priority), объявление
+        закрывает канал с 406 - публикуем в существующую очередь, не меняя ее.
+        """
+        try:
+            declare_queue(self.channel, queue_name)
+        except pika.exceptions.ChannelClosedByBroker as e:
+            if e.reply_code != 406:
+                raise
+            logger.warning(f"Очередь '{queue_name}' объявлена с прежними аргументами, "
+                           f"публикация до ее переноса worker'ом")
+            self.ensure_open()
+            self.channel.queue_declare(queue=queue_name, passive=True)
+
+    def close(self):
+        """Закрывает соединение, игнорируя ошибки уже разорванного соединения."""
+        try:
+            if self.connection is not None and not self.connection.is_closed:
+                self.connection.close()
+        except Exception as e:
+            logger.warning(f"Ошибка закрытия соединения publisher'а RabbitMQ: {e}")
+        finally:
+            self.connection = None
+            self.channel = None
+            self.declared_queues = set()
+
+class TaskPublisher:
+    """Пул каналов RabbitMQ для публикации задач из backend."""
+
+    def __init__(self, pool_size, checkout_timeout):
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self._channels = queue.LifoQueue()
+        for _ in range(pool_size):
+            self._channels.put(PublisherChannel())
+
+    def publish(self, queue_name, message, priority=None):
+        """Публикует задачу, прозрачно переподключаясь при разрыве соединения."""
+        body = json.dumps(message, ensure_ascii=True)
+        properties = pika.BasicProperties(
+            delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+            priority=priority
+        )
+        try:
+            channel = self._channels.get(timeout=self.checkout_timeout)
+        except queue.Empty:
+            raise pika.exceptions.AMQPError(f"Нет свободных каналов RabbitMQ за {self.checkout_timeout} с")
+        try:
+            try:
+                channel.publish(queue_name, body, properties)
+            except RECONNECT_ERRORS as e:
+                logger.warning(f"Соединение с RabbitMQ потеряно ({e}), переподключение...")
+                channel.close()
+                channel.publish(queue_name, body, properties)
+        except RECONNECT_ERRORS:
+            channel.close()
+            raise
+        finally:
+            self._channels.put(channel)
+
+    def stats(self):
+        """Статистика пула каналов."""
+        return {
+            'initialized': True,
+            'pool_size': self.pool_size,
+            'available_channels': self._channels.qsize()
+        }
+
+task_publisher = None
+_publisher_lock = threading.Lock()
+
+def get_task_publisher():
+    """Получение общего (на процесс) publisher'а задач."""
+    global task_publisher
+    if task_publisher is None:
+        with _publisher_lock:
+            if task_publisher is None:
+                task_publisher = TaskPublisher(Config.RABBITMQ_PUBLISHER_POOL_SIZE,
+                                               Config.RABBITMQ_PUBLISHER_TIMEOUT)
+    return task_publisher
+
+def publish_task(queue_name, message, priority=None):
+    """Ставит задачу в очередь RabbitMQ. Возвращает True при подтверждении брокером."""
+    try:
+        get_task_publisher().publish(queue_name, message, priority)
+        logger.info(f"Задача поставлена в очередь '{queue_name}'. Task ID: {message.get('task_id')}")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка публикации задачи в очередь '{queue_name}': {e}")
+        return False
+
+def get_task_publisher_stats():
+    """Статистика publisher'а задач."""
+    if task_publisher is None:
+        return {'initialized': False}
+    return task_publisher.stats()
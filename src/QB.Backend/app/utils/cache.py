@@ -0,0 +1,71 @@
+"""Потокобезопасный LRU кэш процесса с ограничением размера и временем жизни записей."""
+import threading
+import time
+from collections import OrderedDict
+
+class LRUCache:
+    """LRU кэш в памяти процесса со счетчиками попаданий и промахов."""
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.promotions = 0
+
+    def get(self, key, default=None):
+        """Возвращает значение по ключу или default, если записи нет или она устарела."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def _store(self, key, value, ttl):
+        """Сохраняет значение, вытесняя самые давно использованные записи (вызывается под блокировкой)."""
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def set(self, key, value, ttl=None):
+        """Сохраняет значение, вытесняя самые давно использованные записи."""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def promote(self, key, value, ttl=None):
+        """Сохраняет значение, найденное на следующем уровне кэша (Redis), и учитывает это попадание."""
+        with self._lock:
+            self._store(key, value, ttl)
+            self.promotions += 1
+
+    def delete(self, key):
+        """Удаляет запись из кэша."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Очищает кэш."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Статистика использования кэша."""
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'promotions': self.promotions
+            }
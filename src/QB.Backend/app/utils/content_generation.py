@@ -8,13 +8,17 @@ import io
 import datetime
 import hashlib
 import json
-from ..extensions import get_redis_connection, get_db_connection
+from ..extensions import get_redis_connection, db_connection
 from ..config import Config
-from PyPDF2 import PdfReader
+from PyPDF2 import PdfReader, PageObject
+from PyPDF2.generic import NameObject
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Текст, возвращаемый вместо содержимого книги при ошибке разбора PDF
+PDF_TEXT_ERROR = "Ошибка извлечения текста из PDF файла"
+
 def get_random_quote():
     """Функция для получения случайной цитаты с кэшированием в Redis"""
     redis_conn = None
@@ -35,15 +39,13 @@ def get_random_quote():
     # Если кэш пуст или Redis недоступен, получаем цитаты из PostgreSQL
     logger.info("Обновление кэша цитат из PostgreSQL")
     try:
-        # Получаем подключение к базе данных
-        conn = get_db_connection()
-        cur = conn.cursor()
-        # Выполняем запрос к таблице quotes, выбирая 10 случайных записей
-        cur.execute("SELECT quote FROM quotes ORDER BY RANDOM() LIMIT 10;")
-        # Извлекаем все результаты и формируем список цитат
-        quotes = [row[0] for row in cur.fetchall()]
-        cur.close()
-        conn.close()
+        # Берём соединение из пула, по выходу из блока оно возвращается в пул
+        with db_connection() as conn:
+            with conn.cursor() as cur:
+                # Выполняем запрос к таблице quotes, выбирая 10 случайных записей
+                cur.execute("SELECT quote FROM quotes ORDER BY RANDOM() LIMIT 10;")
+                # Извлекаем все результаты и формируем список цитат
+                quotes = [row[0] for row in cur.fetchall()]
 
         # Если цитаты получены и Redis доступен, обновляем кэш
         if redis_conn and quotes:
@@ -215,24 +217,88 @@ def create_random_pdf_book(title, author):
         logger.error(f"Ошибка создания PDF книги '{title}': {e}")
         return None
 
-def extract_text_from_pdf(pdf_bytes):
-    """Извлекает текст из PDF файла"""
+# Атрибуты страницы, которые наследуются от узлов дерева /Pages
+INHERITABLE_PAGE_ATTRIBUTES = ('/Resources', '/MediaBox', '/CropBox', '/Rotate')
+
+def open_pdf_reader(pdf):
+    """Создает PdfReader из байтов или файлового объекта. Страницы разбираются по мере обращения."""
+    return PdfReader(io.BytesIO(pdf) if isinstance(pdf, (bytes, bytearray)) else pdf)
+
+def get_pdf_page_count(pdf_reader):
+    """Количество страниц из корня дерева /Pages (без разбора самих страниц)."""
+    return int(pdf_reader.trailer['/Root']['/Pages']['/Count'])
+
+def get_pdf_page(pdf_reader, index):
+    """Находит страницу по номеру спуском по дереву /Pages.
+
+    В отличие от pdf_reader.pages, не разбирает словари всех страниц документа.
+    """
+    node = pdf_reader.trailer['/Root']['/Pages'].get_object()
+    reference = None
+    inherited = {}
+    while node.get('/Type', '/Pages') == '/Pages':
+        for attr in INHERITABLE_PAGE_ATTRIBUTES:
+            if attr in node:
+                inherited[attr] = node[attr]
+        kids = node['/Kids']
+        if node['/Count'] == len(kids):
+            # Все потомки узла - страницы (типичное плоское дерево): обращаемся напрямую
+            reference = kids[index]
+            node = reference.get_object()
+            index = 0
+            continue
+        for kid in kids:
+            kid_node = kid.get_object()
+            count = kid_node['/Count'] if kid_node.get('/Type', '/Pages') == '/Pages' else 1
+            if index < count:
+                reference, node = kid, kid_node
+                break
+            index -= count
+        else:
+            raise IndexError("Номер страницы вне диапазона")
+    page = PageObject(pdf_reader, reference)
+    page.update(node)
+    for attr, value in inherited.items():
+        if attr not in page:
+            page[NameObject(attr)] = value
+    return page
+
+def iter_pdf_text(pdf_reader, max_chars=None, start_page=0, end_page=None):
+    """Постранично извлекает текст PDF, останавливаясь, как только набрано max_chars символов."""
+    page_count = get_pdf_page_count(pdf_reader)
+    end_page = page_count if end_page is None else min(end_page, page_count)
+    remaining = max_chars
+    for index in range(start_page, end_page):
+        text = (get_pdf_page(pdf_reader, index).extract_text() or "") + "\n"
+        if remaining is not None:
+            text = text[:remaining]
+            remaining -= len(text)
+        yield text
+        if remaining is not None and remaining <= 0:
+            return
+
+def extract_text_from_pdf(pdf, max_chars=Config.BOOK_PREVIEW_CHARS):
+    """Извлекает из PDF (байты или файловый объект) начало текста книги"""
     try:
-        # Создаем объект BytesIO из байтов PDF
-        pdf_file = io.BytesIO(pdf_bytes)
-        # Создаем объект PdfReader для чтения PDF
-        pdf_reader = PdfReader(pdf_file)
-        # Инициализируем переменную для хранения текста
-        text = ""
-        # Проходим по всем страницам PDF и извлекаем текст
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        # Если текст длиннее 2000 символов, обрезаем его и добавляем многоточие
-        return text[:2000] + "..." if len(text) > 2000 else text
+        # Разбираем страницы только до тех пор, пока не наберется max_chars (+1, чтобы понять, что текст длиннее)
+        text = "".join(iter_pdf_text(open_pdf_reader(pdf), max_chars + 1))
+        # Если текст длиннее max_chars символов, обрезаем его и добавляем многоточие
+        return text[:max_chars] + "..." if len(text) > max_chars else text
     except Exception as e:
         # Логируем ошибку и возвращаем сообщение об ошибке
         logger.error(f"Ошибка извлечения текста из PDF: {e}")
-        return "Ошибка извлечения текста из PDF файла"
+        return PDF_TEXT_ERROR
+
+def extract_pdf_page_text(pdf, page_number):
+    """Извлекает текст одной страницы PDF (нумерация с 1).
+
+    Возвращает (текст, количество страниц); текст равен None, если страницы нет.
+    """
+    pdf_reader = open_pdf_reader(pdf)
+    page_count = get_pdf_page_count(pdf_reader)
+    if page_number < 1 or page_number > page_count:
+        return None, page_count
+    return get_pdf_page(pdf_reader, page_number - 1).extract_text() or "", page_count
 
 def generate_random_image(filepath):
     """Генерирует случайное изображение"""
@@ -0,0 +1,22 @@
+"""Блокировки в Redis (SET NX EX) с освобождением только владельцем."""
+import secrets
+
+# Удаляет ключ, только если в нем токен владельца: блокировка, истекшая и захваченная
+# другим процессом, не снимается
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+def acquire_lock(redis_conn, key, ttl):
+    """Захватывает блокировку на ttl секунд. Возвращает токен владельца или None, если она занята."""
+    token = secrets.token_hex(16)
+    if redis_conn.set(key, token, nx=True, ex=ttl):
+        return token
+    return None
+
+def release_lock(redis_conn, key, token):
+    """Освобождает блокировку, если ее по-прежнему держит владелец token. Возвращает True при снятии."""
+    return bool(redis_conn.eval(RELEASE_LOCK_SCRIPT, 1, key, token))
@@ -0,0 +1,59 @@
+"""Описание очередей RabbitMQ, общее для backend и worker."""
+from ..config import Config
+
+# Очереди задач генерации
+BOOK_GENERATION_QUEUE = 'book_generation_queue'
+IMAGE_GENERATION_QUEUE = 'image_generation_queue'
+LARGE_BOOK_GENERATION_QUEUE = 'large_book_generation_queue'
+
+TASK_QUEUES = (BOOK_GENERATION_QUEUE, IMAGE_GENERATION_QUEUE, LARGE_BOOK_GENERATION_QUEUE)
+
+# Заголовок сообщения с номером попытки обработки (первая попытка - без заголовка)
+RETRY_COUNT_HEADER = 'x-retry-count'
+# Заголовки сообщения в очереди .dlq: причина и время отказа
+DEAD_LETTER_REASON_HEADER = 'x-dead-letter-reason'
+DEAD_LETTER_TIME_HEADER = 'x-dead-letter-time'
+
+# Приоритеты задач (x-max-priority очередей равен наибольшему из них)
+TASK_PRIORITIES = {'low': 0, 'normal': 5, 'high': 9}
+MAX_TASK_PRIORITY = max(TASK_PRIORITIES.values())
+
+def task_priority(name):
+    """Числовой приоритет сообщения по названию ('low', 'normal', 'high') или None для неизвестного."""
+    return TASK_PRIORITIES.get(name)
+
+def queue_arguments(queue_name):
+    """Аргументы объявления очереди (должны совпадать у backend и worker)."""
+    if queue_name in TASK_QUEUES:
+        return {'x-max-priority': MAX_TASK_PRIORITY}
+    return None
+
+def declare_queue(channel, queue_name):
+    """Объявляет очередь задач (durable для надежности)."""
+    channel.queue_declare(queue=queue_name, durable=True, arguments=queue_arguments(queue_name))
+
+def retry_delay(attempt):
+    """Задержка перед повтором попытки attempt (1, 2, ...) в секундах."""
+    return min(Config.TASK_RETRY_BASE_DELAY * 2 ** (attempt - 1), Config.TASK_RETRY_MAX_DELAY)
+
+def retry_queue_name(queue_name, delay):
+    """Очередь ожидания повтора: задержка в имени, чтобы смена настроек не конфликтовала с x-message-ttl."""
+    return f"{queue_name}.retry.{delay}s"
+
+def dead_letter_queue_name(queue_name):
+    """Очередь задач, исчерпавших попытки обработки"""
+    return f"{queue_name}.dlq"
+
+def declare_retry_queues(channel, queue_name):
+    """Объявляет очереди повторов и .dlq для очереди задач.
+
+    У каждой очереди повтора своя задержка (x-message-ttl); по ее истечении сообщение
+    возвращается в исходную очередь через exchange по умолчанию (x-dead-letter-exchange).
+    """
+    for delay in sorted({retry_delay(attempt) for attempt in range(1, Config.TASK_MAX_ATTEMPTS)}):
+        channel.queue_declare(queue=retry_queue_name(queue_name, delay), durable=True, arguments={
+            'x-message-ttl': delay * 1000,
+            'x-dead-letter-exchange': '',
+            'x-dead-letter-routing-key': queue_name,
+        })
+    channel.queue_declare(queue=dead_letter_queue_name(queue_name), durable=True)
@@ -0,0 +1,87 @@
+"""Серверное хранение Flask-сессии в Redis."""
+import json
+import secrets
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from ..config import Config
+from ..extensions import get_redis_connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+class RedisSession(CallbackDict, SessionMixin):
+    """Сессия, данные которой хранятся в Redis, а в cookie передается только ее идентификатор."""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(session):
+            session.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+class RedisSessionInterface(SessionInterface):
+    """Хранит сессию в Redis со скользящим сроком жизни.
+
+    Flask открывает сессию один раз за запрос, поэтому Redis читается не больше одного раза
+    на запрос. Неизмененная сессия не перезаписывается, только продлевается ее TTL.
+    """
+
+    def __init__(self, key_prefix="session:"):
+        self.key_prefix = key_prefix
+
+    def _ttl(self, app):
+        return int(app.permanent_session_lifetime.total_seconds())
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            try:
+                data = get_redis_connection().get(self.key_prefix + sid)
+                if data:
+                    return RedisSession(json.loads(data), sid=sid)
+            except Exception as e:
+                logger.error(f"Ошибка чтения сессии из Redis: {e}")
+        # Идентификатор новой сессии не зависит от присланного клиентом
+        return RedisSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        key = self.key_prefix + session.sid
+
+        try:
+            if not session:
+                if session.modified:
+                    get_redis_connection().delete(key)
+                    response.delete_cookie(name, domain=domain, path=path,
+                                           secure=self.get_cookie_secure(app),
+                                           samesite=self.get_cookie_samesite(app),
+                                           httponly=self.get_cookie_httponly(app))
+                return
+            if session.modified:
+                get_redis_connection().setex(key, self._ttl(app), json.dumps(dict(session)))
+            elif session.accessed:
+                # Скользящий срок жизни
+                get_redis_connection().expire(key, self._ttl(app))
+        except Exception as e:
+            logger.error(f"Ошибка сохранения сессии в Redis: {e}")
+            return
+
+        if session.modified or self.should_set_cookie(app, session):
+            response.set_cookie(name, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain, path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app))
+        response.vary.add("Cookie")
+
+def init_session_interface(app):
+    """Включает серверное хранение сессии, если SESSION_BACKEND=redis."""
+    if Config.SESSION_BACKEND != 'redis':
+        return
+    app.session_interface = RedisSessionInterface()
+    app.config['PERMANENT_SESSION_LIFETIME'] = Config.SESSION_LIFETIME
+    logger.info("Сессии хранятся в Redis")
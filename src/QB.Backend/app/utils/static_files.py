@@ -1,5 +1,6 @@
 """Утилиты для работы со статическими файлами."""
 import os
+import html
 import time
 from .content_generation import generate_random_image
 from ..services.s3_service import init_minio  
@@ -262,8 +263,11 @@ def generate_gallery_html():
     except Exception as e:
         logger.error(f"Ошибка генерации HTML галереи: {e}")
 
-def generate_library_html(books):
-    """Генерирует HTML файл библиотеки с кнопкой для генерации объемн. книг"""
+def generate_library_html(books, next_cursor=None):
+    """Генерирует HTML файл библиотеки с кнопкой для генерации объемн. книг.
+
+    Выводит первую страницу книг, следующие страницы подгружаются при прокрутке по next_cursor.
+    """
     try:
         # Получаем текущую временную метку для версионирования CSS
         timestamp = int(time.time())
@@ -323,11 +327,74 @@ def generate_library_html(books):
                 </div>
             </div>
 '''
-        # Завершаем HTML содержимое
-        html_content += '''
+        # Завершаем HTML содержимое, сохраняя cursor следующей страницы для подгрузки при прокрутке
+        html_content += f'''
         </div>
+        <div id="books-sentinel" class="books-sentinel" data-next-cursor="{html.escape(next_cursor or '', quote=True)}"></div>
     </div>
+'''
+        html_content += '''
     <script>
+        function escapeHtml(value) {
+            return String(value).replace(/[&<>"']/g, (ch) => ({
+                '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+            })[ch]);
+        }
+        function renderBookCard(book) {
+            const sizeMb = book.size / (1024 * 1024);
+            const sizeFormatted = sizeMb > 1 ? sizeMb.toFixed(2) + ' МБ' : book.size + ' байт';
+            const filename = encodeURIComponent(book.filename);
+            return `
+            <div class="book-card">
+                <div class="book-icon">🕮</div>
+                <div class="book-title">${escapeHtml(book.title)}</div>
+                <div class="book-author">🖋 Автор: ${escapeHtml(book.author)}</div>
+                <div class="book-size">🗂 Размер: ${sizeFormatted}</div>
+                <div class="book-description">${escapeHtml(book.description)}</div>
+                <div class="book-actions">
+                    <a href="/library/view/${filename}" class="view-button">
+                        👁 Просмотреть
+                    </a>
+                    <a href="/library/download/${filename}" class="download-button" target="_blank">
+                        ⬇ Скачать PDF
+                    </a>
+                </div>
+            </div>`;
+        }
+        // Подгрузка следующих страниц списка книг при прокрутке до конца страницы
+        const booksSentinel = document.getElementById('books-sentinel');
+        let nextCursor = booksSentinel.dataset.nextCursor;
+        let loadingBooks = false;
+        async function loadMoreBooks() {
+            if (!nextCursor || loadingBooks) return;
+            loadingBooks = true;
+            try {
+                const response = await fetch('/library/api/books?cursor=' + encodeURIComponent(nextCursor));
+                const data = await response.json();
+                if (response.ok) {
+                    document.querySelector('.books-grid')
+                        .insertAdjacentHTML('beforeend', data.books.map(renderBookCard).join(''));
+                    nextCursor = data.next_cursor;
+                } else {
+                    console.error('Ошибка загрузки списка книг:', data.error);
+                }
+            } catch (error) {
+                console.error('Ошибка сети при загрузке списка книг:', error);
+            } finally {
+                loadingBooks = false;
+            }
+            if (!nextCursor) {
+                booksObserver.disconnect();
+            }
+        }
+        const booksObserver = new IntersectionObserver((entries) => {
+            if (entries.some((entry) => entry.isIntersecting)) {
+                loadMoreBooks();
+            }
+        }, { rootMargin: '400px' });
+        if (nextCursor) {
+            booksObserver.observe(booksSentinel);
+        }
         async function generateBooks() {
             const button = document.querySelector('.generate-button');
             const message = document.getElementById('message');
@@ -423,66 +490,102 @@ def generate_library_html(books):
         button.textContent = originalText;
     }
 }
-async function monitorRealProgress(tasks) {
-    const progress = document.getElementById('progress');
+function monitorRealProgress(tasks) {
     const message = document.getElementById('message');
-    let processedTasks = new Set();
-    let totalTasks = tasks.length;
-    let completedTasks = 0;
-    let failedTasks = 0;
-    const pollInterval = setInterval(async () => {
-        try {
-            const response = await fetch('/library/tasks/status');
-            const data = await response.json();
-            if (response.ok) {
-                let currentCompleted = data.completed_tasks ? data.completed_tasks.length : 0;
-                let currentFailed = data.failed_tasks ? data.failed_tasks.length : 0;
-                let currentActive = data.active_tasks ? data.active_tasks.length : 0;
-                let currentTotal = currentCompleted + currentFailed + currentActive;
-                currentTotal = Math.min(currentTotal, totalTasks);
-                currentCompleted = Math.min(currentCompleted, totalTasks);
-                currentFailed = Math.min(currentFailed, totalTasks - currentCompleted);
-                if (currentCompleted + currentFailed >= totalTasks) {
-                    clearInterval(pollInterval);
-                    if (currentFailed > 0) {
-                        updateProgressBar(100, `Генерация завершена с ошибками (${currentFailed}/${totalTasks} задач не выполнено)!`);
-                        message.textContent = `Генерация завершена. ${currentCompleted} из ${totalTasks} задач выполнено успешно.`;
-                        message.className = 'message error';
-                    } else {
-                        updateProgressBar(100, 'Генерация завершена успешно!');
-                        message.textContent = `Все ${totalTasks} задач генерации выполнены успешно!`;
-                        message.className = 'message success';
-                    }
-                    setTimeout(() => {
-                        location.reload();
-                    }, 3000);
-                } else {
-                    let overallProgress = Math.round(((currentCompleted + currentFailed) / totalTasks) * 100);
-                    overallProgress = Math.min(overallProgress, 99);
-                    updateProgressBar(overallProgress, `Генерация... ${overallProgress}% (${currentCompleted}/${totalTasks} завершено)`);
-                }
-            } else {
-                console.error('Ошибка получения статуса задач:', data.message);
-                if (!processedTasks.has('error')) {
-                    updateProgressBar(0, 'Ошибка получения статуса задач');
-                    message.textContent = 'Ошибка: ' + data.message;
-                    message.className = 'message error';
-                    processedTasks.add('error');
-                }
+    const totalTasks = tasks.length;
+    const taskStates = {};
+    let finished = false;
+    let source = null;
+    let pollInterval = null;
+    let errorShown = false;
+    function stopMonitoring() {
+        finished = true;
+        if (source) {
+            source.close();
+        }
+        if (pollInterval) {
+            clearInterval(pollInterval);
+        }
+    }
+    function showError(text) {
+        if (!errorShown) {
+            updateProgressBar(0, 'Ошибка получения статуса задач');
+            message.textContent = text;
+            message.className = 'message error';
+            errorShown = true;
+        }
+    }
+    function renderProgress() {
+        let currentCompleted = 0;
+        let currentFailed = 0;
+        tasks.forEach(taskId => {
+            if (taskStates[taskId] === 'completed') {
+                currentCompleted++;
+            } else if (taskStates[taskId] === 'failed') {
+                currentFailed++;
             }
-        } catch (error) {
-            console.error('Ошибка мониторинга:', error);
-            if (!processedTasks.has('network_error')) {
-                updateProgressBar(0, 'Ошибка сети при мониторинге');
-                message.textContent = 'Ошибка сети: ' + error.message;
+        });
+        if (currentCompleted + currentFailed >= totalTasks) {
+            stopMonitoring();
+            if (currentFailed > 0) {
+                updateProgressBar(100, `Генерация завершена с ошибками (${currentFailed}/${totalTasks} задач не выполнено)!`);
+                message.textContent = `Генерация завершена. ${currentCompleted} из ${totalTasks} задач выполнено успешно.`;
                 message.className = 'message error';
-                processedTasks.add('network_error');
+            } else {
+                updateProgressBar(100, 'Генерация завершена успешно!');
+                message.textContent = `Все ${totalTasks} задач генерации выполнены успешно!`;
+                message.className = 'message success';
             }
+            setTimeout(() => {
+                location.reload();
+            }, 3000);
+        } else {
+            let overallProgress = Math.round(((currentCompleted + currentFailed) / totalTasks) * 100);
+            overallProgress = Math.min(overallProgress, 99);
+            updateProgressBar(overallProgress, `Генерация... ${overallProgress}% (${currentCompleted}/${totalTasks} завершено)`);
         }
-    }, 200);
+    }
+    // Резервный вариант: опрос /library/tasks/status, если SSE недоступен
+    function startPolling() {
+        if (pollInterval || finished) return;
+        pollInterval = setInterval(async () => {
+            try {
+                const response = await fetch('/library/tasks/status');
+                const data = await response.json();
+                if (response.ok) {
+                    (data.active_tasks || []).forEach(task => { taskStates[task.task_id] = 'active'; });
+                    (data.completed_tasks || []).forEach(task => { taskStates[task.task_id] = 'completed'; });
+                    (data.failed_tasks || []).forEach(task => { taskStates[task.task_id] = 'failed'; });
+                    renderProgress();
+                } else {
+                    console.error('Ошибка получения статуса задач:', data.message);
+                    showError('Ошибка: ' + data.message);
+                }
+            } catch (error) {
+                console.error('Ошибка мониторинга:', error);
+                showError('Ошибка сети: ' + error.message);
+            }
+        }, 1000);
+    }
+    if (window.EventSource) {
+        source = new EventSource('/library/tasks/stream');
+        source.addEventListener('task', event => {
+            const task = JSON.parse(event.data);
+            taskStates[task.task_id] = task.status;
+            renderProgress();
+        });
+        source.onerror = () => {
+            // При обрыве EventSource переподключается сам; если поток закрыт окончательно - переходим на опрос
+            if (source.readyState === EventSource.CLOSED && !finished) {
+                startPolling();
+            }
+        };
+    } else {
+        startPolling();
+    }
     setTimeout(() => {
-        if (pollInterval) {
-            clearInterval(pollInterval);
+        if (!finished) {
+            stopMonitoring();
             updateProgressBar(100, 'Таймаут ожидания завершения генерации');
             message.textContent = 'Превышено время ожидания завершения генерации';
             message.className = 'message warning';
@@ -676,6 +779,9 @@ function updateProgressBar(percent, text) {
             transform: translateY(-2px);
             box-shadow: 0 5px 15px rgba(0, 0, 0, 0.2);
         }
+        .books-sentinel {
+            height: 1px;
+        }
         .no-books {
             grid-column: 1 / -1;
             text-align: center;
@@ -4,11 +4,26 @@ import ssl
 import json
 import hashlib
 import time
+import threading
 from ..config import Config
 from ..extensions import get_redis_connection
+from .cache import LRUCache
+from .locks import acquire_lock, release_lock
 import logging
 
 logger = logging.getLogger(__name__)
+
+# Канал Redis, через который процессы backend'а оповещают друг друга о выходе пользователя
+USERINFO_INVALIDATION_CHANNEL = "userinfo:invalidate"
+# L1 кэш userinfo в памяти процесса перед Redis; время жизни не больше USERINFO_CACHE_TTL
+userinfo_l1_cache = LRUCache(Config.USERINFO_L1_CACHE_SIZE,
+                             min(Config.USERINFO_L1_CACHE_TTL, Config.USERINFO_CACHE_TTL))
+_invalidation_listener = None
+_invalidation_listener_retry_at = 0
+_invalidation_lock = threading.Lock()
+# Кэш отклоненных токенов. Отклоненный токен не становится действительным,
+# поэтому L1 кэш не требует инвалидации
+rejected_token_l1_cache = LRUCache(Config.REJECTED_TOKEN_CACHE_SIZE, Config.REJECTED_TOKEN_CACHE_TTL)
 def get_rabbitmq_connection():
     """Получение подключения к RabbitMQ"""
     try:
@@ -53,33 +68,85 @@ def get_rabbitmq_connection():
     except Exception as e:
         logger.error(f"Ошибка подключения к RabbitMQ: {e}")
         return None
+def _userinfo_cache_key(access_token):
+    """Ключ кэша userinfo: хэш токена доступа"""
+    token_hash = hashlib.sha256(access_token.encode()).hexdigest()
+    return f"userinfo:{token_hash}"
+
+def _on_userinfo_invalidated(message):
+    """Удаляет из L1 кэша userinfo, инвалидированный любым процессом backend'а"""
+    userinfo_l1_cache.delete(message['data'])
+
+def _on_invalidation_listener_error(error, pubsub, thread):
+    """Обработка ошибки подписки: пропущенные инвалидации сбрасываются очисткой L1 кэша"""
+    logger.warning(f"Ошибка подписки на инвалидацию userinfo: {error}")
+    userinfo_l1_cache.clear()
+    time.sleep(1)
+
+def start_userinfo_invalidation_listener():
+    """Запускает фоновую подписку на канал инвалидации userinfo (одну на процесс)"""
+    global _invalidation_listener, _invalidation_listener_retry_at
+    if _invalidation_listener is not None and _invalidation_listener.is_alive():
+        return True
+    with _invalidation_lock:
+        if _invalidation_listener is not None and _invalidation_listener.is_alive():
+            return True
+        if time.monotonic() < _invalidation_listener_retry_at:
+            return False
+        try:
+            pubsub = get_redis_connection().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{USERINFO_INVALIDATION_CHANNEL: _on_userinfo_invalidated})
+            _invalidation_listener = pubsub.run_in_thread(
+                sleep_time=1, daemon=True, exception_handler=_on_invalidation_listener_error)
+            logger.info("Подписка на инвалидацию userinfo запущена")
+            return True
+        except Exception as e:
+            # Повторяем попытку не чаще, чем раз в 5 секунд
+            _invalidation_listener_retry_at = time.monotonic() + 5
+            logger.error(f"Ошибка запуска подписки на инвалидацию userinfo: {e}")
+            return False
+
+def get_userinfo_cache_stats():
+    """Статистика L1 кэша userinfo"""
+    stats = userinfo_l1_cache.stats()
+    stats['invalidation_listener'] = _invalidation_listener is not None and bool(_invalidation_listener.is_alive())
+    return stats
+
 def cache_userinfo(access_token, user_info, ttl=Config.USERINFO_CACHE_TTL):
-    """Кэширует информацию о пользователе в Redis"""
+    """Кэширует информацию о пользователе в Redis и в L1 кэше процесса"""
     try:
         # Получаем подключение к Redis
         redis_conn = get_redis_connection()
         # Хешируем токен доступа для использования в качестве ключа кэша
-        token_hash = hashlib.sha256(access_token.encode()).hexdigest()
-        cache_key = f"userinfo:{token_hash}"
+        cache_key = _userinfo_cache_key(access_token)
         # Сохраняем информацию о пользователе в Redis с TTL
         redis_conn.setex(cache_key, ttl, json.dumps(user_info))
+        userinfo_l1_cache.set(cache_key, user_info, min(ttl, userinfo_l1_cache.ttl))
         logger.info(f"Userinfo закэширован в Redis с ключом {cache_key}")
         return True
     except Exception as e:
         logger.error(f"Ошибка кэширования userinfo в Redis: {e}")
         return False
 def get_cached_userinfo(access_token):
-    """Получает информацию о пользователе из Redis кэша"""
+    """Получает информацию о пользователе из L1 кэша процесса или из Redis кэша"""
     try:
-        redis_conn = get_redis_connection()
         # Создаем ключ на основе хэша токена
-        token_hash = hashlib.sha256(access_token.encode()).hexdigest()
-        cache_key = f"userinfo:{token_hash}"
+        cache_key = _userinfo_cache_key(access_token)
+        # L1 кэш используется только при работающей подписке на инвалидацию,
+        # иначе выход пользователя в другом процессе не сбросил бы запись
+        l1_enabled = start_userinfo_invalidation_listener()
+        if l1_enabled:
+            user_info = userinfo_l1_cache.get(cache_key)
+            if user_info is not None:
+                return user_info
 
         # Получаем userinfo из Redis
+        redis_conn = get_redis_connection()
         cached_data = redis_conn.get(cache_key)
         if cached_data:
             user_info = json.loads(cached_data)
+            if l1_enabled:
+                userinfo_l1_cache.set(cache_key, user_info)
             logger.info(f"Userinfo получен из Redis кэша по ключу {cache_key}")
             return user_info
         return None
@@ -87,17 +154,121 @@ def get_cached_userinfo(access_token):
         logger.error(f"Ошибка получения userinfo из Redis кэша: {e}")
         return None
 def invalidate_userinfo_cache(access_token):
-    """Удаляет информацию о пользователе из Redis кэша"""
+    """Удаляет информацию о пользователе из Redis кэша и из L1 кэшей всех процессов"""
+    # Хешируем токен доступа для поиска в кэше
+    cache_key = _userinfo_cache_key(access_token)
+    userinfo_l1_cache.delete(cache_key)
     try:
         # Получаем подключение к Redis
         redis_conn = get_redis_connection()
-        # Хешируем токен доступа для поиска в кэше
-        token_hash = hashlib.sha256(access_token.encode()).hexdigest()
-        cache_key = f"userinfo:{token_hash}"
-        # Удаляем ключ из Redis
+        # Удаляем ключ из Redis и оповещаем остальные процессы
         redis_conn.delete(cache_key)
+        redis_conn.publish(USERINFO_INVALIDATION_CHANNEL, cache_key)
         logger.info(f"Userinfo удален из Redis кэша по ключу {cache_key}")
         return True
     except Exception as e:
         logger.error(f"Ошибка удаления userinfo из Redis кэша: {e}")
-        return False
\ No newline at end of file
+        return False
+def _rejected_token_key(access_token):
+    """Ключ кэша отклоненного токена: хэш токена доступа"""
+    token_hash = hashlib.sha256(access_token.encode()).hexdigest()
+    return f"userinfo:rejected:{token_hash}"
+
+def cache_rejected_token(access_token, ttl=Config.REJECTED_TOKEN_CACHE_TTL):
+    """Запоминает токен, отклоненный Keycloak, в L1 кэше процесса и в Redis"""
+    cache_key = _rejected_token_key(access_token)
+    rejected_token_l1_cache.set(cache_key, True, ttl)
+    try:
+        get_redis_connection().setex(cache_key, ttl, "1")
+        logger.info(f"Отклоненный токен закэширован с ключом {cache_key}")
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка кэширования отклоненного токена в Redis: {e}")
+        return False
+
+def is_token_rejected(access_token):
+    """Проверяет, был ли токен недавно отклонен (L1 кэш, затем Redis)"""
+    cache_key = _rejected_token_key(access_token)
+    if rejected_token_l1_cache.get(cache_key):
+        return True
+    try:
+        if get_redis_connection().exists(cache_key):
+            # Попадание в Redis учитывается под блокировкой L1 кэша вместе с его счетчиками
+            rejected_token_l1_cache.promote(cache_key, True)
+            return True
+        return False
+    except Exception as e:
+        logger.error(f"Ошибка проверки кэша отклоненных токенов в Redis: {e}")
+        return False
+
+def get_rejected_token_cache_stats():
+    """Статистика кэша отклоненных токенов: keycloak_calls_avoided - проверки без запроса в Keycloak"""
+    stats = rejected_token_l1_cache.stats()
+    stats['redis_hits'] = stats.pop('promotions')
+    stats['keycloak_calls_avoided'] = stats['hits'] + stats['redis_hits']
+    return stats
+
+def _token_refresh_key(refresh_token):
+    """Ключ обновления токенов: хэш refresh_token"""
+    token_hash = hashlib.sha256(refresh_token.encode()).hexdigest()
+    return f"token_refresh:{token_hash}"
+
+def _token_refresh_lock_ttl():
+    """Время жизни блокировки: не меньше полного таймаута запроса в Keycloak,
+    иначе блокировка истечет во время медленного обновления"""
+    request_timeout = Config.KEYCLOAK_CONNECT_TIMEOUT + Config.KEYCLOAK_READ_TIMEOUT
+    return max(Config.TOKEN_REFRESH_LOCK_TTL, int(request_timeout) + 1)
+
+def acquire_token_refresh_lock(refresh_token):
+    """Захватывает блокировку обновления токенов по refresh_token.
+
+    Возвращает токен владельца блокировки, False, если токены уже обновляет
+    другой запрос, и None, если Redis недоступен.
+    """
+    try:
+        lock_token = acquire_lock(get_redis_connection(), f"{_token_refresh_key(refresh_token)}:lock",
+                                  _token_refresh_lock_ttl())
+        return lock_token or False
+    except Exception as e:
+        logger.error(f"Ошибка захвата блокировки обновления токенов: {e}")
+        return None
+
+def release_token_refresh_lock(refresh_token, lock_token):
+    """Освобождает блокировку обновления токенов, если ее держит владелец lock_token"""
+    try:
+        release_lock(get_redis_connection(), f"{_token_refresh_key(refresh_token)}:lock", lock_token)
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка освобождения блокировки обновления токенов: {e}")
+        return False
+
+def store_token_refresh_result(refresh_token, tokens):
+    """Сохраняет новые токены для запросов, ожидающих обновления того же refresh_token"""
+    try:
+        get_redis_connection().setex(f"{_token_refresh_key(refresh_token)}:result",
+                                     Config.TOKEN_REFRESH_RESULT_TTL, json.dumps(tokens))
+        return True
+    except Exception as e:
+        logger.error(f"Ошибка сохранения результата обновления токенов: {e}")
+        return False
+
+def get_token_refresh_result(refresh_token, timeout=0):
+    """Возвращает токены, полученные другим запросом по тому же refresh_token.
+
+    Если результата еще нет, ждет его до timeout секунд, пока удерживается блокировка.
+    """
+    key = _token_refresh_key(refresh_token)
+    deadline = time.monotonic() + timeout
+    try:
+        redis_conn = get_redis_connection()
+        while True:
+            result = redis_conn.get(f"{key}:result")
+            if result:
+                return json.loads(result)
+            # Блокировка снята без результата - обновление не удалось
+            if time.monotonic() >= deadline or not redis_conn.exists(f"{key}:lock"):
+                return None
+            time.sleep(0.05)
+    except Exception as e:
+        logger.error(f"Ошибка получения результата обновления токенов: {e}")
+        return None
@@ -0,0 +1,75 @@
+"""Статусы фоновых задач в Redis и индекс задач пользователя."""
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Время хранения статуса задачи (1 час)
+TASK_STATUS_TTL = 3600
+
+def task_status_key(task_id):
+    """Ключ статуса задачи"""
+    return f"task_status:{task_id}"
+
+def user_tasks_key(user_id):
+    """Ключ индекса задач пользователя: sorted set task_id с updated_at в качестве score"""
+    return f"user_tasks:{user_id}"
+
+def user_task_events_channel(user_id):
+    """Канал Redis pub/sub с изменениями статусов задач пользователя"""
+    return f"task_events:{user_id}"
+
+def save_task_status(redis_conn, task_id, status, message="", progress=0, user_id=None):
+    """Записывает статус задачи (hash), обновляет индекс задач пользователя и публикует событие одним pipeline"""
+    updated_at = int(time.time())
+    task_data = {
+        'status': status,
+        'message': message,
+        'progress': progress,
+        'updated_at': updated_at
+    }
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.hset(task_status_key(task_id), mapping=task_data)
+    pipe.expire(task_status_key(task_id), TASK_STATUS_TTL)
+    if user_id:
+        pipe.zadd(user_tasks_key(user_id), {task_id: updated_at})
+        pipe.expire(user_tasks_key(user_id), TASK_STATUS_TTL)
+        pipe.publish(user_task_events_channel(user_id), json.dumps(dict(task_data, task_id=task_id)))
+    pipe.execute()
+    return task_data
+
+def _parse_task_status(fields):
+    """Статус задачи из полей hash Redis"""
+    return {
+        'status': fields.get('status'),
+        'message': fields.get('message', ''),
+        'progress': int(fields.get('progress', 0)),
+        'updated_at': int(fields.get('updated_at', 0))
+    }
+
+def get_user_tasks(redis_conn, user_id):
+    """Возвращает список (task_id, статус задачи) для задач пользователя.
+
+    Задачи, статус которых не обновлялся дольше TASK_STATUS_TTL, удаляются из индекса.
+    """
+    key = user_tasks_key(user_id)
+    pipe = redis_conn.pipeline(transaction=False)
+    pipe.zremrangebyscore(key, '-inf', int(time.time()) - TASK_STATUS_TTL)
+    pipe.zrange(key, 0, -1)
+    task_ids = pipe.execute()[1]
+    if not task_ids:
+        return []
+
+    pipe = redis_conn.pipeline(transaction=False)
+    for task_id in task_ids:
+        pipe.hgetall(task_status_key(task_id))
+    tasks = []
+    for task_id, fields in zip(task_ids, pipe.execute(raise_on_error=False)):
+        if not fields:
+            continue
+        try:
+            tasks.append((task_id, _parse_task_status(fields)))
+        except Exception as e:
+            logger.error(f"Ошибка разбора статуса задачи {task_id}: {e}")
+    return tasks
@@ -6,9 +6,7 @@ from reportlab.lib.pagesizes import A4
 import textwrap
 import io
 import datetime
-from .connections import get_redis_connection
 import time
-import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -157,8 +155,11 @@ def create_random_pdf_book(title, author):
     except Exception as e:
         logger.error(f"Ошибка создания PDF книги '{title}': {e}")
         return None
-def create_large_pdf_book(title, author, word_count=5000, task_id=None):
-    """Создаёт большую PDF книгу с указанным количеством слов и искусственной задержкой в +- 2-3 секунды"""
+def create_large_pdf_book(title, author, word_count=5000, reporter=None):
+    """Создаёт большую PDF книгу с указанным количеством слов и искусственной задержкой в +- 2-3 секунды.
+
+    Прогресс передается в reporter (TaskProgressReporter), если он указан.
+    """
     try:
         logger.info(f"Начало генерации большой книги: {title} ({word_count} слов)")
         start_time = time.time()
@@ -169,8 +170,8 @@ def create_large_pdf_book(title, author, word_count=5000, task_id=None):
         logger.info(f"Добавлена искусственная задержка: {artificial_delay:.2f} секунд")
 
         # Обновляем статус задачи
-        if task_id:
-            set_task_status(task_id, "processing", f"Начало генерации книги {title}", 10)
+        if reporter:
+            reporter.update("processing", f"Начало генерации книги {title}", 10)
 
         # Создаем буфер для PDF
         buffer = io.BytesIO()
@@ -200,8 +201,8 @@ def create_large_pdf_book(title, author, word_count=5000, task_id=None):
         content = generate_book_content(word_count)
 
         # Обновляем статус задачи
-        if task_id:
-            set_task_status(task_id, "processing", f"Генерация содержания книги {title}", 30)
+        if reporter:
+            reporter.update("processing", f"Генерация содержания книги {title}", 30)
 
         # Текст книги
         c.setFont("Helvetica", 10)
@@ -221,9 +222,9 @@ def create_large_pdf_book(title, author, word_count=5000, task_id=None):
             if line_idx % 50 == 0 and line_idx > 0:
                 time.sleep(0.4)  # 0.4 секунды задержки каждые 50 строк
                 # Обновляем прогресс
-                if task_id:
+                if reporter:
                     progress = 30 + int((processed_lines / total_lines) * 60)
-                    set_task_status(task_id, "processing",
+                    reporter.update("processing",
                                     f"Генерация строки {processed_lines}/{total_lines} книги {title}", progress)
 
             if y_position < 50:  # Если достигли конца страницы
@@ -262,26 +263,15 @@ def create_large_pdf_book(title, author, word_count=5000, task_id=None):
             f"Завершена генерация большой книги: {title}. Размер: {len(pdf_bytes)} байт. Время: {end_time - start_time:.2f}с")
 
         # Обновляем статус задачи
-        if task_id:
-            set_task_status(task_id, "processing", f"Завершена генерация книги {title}", 90)
+        if reporter:
+            reporter.update("processing", f"Завершена генерация книги {title}", 90)
 
         return pdf_bytes
 
     except Exception as e:
         logger.error(f"Ошибка создания большой PDF книги '{title}': {e}")
-        if task_id:
-            # Импортируем set_task_status локально, чтобы избежать циклического импорта
-            from .connections import get_redis_connection
-            redis_conn = get_redis_connection()
-            if redis_conn:
-                task_key = f"task_status:{task_id}"
-                task_data = {
-                    'status': 'failed',
-                    'message': f"Ошибка создания книги {title}: {str(e)}",
-                    'progress': 0,
-                    'updated_at': int(time.time())
-                }
-                redis_conn.setex(task_key, 3600, json.dumps(task_data))
+        if reporter:
+            reporter.update("failed", f"Ошибка создания книги {title}: {str(e)}", 0)
         return None
 def generate_random_image(filepath):
     """Генерирует случайное изображение"""
@@ -307,25 +297,3 @@ def generate_random_image(filepath):
             draw.line([x1, y1, x2, y2], fill=color, width=random.randint(1, 8))
 
     image.save(filepath, 'PNG')
-
-def set_task_status(task_id, status, message="", progress=0):
-    """Установка статуса задачи в Redis"""
-    try:
-        redis_conn = get_redis_connection() # Используем импортированную функцию
-        if not redis_conn:
-            return False
-
-        task_key = f"task_status:{task_id}"
-        task_data = {
-            'status': status,
-            'message': message,
-            'progress': progress,
-            'updated_at': int(time.time())
-        }
-
-        redis_conn.setex(task_key, 3600, json.dumps(task_data))  # Храним 1 час
-        logger.info(f"Статус задачи {task_id} обновлен: {status}")
-        return True
-    except Exception as e:
-        logger.error(f"Ошибка установки статуса задачи {task_id}: {e}")
-        return False
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""Просмотр и повторная постановка задач из очередей .dlq.
+
+Запуск: python worker.py dlq {list,replay,purge} <очередь> [--limit N]
+"""
+import argparse
+import json
+import pika
+from .connections import get_rabbitmq_connection
+from ..utils.queues import (
+    TASK_QUEUES, RETRY_COUNT_HEADER, DEAD_LETTER_REASON_HEADER, DEAD_LETTER_TIME_HEADER,
+    declare_queue, dead_letter_queue_name
+)
+from .task_retry import retry_count
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _describe(properties, body):
+    """Краткое описание сообщения из .dlq"""
+    headers = properties.headers or {}
+    try:
+        task_id = json.loads(body.decode('utf-8')).get('task_id')
+    except Exception:
+        task_id = None
+    return {
+        'task_id': task_id,
+        'attempts': retry_count(properties) + 1,
+        'reason': headers.get(DEAD_LETTER_REASON_HEADER),
+        'failed_at': headers.get(DEAD_LETTER_TIME_HEADER),
+    }
+
+def list_dead_letters(channel, queue_name, limit):
+    """Возвращает описания первых limit сообщений .dlq, не удаляя их из очереди.
+
+    Сообщения не подтверждаются и возвращаются в очередь при закрытии канала.
+    """
+    messages = []
+    while len(messages) < limit:
+        method, properties, body = channel.basic_get(queue=dead_letter_queue_name(queue_name), auto_ack=False)
+        if method is None:
+            break
+        messages.append(_describe(properties, body))
+    return messages
+
+def replay_dead_letters(channel, queue_name, limit):
+    """Переносит до limit сообщений из .dlq обратно в очередь задач со сброшенным счетчиком попыток."""
+    declare_queue(channel, queue_name)
+    replayed = 0
+    while replayed < limit:
+        method, properties, body = channel.basic_get(queue=dead_letter_queue_name(queue_name), auto_ack=False)
+        if method is None:
+            break
+        headers = {key: value for key, value in (properties.headers or {}).items()
+                   if key not in (RETRY_COUNT_HEADER, DEAD_LETTER_REASON_HEADER, DEAD_LETTER_TIME_HEADER)}
+        channel.basic_publish(
+            exchange='',
+            routing_key=queue_name,
+            body=body,
+            properties=pika.BasicProperties(
+                content_type=properties.content_type,
+                delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+                priority=properties.priority,
+                headers=headers or None
+            )
+        )
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        replayed += 1
+    return replayed
+
+def main(argv=None):
+    """Точка входа CLI очередей .dlq"""
+    parser = argparse.ArgumentParser(prog='worker.py dlq', description="Задачи, исчерпавшие попытки обработки")
+    parser.add_argument('command', choices=('list', 'replay', 'purge'))
+    parser.add_argument('queue', choices=TASK_QUEUES)
+    parser.add_argument('--limit', type=int, default=100, help="Максимальное число сообщений (list, replay)")
+    args = parser.parse_args(argv)
+
+    connection = get_rabbitmq_connection()
+    if not connection:
+        return 1
+    try:
+        channel = connection.channel()
+        # Подтверждения брокера: сообщение удаляется из .dlq только после публикации в очередь задач
+        channel.confirm_delivery()
+        channel.queue_declare(queue=dead_letter_queue_name(args.queue), durable=True)
+        if args.command == 'list':
+            for message in list_dead_letters(channel, args.queue, args.limit):
+                print(json.dumps(message, ensure_ascii=False))
+        elif args.command == 'replay':
+            replayed = replay_dead_letters(channel, args.queue, args.limit)
+            print(f"Возвращено в {args.queue}: {replayed}")
+        else:
+            result = channel.queue_purge(queue=dead_letter_queue_name(args.queue))
+            print(f"Удалено из {dead_letter_queue_name(args.queue)}: {result.method.message_count}")
+    finally:
+        connection.close()
+    return 0
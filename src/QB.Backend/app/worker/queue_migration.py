@@ -0,0 +1,163 @@
+"""Перенос существующих очередей задач на новые аргументы объявления (x-max-priority).
+
+RabbitMQ не меняет аргументы существующей очереди: повторное объявление с другими
+аргументами закрывает канал с ошибкой 406 PRECONDITION_FAILED. Такая очередь
+пересоздается, а ее сообщения переносятся через временную очередь.
+Перенос выполняет один worker за раз (блокировка в Redis), остальные ждут его завершения.
+"""
+import time
+import pika
+from .connections import get_redis_connection
+from ..utils.locks import acquire_lock, release_lock
+from ..utils.queues import TASK_QUEUES, declare_queue, queue_arguments
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Число попыток удалить старую очередь, пока в нее публикуют задачи или ее читают потребители
+# прежней версии worker'а, и задержка между попытками (удваивается, не больше DELETE_RETRY_MAX_DELAY)
+DELETE_ATTEMPTS = 10
+DELETE_RETRY_DELAY = 2
+DELETE_RETRY_MAX_DELAY = 30
+# Блокировка переноса очередей между экземплярами worker'а
+MIGRATION_LOCK_KEY = "rabbitmq:queue_migration:lock"
+MIGRATION_LOCK_TTL = 300
+
+def migration_queue_name(queue_name):
+    """Временная очередь для сообщений на время пересоздания"""
+    return f"{queue_name}.migration"
+
+def _is_precondition_failed(error):
+    return isinstance(error, pika.exceptions.ChannelClosedByBroker) and error.reply_code == 406
+
+def _open_channel(connection):
+    channel = connection.channel()
+    # Сообщение удаляется из исходной очереди только после подтверждения публикации брокером
+    channel.confirm_delivery()
+    return channel
+
+def _queue_exists(connection, queue_name):
+    channel = connection.channel()
+    try:
+        channel.queue_declare(queue=queue_name, passive=True)
+        channel.close()
+        return True
+    except pika.exceptions.ChannelClosedByBroker as e:
+        if e.reply_code != 404:
+            raise
+        return False
+
+def _move_messages(channel, source, target):
+    """Переносит все сообщения из source в target, сохраняя свойства (в т.ч. priority и заголовки)."""
+    moved = 0
+    while True:
+        method, properties, body = channel.basic_get(queue=source, auto_ack=False)
+        if method is None:
+            return moved
+        channel.basic_publish(exchange='', routing_key=target, body=body, properties=properties)
+        channel.basic_ack(delivery_tag=method.delivery_tag)
+        moved += 1
+
+def _delete_temp_queue(connection, channel, temp_queue):
+    """Удаляет временную очередь, если она пуста. Возвращает False, если в ней остались сообщения."""
+    try:
+        channel.queue_delete(queue=temp_queue, if_empty=True, if_unused=True)
+        channel.close()
+        return True
+    except pika.exceptions.ChannelClosedByBroker as e:
+        if not _is_precondition_failed(e):
+            raise
+        # Сообщения еще переносит другой экземпляр worker'а - очередь удалит он или следующий запуск
+        logger.warning(f"[Worker] Временная очередь {temp_queue} не пуста, удаление отложено")
+        return False
+
+def _needs_migration(connection, queue_name):
+    channel = connection.channel()
+    try:
+        declare_queue(channel, queue_name)
+        channel.close()
+        return False
+    except pika.exceptions.ChannelClosedByBroker as e:
+        if not _is_precondition_failed(e):
+            raise
+        return True
+
+def migrate_queue(connection, queue_name):
+    """Пересоздает очередь с актуальными аргументами, если они отличаются. Возвращает True при переносе."""
+    temp_queue = migration_queue_name(queue_name)
+    if not _needs_migration(connection, queue_name):
+        # Дозавершаем перенос, прерванный после удаления старой очереди
+        if _queue_exists(connection, temp_queue):
+            channel = _open_channel(connection)
+            moved = _move_messages(channel, temp_queue, queue_name)
+            _delete_temp_queue(connection, channel, temp_queue)
+            logger.info(f"[Worker] Завершен перенос очереди {queue_name}: возвращено {moved} сообщений")
+        return False
+
+    logger.warning(f"[Worker] Очередь {queue_name} объявлена с другими аргументами, пересоздание")
+    channel = _open_channel(connection)
+    channel.queue_declare(queue=temp_queue, durable=True, arguments=queue_arguments(queue_name))
+    moved = 0
+    for attempt in range(DELETE_ATTEMPTS):
+        moved += _move_messages(channel, queue_name, temp_queue)
+        try:
+            # if_empty: задачи, опубликованные во время переноса, не теряются;
+            # if_unused: очередь не удаляется из-под потребителей прежней версии worker'а
+            channel.queue_delete(queue=queue_name, if_empty=True, if_unused=True)
+            break
+        except pika.exceptions.ChannelClosedByBroker as e:
+            if not _is_precondition_failed(e):
+                raise
+            delay = min(DELETE_RETRY_DELAY * 2 ** attempt, DELETE_RETRY_MAX_DELAY)
+            logger.warning(f"[Worker] Очередь {queue_name} не пуста или у нее есть потребители, "
+                           f"повтор удаления через {delay} с")
+            # Соединение продолжает обслуживать heartbeat, пока ждем
+            connection.process_data_events(time_limit=delay)
+            channel = _open_channel(connection)
+    else:
+        raise RuntimeError(f"Не удалось удалить очередь {queue_name}: в нее продолжают публиковать задачи "
+                           f"или ее читают потребители прежней версии")
+
+    declare_queue(channel, queue_name)
+    _move_messages(channel, temp_queue, queue_name)
+    _delete_temp_queue(connection, channel, temp_queue)
+    logger.info(f"[Worker] Очередь {queue_name} пересоздана с аргументами {queue_arguments(queue_name)}, "
+                f"перенесено {moved} сообщений")
+    return True
+
+def _acquire_migration_lock(connection, redis_conn):
+    """Ждет блокировку переноса не дольше MIGRATION_LOCK_TTL. Возвращает токен владельца или None."""
+    deadline = time.monotonic() + MIGRATION_LOCK_TTL
+    while time.monotonic() < deadline:
+        lock_token = acquire_lock(redis_conn, MIGRATION_LOCK_KEY, MIGRATION_LOCK_TTL)
+        if lock_token:
+            return lock_token
+        # Перенос выполняет другой экземпляр; соединение продолжает обслуживать heartbeat
+        connection.process_data_events(time_limit=1)
+    logger.warning("[Worker] Не дождались блокировки переноса очередей")
+    return None
+
+def migrate_task_queues(connection):
+    """Приводит все очереди задач к актуальным аргументам объявления.
+
+    Без Redis перенос выполняется без блокировки: временная очередь удаляется только пустой.
+    """
+    redis_conn = get_redis_connection()
+    lock_token = None
+    if redis_conn:
+        try:
+            lock_token = _acquire_migration_lock(connection, redis_conn)
+        except Exception as e:
+            logger.error(f"[Worker] Ошибка захвата блокировки переноса очередей: {e}")
+    try:
+        for queue_name in TASK_QUEUES:
+            try:
+                migrate_queue(connection, queue_name)
+            except Exception as e:
+                logger.error(f"[Worker] Ошибка переноса очереди {queue_name}: {e}")
+    finally:
+        if lock_token:
+            try:
+                release_lock(redis_conn, MIGRATION_LOCK_KEY, lock_token)
+            except Exception as e:
+                logger.error(f"[Worker] Ошибка освобождения блокировки переноса очередей: {e}")
@@ -0,0 +1,125 @@
+"""Supervisor процессов worker'а: запуск, перезапуск и остановка потребителей очередей."""
+import os
+import signal
+import time
+import multiprocessing
+from ..config import Config
+from ..utils.queues import BOOK_GENERATION_QUEUE, IMAGE_GENERATION_QUEUE, LARGE_BOOK_GENERATION_QUEUE
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Процесс, завершившийся быстрее, перезапускается с задержкой (защита от циклических падений)
+RESTART_DELAY = 5
+
+def default_queue_concurrency():
+    """Число процессов по умолчанию: большие книги - по числу CPU, остальные очереди - половина CPU."""
+    cpu_count = os.cpu_count() or 1
+    return {
+        BOOK_GENERATION_QUEUE: max(1, cpu_count // 2),
+        IMAGE_GENERATION_QUEUE: max(1, cpu_count // 2),
+        LARGE_BOOK_GENERATION_QUEUE: cpu_count,
+    }
+
+def parse_queue_settings(value, defaults):
+    """Разбирает настройку вида "очередь=число,очередь=число" поверх значений по умолчанию."""
+    settings = dict(defaults)
+    for item in filter(None, (part.strip() for part in (value or "").split(','))):
+        queue_name, _, number = item.partition('=')
+        queue_name = queue_name.strip()
+        if queue_name not in settings:
+            logger.warning(f"[Supervisor] Неизвестная очередь в настройках worker'а: {queue_name}")
+            continue
+        try:
+            settings[queue_name] = max(0, int(number))
+        except ValueError:
+            logger.warning(f"[Supervisor] Некорректное значение для очереди {queue_name}: {number}")
+    return settings
+
+def queue_settings():
+    """Возвращает {очередь: (число процессов, prefetch_count)} по WORKER_CONCURRENCY и WORKER_PREFETCH."""
+    concurrency = parse_queue_settings(Config.WORKER_CONCURRENCY, default_queue_concurrency())
+    prefetch = parse_queue_settings(Config.WORKER_PREFETCH, {queue_name: 1 for queue_name in concurrency})
+    return {queue_name: (concurrency[queue_name], max(1, prefetch[queue_name])) for queue_name in concurrency}
+
+def queue_niceness():
+    """Возвращает {очередь: nice} по WORKER_NICENESS: по умолчанию процессы больших книг получают
+    меньше CPU, чтобы интерактивные задачи не ждали пакетную генерацию."""
+    defaults = {queue_name: 0 for queue_name in default_queue_concurrency()}
+    defaults[LARGE_BOOK_GENERATION_QUEUE] = 10
+    return parse_queue_settings(Config.WORKER_NICENESS, defaults)
+
+class WorkerSupervisor:
+    """Запускает процессы-потребители по очередям и перезапускает упавшие.
+
+    По SIGTERM/SIGINT передает SIGTERM дочерним процессам и ждет, пока они доработают
+    текущие задачи, не дольше shutdown_timeout секунд.
+    """
+
+    def __init__(self, settings, target, shutdown_timeout=None, context=None):
+        self.settings = settings
+        self.target = target
+        self.shutdown_timeout = Config.WORKER_SHUTDOWN_TIMEOUT if shutdown_timeout is None else shutdown_timeout
+        # spawn: дочерний процесс создает собственные подключения к Redis, S3 и RabbitMQ,
+        # а не наследует сокеты родителя
+        self._context = context or multiprocessing.get_context('spawn')
+        self._children = {}
+        self._started_at = {}
+        self._stopping = False
+
+    def _start_child(self, queue_name, slot):
+        prefetch_count = self.settings[queue_name][1]
+        process = self._context.Process(target=self.target, args=(queue_name, prefetch_count),
+                                        name=f"worker-{queue_name}-{slot}")
+        process.start()
+        self._children[(queue_name, slot)] = process
+        self._started_at[(queue_name, slot)] = time.monotonic()
+        logger.info(f"[Supervisor] Запущен процесс {process.name} (pid {process.pid}, prefetch {prefetch_count})")
+
+    def start(self):
+        """Запускает процессы для всех очередей."""
+        for queue_name, (concurrency, _) in self.settings.items():
+            for slot in range(concurrency):
+                self._start_child(queue_name, slot)
+
+    def check_children(self):
+        """Перезапускает завершившиеся дочерние процессы."""
+        now = time.monotonic()
+        for (queue_name, slot), process in list(self._children.items()):
+            if process.is_alive():
+                continue
+            if now - self._started_at[(queue_name, slot)] < RESTART_DELAY:
+                # Процесс упал сразу после запуска - перезапускаем не раньше RESTART_DELAY
+                continue
+            logger.warning(f"[Supervisor] Процесс {process.name} завершился с кодом {process.exitcode}, перезапуск")
+            self._start_child(queue_name, slot)
+
+    def stop(self):
+        """Останавливает дочерние процессы, дожидаясь завершения текущих задач."""
+        self._stopping = True
+        for process in self._children.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process in self._children.values():
+            process.join(max(0, deadline - time.monotonic()))
+        for process in self._children.values():
+            if process.is_alive():
+                logger.warning(f"[Supervisor] Процесс {process.name} не завершился за {self.shutdown_timeout} с")
+                process.kill()
+                process.join()
+        logger.info("[Supervisor] Все процессы worker'а остановлены")
+
+    def _request_stop(self, signum, frame):
+        logger.info(f"[Supervisor] Получен сигнал {signum}, остановка worker'а")
+        self._stopping = True
+
+    def run(self):
+        """Основной цикл supervisor'а."""
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        self.start()
+        while not self._stopping:
+            self.check_children()
+            time.sleep(1)
+        self.stop()
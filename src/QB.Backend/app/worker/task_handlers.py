@@ -6,9 +6,14 @@ import os
 import random
 from .content_generation import (
     create_random_pdf_book, generate_random_image,
-    create_large_pdf_book, set_task_status
+    create_large_pdf_book
 )
+from .task_progress import TaskProgressReporter
+from .task_retry import retry_task, dead_letter_task
 from .connections import get_s3_client
+from ..services.book_catalog import register_book
+from ..services.book_text import store_book_text
+from ..services.book_numbers import reserve_book_numbers
 from ..config import Config
 import logging
 
@@ -16,6 +21,7 @@ logger = logging.getLogger(__name__)
 
 def process_book_generation(ch, method, properties, body):
     """Обработчик задачи генерации книг с искусственной задержкой"""
+    reporter = None
     try:
         task = json.loads(body.decode('utf-8'))
         task_id = task.get('task_id', str(uuid.uuid4()))
@@ -25,26 +31,29 @@ def process_book_generation(ch, method, properties, body):
         logger.info(
             f"[Worker] Начало обработки задачи генерации {count} книг: Task ID {task_id} для пользователя {user_id}")
 
+        # Прогресс задачи пишется в Redis с ограничением частоты
+        reporter = TaskProgressReporter(task_id, user_id)
         # Устанавливаем начальный статус задачи
-        set_task_status(task_id, "started", f"Начало обработки задачи генерации {count} книг", 5)
+        reporter.update("started", f"Начало обработки задачи генерации {count} книг", 5)
 
         s3_client = get_s3_client()
         if not s3_client:
             logger.error("[Worker] Не удалось подключиться к S3 для генерации книг")
-            set_task_status(task_id, "failed", "Сервис временно недоступен", 0)
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            reporter.update("failed", "Сервис временно недоступен", 0)
+            retry_task(ch, method, properties, body, "S3 недоступен")
             return
 
         # Генерируем книги
         generated_books = []
 
-        # Получаем существующие книги для определения следующего номера
-        try:
-            response = s3_client.list_objects_v2(Bucket=Config.MINIO_BUCKET_NAME)
-            existing_books = [obj for obj in response.get('Contents', []) if obj['Key'].endswith('.pdf')]
-            next_number = len(existing_books) + 1
-        except:
-            next_number = 1
+        # Резервируем номера книг атомарно: параллельные задачи получают непересекающиеся блоки
+        next_number = reserve_book_numbers(count)
+        if next_number is None:
+            # Без Redis номера не уникальны - откладываем задачу, а не нумеруем с 1
+            logger.error("[Worker] Не удалось зарезервировать номера книг")
+            reporter.update("failed", "Сервис временно недоступен", 0)
+            retry_task(ch, method, properties, body, "Не удалось зарезервировать номера книг")
+            return
 
         for i in range(count):
             book_number = next_number + i
@@ -57,7 +66,7 @@ def process_book_generation(ch, method, properties, body):
 
             # Обновляем статус задачи
             progress = int((i / count) * 80) + 10
-            set_task_status(task_id, "processing", f"Генерация книги {i + 1}/{count}", progress)
+            reporter.update("processing", f"Генерация книги {i + 1}/{count}", progress)
 
             # Добавляем искусственную задержку для каждой книги
             time.sleep(random.uniform(0.2, 0.5))  # 0.2-0.5 секунд задержки
@@ -70,21 +79,27 @@ def process_book_generation(ch, method, properties, body):
 
             # Загружаем в Minio S3
             try:
-                s3_client.put_object(
+                metadata = {
+                    'title': f"Generated Book {book_number}",
+                    'author': 'GPN',
+                    'description': 'Book with random English content',
+                    'generated': 'true',
+                    'timestamp': str(int(time.time())),
+                    'language': 'en',
+                    'book_number': str(book_number)
+                }
+                put_response = s3_client.put_object(
                     Bucket=Config.MINIO_BUCKET_NAME,
                     Key=filename,
                     Body=pdf_bytes,
                     ContentType='application/pdf',
-                    Metadata={
-                        'title': f"Generated Book {book_number}",  
-                        'author': 'GPN', 
-                        'description': 'Book with random English content',  
-                        'generated': 'true',
-                        'timestamp': str(int(time.time())),
-                        'language': 'en',
-                        'book_number': str(book_number) 
-                    }
+                    Metadata=metadata
                 )
+                # Добавляем книгу в каталог библиотеки
+                etag = put_response.get('ETag')
+                register_book(filename, len(pdf_bytes), metadata, etag=etag)
+                # Сохраняем текст книги рядом с PDF, чтобы просмотр не разбирал PDF
+                store_book_text(s3_client, filename, pdf_bytes, etag)
                 generated_books.append(filename)
                 logger.info(f"[Worker] Книга {filename} успешно загружена в S3")
             except Exception as e:
@@ -92,7 +107,7 @@ def process_book_generation(ch, method, properties, body):
                 # Не nack'аем сообщение из-за одной неудачной загрузки, продолжаем
 
         # Устанавливаем финальный статус задачи
-        set_task_status(task_id, "completed", f"Сгенерировано {len(generated_books)} книг из {count}", 100)
+        reporter.update("completed", f"Сгенерировано {len(generated_books)} книг из {count}", 100)
         logger.info(f"[Worker] Задача генерации книг {task_id} завершена. Сгенерировано {len(generated_books)} книг.")
 
         # Acknowledge сообщения
@@ -100,12 +115,18 @@ def process_book_generation(ch, method, properties, body):
 
     except json.JSONDecodeError as je:
         logger.error(f"[Worker] Ошибка декодирования JSON из сообщения: {je}")
-        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        # Повтор не поможет - сразу в .dlq
+        dead_letter_task(ch, method, properties, body, f"Некорректный JSON: {je}")
     except Exception as e:
         logger.error(f"[Worker] Необработанная ошибка в process_book_generation: {e}")
-        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+        retry_task(ch, method, properties, body, e)
+    finally:
+        # Прогресс, отложенный ограничением частоты, не теряется при выходе из обработчика
+        if reporter:
+            reporter.flush()
 def process_large_book_generation(ch, method, properties, body):
     """Обработчик задачи генерации больших книг с искусственной задержкой"""
+    reporter = None
     try:
         task = json.loads(body.decode('utf-8'))
         task_id = task.get('task_id', str(uuid.uuid4()))
@@ -116,14 +137,16 @@ def process_large_book_generation(ch, method, properties, body):
         logger.info(
             f"[Worker] Начало обработки задачи генерации большой книги: Task ID {task_id} для пользователя {user_id}")
 
+        # Прогресс задачи пишется в Redis с ограничением частоты
+        reporter = TaskProgressReporter(task_id, user_id)
         # Устанавливаем начальный статус задачи
-        set_task_status(task_id, "started", f"Начало обработки задачи генерации большой книги {book_number}", 5)
+        reporter.update("started", f"Начало обработки задачи генерации большой книги {book_number}", 5)
 
         s3_client = get_s3_client()
         if not s3_client:
             logger.error("[Worker] Не удалось подключиться к S3 для генерации большой книги")
-            set_task_status(task_id, "failed", "Сервис временно недоступен", 0)
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            reporter.update("failed", "Сервис временно недоступен", 0)
+            retry_task(ch, method, properties, body, "S3 недоступен")
             return
 
         # Генерируем название и автора книги
@@ -135,53 +158,59 @@ def process_large_book_generation(ch, method, properties, body):
         logger.info(f"[Worker] Генерация большой книги {book_number} с {word_count} словами")
 
         # Обновляем статус задачи
-        set_task_status(task_id, "processing", f"Генерация большой книги {book_number} с {word_count} словами", 15)
+        reporter.update("processing", f"Генерация большой книги {book_number} с {word_count} словами", 15)
 
         # Добавляем искусственную задержку перед началом генерации
         time.sleep(random.uniform(1.5, 2.5))  # 1.5-2.5 секунд задержки
 
         # Создаем большую PDF книгу с искусственной задержкой
-        pdf_bytes = create_large_pdf_book(title, author, word_count, task_id)
+        pdf_bytes = create_large_pdf_book(title, author, word_count, reporter)
         if not pdf_bytes:
             logger.error(f"[Worker] Не удалось создать большую PDF книгу {book_number}")
-            set_task_status(task_id, "failed", f"Не удалось создать большую PDF книгу {book_number}", 0)
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            reporter.update("failed", f"Не удалось создать большую PDF книгу {book_number}", 0)
+            retry_task(ch, method, properties, body, f"Не удалось создать большую PDF книгу {book_number}")
             return
 
         # Обновляем статус задачи
-        set_task_status(task_id, "processing", f"Загрузка книги {book_number} в S3", 95)
+        reporter.update("processing", f"Загрузка книги {book_number} в S3", 95)
 
         # Добавляем искусственную задержку перед загрузкой
         time.sleep(random.uniform(0.3, 0.8))  # 0.3-0.8 секунд задержки
 
         # Загружаем в Minio S3
         try:
-            s3_client.put_object(
+            metadata = {
+                'title': f"Generated Book {book_number}",  # Только ASCII
+                'author': 'GPN',  # Только ASCII
+                'description': 'Book with random English content',  # Только ASCII
+                'generated': 'true',
+                'timestamp': str(int(time.time())),
+                'language': 'en',
+                'book_number': str(book_number),  # Только ASCII
+                'word_count': str(word_count),  # Только ASCII
+                'user_id': user_id  # Только ASCII
+            }
+            put_response = s3_client.put_object(
                 Bucket=Config.MINIO_BUCKET_NAME,
                 Key=filename,
                 Body=pdf_bytes,
                 ContentType='application/pdf',
-                Metadata={
-                    'title': f"Generated Book {book_number}",  # Только ASCII
-                    'author': 'GPN',  # Только ASCII
-                    'description': 'Book with random English content',  # Только ASCII
-                    'generated': 'true',
-                    'timestamp': str(int(time.time())),
-                    'language': 'en',
-                    'book_number': str(book_number),  # Только ASCII
-                    'word_count': str(word_count),  # Только ASCII
-                    'user_id': user_id  # Только ASCII
-                }
+                Metadata=metadata
             )
+            # Добавляем книгу в каталог библиотеки
+            etag = put_response.get('ETag')
+            register_book(filename, len(pdf_bytes), metadata, etag=etag)
+            # Сохраняем текст книги рядом с PDF, чтобы просмотр не разбирал PDF
+            store_book_text(s3_client, filename, pdf_bytes, etag)
             logger.info(f"[Worker] Большая книга {book_number} успешно загружена в S3: {filename}")
         except Exception as e:
             logger.error(f"[Worker] Ошибка загрузки большой книги {book_number} в S3: {e}")
-            set_task_status(task_id, "failed", f"Ошибка загрузки книги {book_number} в S3: {str(e)}", 0)
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            reporter.update("failed", f"Ошибка загрузки книги {book_number} в S3: {str(e)}", 0)
+            retry_task(ch, method, properties, body, f"Ошибка загрузки в S3: {e}")
             return
 
         # Устанавливаем финальный статус задачи
-        set_task_status(task_id, "completed", f"Большая книга {book_number} успешно сгенерирована и загружена", 100)
+        reporter.update("completed", f"Большая книга {book_number} успешно сгенерирована и загружена", 100)
         logger.info(f"[Worker] Задача генерации большой книги {task_id} завершена.")
 
         # Acknowledge сообщения
@@ -189,21 +218,29 @@ def process_large_book_generation(ch, method, properties, body):
 
     except json.JSONDecodeError as je:
         logger.error(f"[Worker] Ошибка декодирования JSON из сообщения: {je}")
-        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        # Повтор не поможет - сразу в .dlq
+        dead_letter_task(ch, method, properties, body, f"Некорректный JSON: {je}")
     except Exception as e:
         logger.error(f"[Worker] Необработанная ошибка в process_large_book_generation: {e}")
-        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+        retry_task(ch, method, properties, body, e)
+    finally:
+        if reporter:
+            reporter.flush()
 
 def process_image_generation(ch, method, properties, body):
     """Обработчик задачи генерации изображений"""
+    reporter = None
     try:
         task = json.loads(body.decode('utf-8'))
         task_id = task.get('task_id', 'unknown')
+        user_id = task.get('user_id', 'unknown_user')
         logger.info(
-            f"[Worker] Начало обработки задачи генерации изображений: Task ID {task_id} для пользователя {task.get('user_id', 'unknown')}")
+            f"[Worker] Начало обработки задачи генерации изображений: Task ID {task_id} для пользователя {user_id}")
 
+        # Прогресс задачи пишется в Redis с ограничением частоты
+        reporter = TaskProgressReporter(task_id, user_id)
         # Устанавливаем начальный статус задачи
-        set_task_status(task_id, "started", "Начало обработки задачи генерации изображений", 5)
+        reporter.update("started", "Начало обработки задачи генерации изображений", 5)
 
         # Определяем директорию для статики
         if not os.path.exists(Config.STATIC_DIR):
@@ -217,7 +254,7 @@ def process_image_generation(ch, method, properties, body):
         for i in range(count):
             # Обновляем статус задачи
             progress = int((i / count) * 90) + 10
-            set_task_status(task_id, "processing", f"Генерация изображения {i + 1}/{count}", progress)
+            reporter.update("processing", f"Генерация изображения {i + 1}/{count}", progress)
 
             # Генерируем уникальное имя файла
             timestamp_part = int(time.time() * 1000) % 100000  # Часть timestamp для уникальности
@@ -233,7 +270,7 @@ def process_image_generation(ch, method, properties, body):
                 logger.error(f"[Worker] Ошибка генерации изображения {filename}: {e}")
 
         # Устанавливаем финальный статус задачи
-        set_task_status(task_id, "completed", f"Сгенерировано {len(generated_images)} изображений", 100)
+        reporter.update("completed", f"Сгенерировано {len(generated_images)} изображений", 100)
         logger.info(
             f"[Worker] Задача генерации изображений {task_id} завершена. Сгенерировано {len(generated_images)} изображений.")
 
@@ -242,9 +279,12 @@ def process_image_generation(ch, method, properties, body):
 
     except json.JSONDecodeError as je:
         logger.error(f"[Worker] Ошибка декодирования JSON из сообщения: {je}")
-        # Nack без requeue
-        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+        # Повтор не поможет - сразу в .dlq
+        dead_letter_task(ch, method, properties, body, f"Некорректный JSON: {je}")
     except Exception as e:
         logger.error(f"[Worker] Необработанная ошибка в process_image_generation: {e}")
-        # Nack с requeue=True для повторной попытки
-        ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
\ No newline at end of file
+        # Повторная попытка с задержкой
+        retry_task(ch, method, properties, body, e)
+    finally:
+        if reporter:
+            reporter.flush()
\ No newline at end of file
@@ -0,0 +1,53 @@
+"""Запись прогресса задач worker'а в Redis."""
+import time
+from .connections import get_redis_connection
+from ..utils.task_status import save_task_status
+from ..config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TaskProgressReporter:
+    """Прогресс одной задачи с ограничением частоты записи в Redis.
+
+    Смена статуса (started, processing, completed, failed) записывается сразу,
+    промежуточный прогресс в том же статусе - не чаще, чем раз в interval секунд.
+    Последнее непереданное значение записывается при следующей записи или в flush().
+    """
+
+    def __init__(self, task_id, user_id=None, interval=None):
+        self.task_id = task_id
+        self.user_id = user_id
+        self.interval = Config.TASK_PROGRESS_INTERVAL if interval is None else interval
+        # Клиент общего пула соединений процесса
+        self.redis_conn = get_redis_connection()
+        self._status = None
+        self._written_at = 0
+        self._pending = None
+
+    def update(self, status, message="", progress=0):
+        """Обновляет прогресс задачи. Возвращает True, если статус записан в Redis."""
+        if status == self._status and time.monotonic() - self._written_at < self.interval:
+            self._pending = (status, message, progress)
+            return False
+        return self._write(status, message, progress)
+
+    def flush(self):
+        """Записывает отложенный прогресс, если он есть."""
+        if self._pending:
+            return self._write(*self._pending)
+        return True
+
+    def _write(self, status, message, progress):
+        self._pending = None
+        if not self.redis_conn:
+            return False
+        try:
+            save_task_status(self.redis_conn, self.task_id, status, message, progress, user_id=self.user_id)
+            self._status = status
+            self._written_at = time.monotonic()
+            logger.info(f"Статус задачи {self.task_id} обновлен: {status}")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка установки статуса задачи {self.task_id}: {e}")
+            return False
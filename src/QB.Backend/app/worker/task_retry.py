@@ -0,0 +1,80 @@
+"""Повтор упавших задач с экспоненциальной задержкой и перенос в очередь .dlq."""
+import time
+import pika
+from ..config import Config
+from ..utils.queues import (
+    RETRY_COUNT_HEADER, DEAD_LETTER_REASON_HEADER, DEAD_LETTER_TIME_HEADER,
+    retry_delay, retry_queue_name, dead_letter_queue_name
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+def retry_count(properties):
+    """Число уже выполненных повторов задачи (по заголовку сообщения)."""
+    headers = getattr(properties, 'headers', None) or {}
+    try:
+        return int(headers.get(RETRY_COUNT_HEADER, 0))
+    except (TypeError, ValueError):
+        return 0
+
+def publish_and_ack(channel, delivery_tag, **publish_kwargs):
+    """Публикует сообщение и только после подтверждения брокером подтверждает исходное.
+
+    Канал должен быть в режиме confirm_delivery: тогда basic_publish дожидается подтверждения
+    и выбрасывает исключение, если брокер его не принял. В этом случае исходное сообщение
+    возвращается в очередь, а не теряется.
+    """
+    try:
+        channel.basic_publish(mandatory=True, **publish_kwargs)
+    except Exception as e:
+        logger.error(f"[Worker] Брокер не принял сообщение для {publish_kwargs.get('routing_key')}, "
+                     f"исходное возвращено в очередь: {e}")
+        channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+        return False
+    channel.basic_ack(delivery_tag=delivery_tag)
+    return True
+
+def _republish(ch, method, routing_key, properties, body, headers):
+    """Публикует копию сообщения с новыми заголовками вместо исходного."""
+    ch.publish_and_ack(
+        delivery_tag=method.delivery_tag,
+        exchange='',
+        routing_key=routing_key,
+        body=body,
+        properties=pika.BasicProperties(
+            content_type=getattr(properties, 'content_type', None),
+            delivery_mode=pika.spec.PERSISTENT_DELIVERY_MODE,
+            priority=getattr(properties, 'priority', None),
+            headers=headers
+        )
+    )
+
+def dead_letter_task(ch, method, properties, body, reason):
+    """Переносит сообщение в очередь .dlq исходной очереди и подтверждает исходное.
+
+    ch - ThreadSafeChannel потребителя (публикация и подтверждение выполняются в потоке соединения).
+    """
+    queue_name = method.routing_key
+    headers = dict(getattr(properties, 'headers', None) or {})
+    headers[DEAD_LETTER_REASON_HEADER] = str(reason)[:500]
+    headers[DEAD_LETTER_TIME_HEADER] = int(time.time())
+    _republish(ch, method, dead_letter_queue_name(queue_name), properties, body, headers)
+    logger.error(f"[Worker] Задача из {queue_name} перенесена в {dead_letter_queue_name(queue_name)}: {reason}")
+
+def retry_task(ch, method, properties, body, reason):
+    """Откладывает повтор задачи в очередь ожидания вместо немедленного возврата в очередь.
+
+    После Config.TASK_MAX_ATTEMPTS попыток задача переносится в очередь .dlq.
+    """
+    attempt = retry_count(properties) + 1
+    if attempt >= Config.TASK_MAX_ATTEMPTS:
+        dead_letter_task(ch, method, properties, body, f"{reason} (попыток: {attempt})")
+        return
+    queue_name = method.routing_key
+    delay = retry_delay(attempt)
+    headers = dict(getattr(properties, 'headers', None) or {})
+    headers[RETRY_COUNT_HEADER] = attempt
+    _republish(ch, method, retry_queue_name(queue_name, delay), properties, body, headers)
+    logger.warning(f"[Worker] Повтор задачи из {queue_name} через {delay} с "
+                   f"(попытка {attempt + 1} из {Config.TASK_MAX_ATTEMPTS}): {reason}")
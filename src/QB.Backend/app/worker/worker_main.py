@@ -1,66 +1,178 @@
 """Модуль с основной логикой worker'а"""
+import os
 import pika
-import time
+import signal
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from .task_handlers import (
     process_book_generation,
     process_large_book_generation,
     process_image_generation
 )
 from .connections import get_rabbitmq_connection
+from .supervisor import WorkerSupervisor, queue_settings, queue_niceness
+from .queue_migration import migrate_task_queues
+from .task_retry import publish_and_ack
+from ..services.s3_service import seed_book_numbers_from_bucket, seed_catalog_from_bucket
+from ..utils.queues import (
+    BOOK_GENERATION_QUEUE, IMAGE_GENERATION_QUEUE, LARGE_BOOK_GENERATION_QUEUE,
+    declare_queue, declare_retry_queues
+)
 import logging
 
 logger = logging.getLogger(__name__)
-def main():
-    """Основная функция worker'а"""
-    logger.info("[Worker] Запуск RabbitMQ Worker'а для обработки задач генерации")
 
-    # Подключение к RabbitMQ
-    while True:
+# Обработчики сообщений по очередям
+QUEUE_HANDLERS = {
+    BOOK_GENERATION_QUEUE: process_book_generation,
+    IMAGE_GENERATION_QUEUE: process_image_generation,
+    LARGE_BOOK_GENERATION_QUEUE: process_large_book_generation,
+}
+
+class ThreadSafeChannel:
+    """Канал для обработчиков, выполняемых вне потока соединения.
+
+    basic_ack/basic_nack/basic_publish/publish_and_ack передаются в поток соединения
+    через add_callback_threadsafe и выполняются в порядке вызова.
+    """
+
+    def __init__(self, connection, channel):
+        self._connection = connection
+        self._channel = channel
+
+    def _call(self, name, **kwargs):
+        self._schedule(name, functools.partial(getattr(self._channel, name), **kwargs))
+
+    def _schedule(self, name, callback):
+        try:
+            self._connection.add_callback_threadsafe(callback)
+        except Exception as e:
+            # Соединение закрыто: RabbitMQ доставит сообщение повторно
+            logger.error(f"[Worker] Не удалось выполнить {name} в потоке соединения: {e}")
+
+    def basic_ack(self, **kwargs):
+        self._call('basic_ack', **kwargs)
+
+    def basic_nack(self, **kwargs):
+        self._call('basic_nack', **kwargs)
+
+    def basic_publish(self, **kwargs):
+        self._call('basic_publish', **kwargs)
+
+    def publish_and_ack(self, **kwargs):
+        self._schedule('publish_and_ack', functools.partial(publish_and_ack, self._channel, **kwargs))
+
+def _log_task_error(future):
+    """Логирует исключение, не обработанное обработчиком задачи."""
+    if not future.cancelled() and future.exception():
+        logger.error(f"[Worker] Необработанная ошибка задачи: {future.exception()}")
+
+def consume_queue(queue_name, prefetch_count):
+    """Процесс-потребитель одной очереди.
+
+    Задачи выполняются в пуле из prefetch_count потоков, а основной поток обслуживает
+    соединение (heartbeat, ack/nack), поэтому длительная генерация не приводит к его разрыву.
+    По SIGTERM/SIGINT перестает получать сообщения и дожидается текущих задач;
+    полученные, но не начатые сообщения RabbitMQ вернет в очередь при закрытии соединения.
+    """
+    handler = QUEUE_HANDLERS[queue_name]
+    niceness = queue_niceness()[queue_name]
+    if niceness:
+        # Приоритет процесса в планировщике ОС: пакетные очереди уступают CPU интерактивным
+        os.nice(niceness)
+    stop_event = threading.Event()
+    state = {}
+
+    def request_stop(signum, frame):
+        stop_event.set()
+        connection = state.get('connection')
+        if connection and connection.is_open:
+            connection.add_callback_threadsafe(state['channel'].stop_consuming)
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    logger.info(f"[Worker] Запуск потребителя очереди {queue_name}")
+
+    while not stop_event.is_set():
+        connection = None
+        executor = None
         try:
             connection = get_rabbitmq_connection() # Используем импортированную функцию
             if not connection:
-                 logger.error("[Worker] Не удалось подключиться к RabbitMQ.")
-                 time.sleep(5)
-                 continue
+                logger.error("[Worker] Не удалось подключиться к RabbitMQ.")
+                stop_event.wait(5)
+                continue
 
             channel = connection.channel()
-            logger.info("[Worker] Канал RabbitMQ открыт.")
-
-            # Объявляем очереди (durable для надежности)
-            channel.queue_declare(queue='book_generation_queue', durable=True)
-            channel.queue_declare(queue='image_generation_queue', durable=True)
-            channel.queue_declare(queue='large_book_generation_queue',
-                                  durable=True) 
-            logger.info(
-                "[Worker] Очереди 'book_generation_queue', 'image_generation_queue' и 'large_book_generation_queue' объявлены.")
-
-            # Устанавливаем prefetch_count для ограничения параллелизма
-            channel.basic_qos(prefetch_count=1)
-            logger.info("[Worker] QoS prefetch_count установлен на 1.")
-
-            # Регистрируем обработчики
-            channel.basic_consume(queue='book_generation_queue', on_message_callback=process_book_generation)
-            channel.basic_consume(queue='image_generation_queue', on_message_callback=process_image_generation)
-            channel.basic_consume(queue='large_book_generation_queue',
-                                  on_message_callback=process_large_book_generation) 
-            logger.info("[Worker] Обработчики сообщений зарегистрированы.")
-
-            logger.info("[Worker] Ожидание сообщений. Для выхода нажмите CTRL+C")
-            channel.start_consuming()
-
-        except KeyboardInterrupt:
-            logger.info("[Worker] Получен сигнал завершения работы (CTRL+C)")
-            break
+            # Подтверждения брокера: задача, отложенная на повтор или в .dlq, подтверждается
+            # только после того, как ее копия принята брокером
+            channel.confirm_delivery()
+            declare_queue(channel, queue_name)
+            declare_retry_queues(channel, queue_name)
+            # prefetch_count ограничивает число неподтвержденных сообщений на процесс
+            channel.basic_qos(prefetch_count=prefetch_count)
+            executor = ThreadPoolExecutor(max_workers=prefetch_count, thread_name_prefix=f"task-{queue_name}")
+            in_flight = set()
+
+            def on_message(ch, method, properties, body, connection=connection, executor=executor):
+                future = executor.submit(handler, ThreadSafeChannel(connection, ch), method, properties, body)
+                in_flight.add(future)
+                future.add_done_callback(in_flight.discard)
+                future.add_done_callback(_log_task_error)
+
+            channel.basic_consume(queue=queue_name, on_message_callback=on_message)
+            state.update(connection=connection, channel=channel)
+            logger.info(f"[Worker] Ожидание сообщений из {queue_name} (prefetch_count={prefetch_count})")
+
+            if not stop_event.is_set():
+                channel.start_consuming()
+
+            # Остановка: не начатые задачи отменяются, текущие доделываются,
+            # пока соединение обслуживает heartbeat и подтверждения
+            executor.shutdown(wait=False, cancel_futures=True)
+            while in_flight and connection.is_open:
+                connection.process_data_events(time_limit=1)
+            if connection.is_open:
+                # Отправляем подтверждения последних задач до закрытия соединения
+                connection.process_data_events(time_limit=0)
+
         except pika.exceptions.AMQPConnectionError as amqp_error:
             logger.error(f"[Worker] Ошибка подключения к RabbitMQ (AMQP): {amqp_error}")
         except Exception as e:
             logger.error(f"[Worker] Критическая ошибка worker'а: {e}")
         finally:
-            if 'connection' in locals() and connection and not connection.is_closed:
+            state.clear()
+            if executor:
+                # При разрыве соединения дожидаемся задач, чтобы не получить их повторно параллельно
+                executor.shutdown(wait=True, cancel_futures=True)
+            if connection and not connection.is_closed:
                 connection.close()
                 logger.info("[Worker] Подключение к RabbitMQ закрыто.")
 
-        logger.info("[Worker] Повторная попытка подключения через 5 секунд...")
-        time.sleep(5)
+        if not stop_event.is_set():
+            logger.info("[Worker] Повторная попытка подключения через 5 секунд...")
+            stop_event.wait(5)
+
+    logger.info(f"[Worker] Потребитель очереди {queue_name} остановлен.")
+
+def main():
+    """Основная функция worker'а: запускает процессы-потребители очередей под supervisor'ом"""
+    logger.info("[Worker] Запуск RabbitMQ Worker'а для обработки задач генерации")
+
+    # Счетчик номеров книг инициализируется по bucket'у один раз (если его еще нет в Redis)
+    seed_book_numbers_from_bucket()
+    # Каталог книг строится по bucket'у один раз под блокировкой (до этого страницы читаются из S3)
+    seed_catalog_from_bucket()
+
+    # Очереди, объявленные без x-max-priority, пересоздаются до запуска потребителей
+    connection = get_rabbitmq_connection()
+    if connection:
+        migrate_task_queues(connection)
+        connection.close()
 
-    logger.info("[Worker] Worker остановлен.")
\ No newline at end of file
+    settings = queue_settings()
+    for queue_name, (concurrency, prefetch_count) in settings.items():
+        logger.info(f"[Worker] Очередь {queue_name}: процессов {concurrency}, prefetch_count {prefetch_count}")
+    WorkerSupervisor(settings, consume_queue).run()
+    logger.info("[Worker] Worker остановлен.")
@@ -5,13 +5,12 @@ import ssl
 import logging
 import threading
 import time
-import redis # Импортируем redis для тестирования
 # Импортируем функции и классы из других модулей
 from app import create_app
 from app.config import Config
-# from app.extensions import redis_client # Не импортируем напрямую, так как он инициализируется позже
+from app.extensions import get_redis_connection
 from app.utils.static_files import init_static_dir
-from app.services.s3_service import init_minio
+from app.services.s3_service import init_minio, rebuild_catalog_from_bucket
 
 logging.basicConfig(
     level=logging.INFO,
@@ -25,31 +24,8 @@ def test_redis_connection():
     time.sleep(5) # Небольшая задержка перед тестированием
     logger.info("=== Тестирование подключения к Redis ===")
     try:
-        if Config.REDIS_SSL and Config.CA_CERTIFICATE and Config.CA_CERTIFICATE.lower() != "false":
-            # Подключение к Redis через SSL/TLS
-            redis_conn = redis.Redis(
-                host=Config.REDIS_HOST,
-                port=Config.REDIS_PORT,
-                password=Config.REDIS_PASSWORD,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                retry_on_timeout=True,
-                ssl_cert_reqs=None,
-                ssl=True,
-                ssl_ca_certs=Config.CA_CERTIFICATE
-            )
-        else:
-            # Подключение без SSL
-            redis_conn = redis.Redis(
-                host=Config.REDIS_HOST,
-                port=Config.REDIS_PORT,
-                password=Config.REDIS_PASSWORD,
-                decode_responses=True,
-                socket_connect_timeout=5,
-                socket_timeout=5,
-                retry_on_timeout=True
-            )
+        # Используем общий пул соединений процесса
+        redis_conn = get_redis_connection()
         logger.info(f"Попытка подключения к Redis по адресу {Config.REDIS_HOST}:{Config.REDIS_PORT}")
         response = redis_conn.ping()
         logger.info(f"Ответ Redis на ping: {response}")
@@ -77,6 +53,14 @@ def main():
             init_minio()
             print("Minio инициализирован")
             sys.exit(0)
+        elif command == 'rebuildcatalog':
+            print("Перестроение каталога книг по содержимому bucket'а...")
+            books = rebuild_catalog_from_bucket()
+            if books is None:
+                print("Не удалось перестроить каталог книг, текущий каталог сохранен")
+                sys.exit(1)
+            print(f"Каталог книг перестроен: {len(books)} книг")
+            sys.exit(0)
 
     # Запускаем тестирование Redis в отдельном потоке
     redis_test_thread = threading.Thread(target=test_redis_connection, daemon=True)
@@ -0,0 +1,121 @@
+"""Тесты для инициализации внешних сервисов (пулы соединений)."""
+import unittest
+from unittest.mock import patch, MagicMock
+from psycopg2.pool import PoolError
+from app import extensions
+from app.config import Config
+
+
+class TestRedisPool(unittest.TestCase):
+    """Тесты для общего пула соединений Redis."""
+
+    def setUp(self):
+        """Сбрасывает глобальный клиент перед каждым тестом."""
+        extensions.redis_client = None
+        extensions.redis_pool = None
+
+    def tearDown(self):
+        """Закрывает созданный пул после теста."""
+        if extensions.redis_pool is not None:
+            extensions.redis_pool.disconnect()
+        extensions.redis_client = None
+        extensions.redis_pool = None
+
+    def test_get_redis_connection_returns_shared_client(self):
+        """Проверяет, что клиент Redis создаётся один раз на процесс."""
+        first = extensions.get_redis_connection()
+        second = extensions.get_redis_connection()
+        self.assertIs(first, second)
+        self.assertIs(first.connection_pool, extensions.redis_pool)
+
+    def test_redis_pool_stats(self):
+        """Проверяет статистику пула до и после инициализации."""
+        self.assertEqual(extensions.get_redis_pool_stats(), {'initialized': False})
+        extensions.get_redis_connection()
+        stats = extensions.get_redis_pool_stats()
+        self.assertTrue(stats['initialized'])
+        self.assertEqual(stats['max_connections'], Config.REDIS_MAX_CONNECTIONS)
+        self.assertEqual(stats['in_use_connections'], 0)
+
+        # Без внутренних атрибутов пула (другая версия redis-py) статистика не падает
+        with patch.object(extensions, 'redis_pool', MagicMock(spec=['max_connections'])):
+            self.assertEqual(extensions.get_redis_pool_stats(), {'initialized': True})
+
+
+class TestS3Client(unittest.TestCase):
+    """Тесты для общего клиента S3."""
+
+    def setUp(self):
+        """Сбрасывает глобальный клиент перед каждым тестом."""
+        extensions.s3_client = None
+
+    def tearDown(self):
+        """Сбрасывает глобальный клиент после теста."""
+        extensions.s3_client = None
+
+    def test_get_s3_client_returns_shared_tuned_client(self):
+        """Проверяет, что клиент S3 создаётся один раз с настроенным пулом соединений."""
+        first = extensions.get_s3_client()
+        second = extensions.get_s3_client()
+        self.assertIs(first, second)
+        self.assertEqual(first.meta.config.max_pool_connections, Config.S3_MAX_POOL_CONNECTIONS)
+        self.assertEqual(first.meta.config.read_timeout, Config.S3_READ_TIMEOUT)
+
+
+class TestDatabasePool(unittest.TestCase):
+    """Тесты для пула соединений PostgreSQL."""
+
+    def _make_conn(self):
+        """Создает mock соединения psycopg2."""
+        conn = MagicMock()
+        conn.closed = 0
+        conn.get_transaction_status.return_value = 0
+        return conn
+
+    @patch('app.extensions.ThreadedConnectionPool')
+    def test_checkout_timeout_when_pool_exhausted(self, mock_pool_class):
+        """Проверяет, что при исчерпании пула выдача падает по таймауту."""
+        mock_pool_class.return_value._pool = []
+        mock_pool_class.return_value.getconn.side_effect = lambda: self._make_conn()
+        pool = extensions.DatabasePool(0, 1, max_age=0, timeout=0.01)
+
+        conn = pool.getconn()
+        with self.assertRaises(PoolError):
+            pool.getconn()
+        pool.putconn(conn)
+        # После возврата соединение снова доступно
+        pool.putconn(pool.getconn())
+        self.assertEqual(pool.stats()['in_use_connections'], 0)
+
+    @patch('app.extensions.time.monotonic')
+    @patch('app.extensions.ThreadedConnectionPool')
+    def test_expired_connection_is_replaced(self, mock_pool_class, mock_monotonic):
+        """Проверяет, что соединение старше max_age закрывается и заменяется."""
+        old_conn, new_conn = self._make_conn(), self._make_conn()
+        mock_pool_class.return_value._pool = [old_conn]
+        mock_pool_class.return_value.getconn.side_effect = [old_conn, new_conn]
+        mock_monotonic.return_value = 0
+        pool = extensions.DatabasePool(1, 2, max_age=60, timeout=1)
+
+        mock_monotonic.return_value = 120
+        conn = pool.getconn()
+
+        self.assertIs(conn, new_conn)
+        mock_pool_class.return_value.putconn.assert_called_once_with(old_conn, close=True)
+
+    @patch('app.extensions.ThreadedConnectionPool')
+    def test_db_connection_returns_connection_to_pool(self, mock_pool_class):
+        """Проверяет, что контекстный менеджер возвращает соединение в пул."""
+        conn = self._make_conn()
+        mock_pool_class.return_value._pool = []
+        mock_pool_class.return_value.getconn.return_value = conn
+        extensions.db_pool = extensions.DatabasePool(0, 1, max_age=0, timeout=1)
+        try:
+            with extensions.db_connection() as pooled_conn:
+                self.assertIs(pooled_conn, conn)
+            mock_pool_class.return_value.putconn.assert_called_once_with(conn)
+        finally:
+            extensions.db_pool = None
+
+if __name__ == '__main__':
+    unittest.main()
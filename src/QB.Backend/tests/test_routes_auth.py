@@ -1,7 +1,9 @@
 """Тесты для маршрутов аутентификации."""
 import unittest
 from unittest.mock import patch, MagicMock
+import time
 from app import create_app
+from app.config import Config
 from app.utils.task_helpers import invalidate_userinfo_cache
 
 class TestAuthRoutes(unittest.TestCase):
@@ -20,14 +22,15 @@ class TestAuthRoutes(unittest.TestCase):
         self.app = create_app()
         self.app.config['TESTING'] = True
         self.client = self.app.test_client()
-    @patch('app.routes.auth.requests.post')
+    @patch('app.routes.auth.keycloak_request')
     def test_auth_callback_success(self, mock_post):
         """Тест успешного получения токена в /auth/callback."""
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {
             'access_token': 'test_access_token',
-            'refresh_token': 'test_refresh_token'
+            'refresh_token': 'test_refresh_token',
+            'expires_in': 300
         }
         mock_post.return_value = mock_response
 
@@ -37,6 +40,7 @@ class TestAuthRoutes(unittest.TestCase):
         with self.client.session_transaction() as sess:
             self.assertEqual(sess['access_token'], 'test_access_token')
             self.assertEqual(sess['refresh_token'], 'test_refresh_token')
+            self.assertAlmostEqual(sess['access_token_expires_at'], time.time() + 300, delta=5)
 
     def test_auth_logout_clears_session(self):
         """Тест, что /auth/logout очищает сессию."""
@@ -50,6 +54,164 @@ class TestAuthRoutes(unittest.TestCase):
             self.assertNotIn('access_token', sess)
             self.assertNotIn('refresh_token', sess)
 
+    @patch.object(Config, 'AUTH_VALIDATION_MODE', 'jwt')
+    @patch('app.routes.auth.keycloak_request')
+    @patch('app.routes.auth.cache_userinfo')
+    @patch('app.routes.auth.get_cached_userinfo', return_value=None)
+    @patch('app.routes.auth.validate_access_token')
+    def test_auth_validate_jwt_mode(self, mock_validate, mock_get_cached, mock_cache, mock_get):
+        """Тест локальной проверки токена без запроса userinfo в Keycloak."""
+        mock_validate.return_value = ('valid', {'preferred_username': 'testuser', 'exp': time.time() + 300})
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'test_token'
+
+        response = self.client.get('/auth/validate')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Forwarded-User'], 'testuser')
+        mock_get.assert_not_called()
+        mock_cache.assert_called_once()
+
+    @patch.object(Config, 'AUTH_VALIDATION_MODE', 'jwt')
+    @patch('app.routes.auth.keycloak_request')
+    @patch('app.routes.auth.cache_rejected_token')
+    @patch('app.routes.auth.cache_userinfo')
+    @patch('app.routes.auth.is_token_rejected', return_value=False)
+    @patch('app.routes.auth.get_cached_userinfo', return_value=None)
+    @patch('app.routes.auth.validate_access_token', return_value=('unverified', None))
+    def test_auth_validate_unknown_key_falls_back_to_userinfo(self, mock_validate, mock_get_cached, mock_rejected,
+                                                              mock_cache, mock_cache_rejected, mock_get):
+        """Тест, что токен с еще неизвестным ключом подписи проверяется через userinfo, а не отклоняется."""
+        mock_get.return_value = MagicMock(status_code=200, json=MagicMock(
+            return_value={'preferred_username': 'testuser'}))
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'rotated_key_token'
+
+        response = self.client.get('/auth/validate')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Forwarded-User'], 'testuser')
+        mock_cache_rejected.assert_not_called()
+
+    @patch('app.routes.auth.keycloak_request')
+    @patch('app.routes.auth.acquire_token_refresh_lock')
+    @patch('app.routes.auth.get_token_refresh_result')
+    @patch('app.routes.auth.get_cached_userinfo')
+    def test_auth_validate_reuses_parallel_refresh(self, mock_get_cached, mock_get_result, mock_lock, mock_request):
+        """Тест, что истекший токен не обновляется повторно, если его уже обновил параллельный запрос."""
+        mock_get_cached.side_effect = lambda token: {'preferred_username': 'testuser'} if token == 'new_token' else None
+        mock_get_result.return_value = {'access_token': 'new_token', 'refresh_token': 'new_refresh'}
+        mock_request.return_value = MagicMock(status_code=401)
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'expired_token'
+            sess['refresh_token'] = 'old_refresh'
+
+        response = self.client.get('/auth/validate')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Forwarded-User'], 'testuser')
+        # Только запрос userinfo со старым токеном, без POST refresh_token
+        mock_request.assert_called_once()
+        self.assertEqual(mock_request.call_args.args[0], 'GET')
+        mock_lock.assert_not_called()
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess['access_token'], 'new_token')
+            self.assertEqual(sess['refresh_token'], 'new_refresh')
+
+    @patch('app.routes.auth.keycloak_request')
+    @patch('app.routes.auth.cache_userinfo')
+    @patch('app.routes.auth.release_token_refresh_lock')
+    @patch('app.routes.auth.store_token_refresh_result')
+    @patch('app.routes.auth.acquire_token_refresh_lock', return_value='lock-token')
+    @patch('app.routes.auth.get_token_refresh_result', return_value=None)
+    @patch('app.routes.auth.get_cached_userinfo', return_value=None)
+    def test_auth_validate_refresh_under_lock(self, mock_get_cached, mock_get_result, mock_lock,
+                                              mock_store, mock_release, mock_cache, mock_request):
+        """Тест, что запрос, захвативший блокировку, обновляет токены и публикует результат."""
+        tokens = {'access_token': 'new_token', 'refresh_token': 'new_refresh'}
+        mock_request.side_effect = [
+            MagicMock(status_code=401),
+            MagicMock(status_code=200, json=MagicMock(return_value=tokens)),
+            MagicMock(status_code=200, json=MagicMock(return_value={'preferred_username': 'testuser'}))
+        ]
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'expired_token'
+            sess['refresh_token'] = 'old_refresh'
+
+        response = self.client.get('/auth/validate')
+
+        self.assertEqual(response.status_code, 200)
+        mock_store.assert_called_once_with('old_refresh', tokens)
+        mock_release.assert_called_once_with('old_refresh', 'lock-token')
+
+    @patch('app.routes.auth.keycloak_request')
+    @patch('app.routes.auth.is_token_rejected', return_value=True)
+    @patch('app.routes.auth.get_cached_userinfo', return_value=None)
+    def test_auth_validate_rejected_token_from_cache(self, mock_get_cached, mock_rejected, mock_request):
+        """Тест, что недавно отклоненный токен получает 401 без запроса в Keycloak."""
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'revoked_token'
+
+        response = self.client.get('/auth/validate')
+
+        self.assertEqual(response.status_code, 401)
+        mock_request.assert_not_called()
+
+    @patch('app.routes.auth.keycloak_request')
+    @patch('app.routes.auth.cache_rejected_token')
+    @patch('app.routes.auth.is_token_rejected', return_value=False)
+    @patch('app.routes.auth.get_cached_userinfo', return_value=None)
+    def test_auth_validate_caches_rejected_token(self, mock_get_cached, mock_rejected, mock_cache_rejected,
+                                                 mock_request):
+        """Тест, что токен, отклоненный Keycloak, попадает в кэш отклоненных, а ошибка Keycloak - нет."""
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'revoked_token'
+        mock_request.return_value = MagicMock(status_code=403)
+        self.assertEqual(self.client.get('/auth/validate').status_code, 401)
+        mock_cache_rejected.assert_called_once_with('revoked_token')
+
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'some_token'
+        mock_request.return_value = MagicMock(status_code=503)
+        self.assertEqual(self.client.get('/auth/validate').status_code, 401)
+        mock_cache_rejected.assert_called_once()
+
+        # Ограничение частоты запросов Keycloak не означает, что токен отклонен
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'throttled_token'
+        mock_request.return_value = MagicMock(status_code=429)
+        self.assertEqual(self.client.get('/auth/validate').status_code, 401)
+        mock_cache_rejected.assert_called_once()
+
+    @patch('app.routes.auth.keycloak_request')
+    @patch('app.routes.auth.cache_userinfo')
+    @patch('app.routes.auth.store_token_refresh_result')
+    @patch('app.routes.auth.get_token_refresh_result', return_value=None)
+    @patch('app.routes.auth.acquire_token_refresh_lock', return_value=None)
+    @patch('app.routes.auth.get_cached_userinfo', return_value=None)
+    def test_auth_validate_refreshes_ahead_of_expiry(self, mock_get_cached, mock_lock, mock_get_result,
+                                                     mock_store, mock_cache, mock_request):
+        """Тест, что токен в окне обновления обновляется до запроса userinfo со старым токеном."""
+        tokens = {'access_token': 'new_token', 'refresh_token': 'new_refresh', 'expires_in': 300}
+        mock_request.side_effect = [
+            MagicMock(status_code=200, json=MagicMock(return_value=tokens)),
+            MagicMock(status_code=200, json=MagicMock(return_value={'preferred_username': 'testuser'}))
+        ]
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'expiring_token'
+            sess['refresh_token'] = 'old_refresh'
+            sess['access_token_expires_at'] = int(time.time()) + Config.TOKEN_REFRESH_WINDOW - 5
+
+        response = self.client.get('/auth/validate')
+
+        self.assertEqual(response.status_code, 200)
+        # Только обновление и userinfo нового токена, без отказа на старом
+        self.assertEqual([call.args[0] for call in mock_request.call_args_list], ['POST', 'GET'])
+        self.assertIn('Bearer new_token', str(mock_request.call_args_list[1]))
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess['access_token'], 'new_token')
+            self.assertGreater(sess['access_token_expires_at'], time.time() + Config.TOKEN_REFRESH_WINDOW)
+
 
 if __name__ == '__main__':
     unittest.main()
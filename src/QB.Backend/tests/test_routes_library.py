@@ -0,0 +1,275 @@
+"""Тесты для маршрутов электронной библиотеки."""
+import unittest
+from unittest.mock import patch, MagicMock
+import datetime
+import json
+import threading
+from botocore.exceptions import ClientError
+from app import create_app
+from app.config import Config
+
+
+class TestLibraryRoutes(unittest.TestCase):
+    """Тесты для маршрутов в library blueprint."""
+
+    def setUp(self):
+        """Создает тестовый клиент перед каждым тестом."""
+        # Мокируем get_redis_connection
+        patcher = patch('app.extensions.get_redis_connection')
+        self.addCleanup(patcher.stop)
+        mock_get_redis = patcher.start()
+        mock_get_redis.return_value = MagicMock()
+
+        self.app = create_app()
+        self.app.config['TESTING'] = True
+        self.client = self.app.test_client()
+        with self.client.session_transaction() as sess:
+            sess['access_token'] = 'test_token'
+
+    @patch('app.routes.library.list_books_page')
+    def test_api_books_returns_page(self, mock_list_books_page):
+        """Тест получения страницы книг через /library/api/books."""
+        mock_list_books_page.return_value = ([{'filename': 'book_2.pdf'}], 'book_2.pdf')
+
+        response = self.client.get('/library/api/books?cursor=book_1.pdf&limit=1000')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['books'], [{'filename': 'book_2.pdf'}])
+        self.assertEqual(data['next_cursor'], 'book_2.pdf')
+        # Размер страницы ограничен сверху
+        mock_list_books_page.assert_called_once_with('book_1.pdf', Config.LIBRARY_MAX_PAGE_SIZE)
+
+    def test_api_books_requires_token(self):
+        """Тест, что /library/api/books недоступен без токена."""
+        with self.client.session_transaction() as sess:
+            sess.pop('access_token', None)
+        response = self.client.get('/library/api/books')
+        self.assertEqual(response.status_code, 401)
+
+    @patch('app.routes.library.get_user_tasks')
+    @patch('app.routes.library.get_redis_connection')
+    def test_tasks_status_uses_user_index(self, mock_get_redis, mock_get_user_tasks):
+        """Тест, что /library/tasks/status возвращает только задачи текущего пользователя."""
+        mock_get_user_tasks.return_value = [
+            ('task-1', {'status': 'processing', 'message': 'Генерация', 'progress': 40}),
+            ('task-2', {'status': 'completed', 'message': 'Готово', 'progress': 100})
+        ]
+
+        response = self.client.get('/library/tasks/status', headers={'X-Forwarded-User': 'reader'})
+
+        data = response.get_json()
+        self.assertEqual(data['total_tasks'], 2)
+        self.assertEqual(data['active_tasks'][0]['task_id'], 'task-1')
+        mock_get_user_tasks.assert_called_once_with(mock_get_redis.return_value, 'reader')
+        mock_get_redis.return_value.keys.assert_not_called()
+
+    @patch.object(Config, 'TASK_STREAM_MAX_DURATION', 0.2)
+    @patch('app.routes.library.get_user_tasks')
+    @patch('app.routes.library.get_redis_pubsub_connection')
+    def test_tasks_stream_sends_snapshot_and_events(self, mock_get_pubsub_redis, mock_get_user_tasks):
+        """Тест SSE-потока: задачи после Last-Event-ID и события из канала пользователя."""
+        pubsub = mock_get_pubsub_redis.return_value.pubsub.return_value
+        pubsub.get_message.side_effect = [
+            {'data': json.dumps({'task_id': 'task-3', 'status': 'completed', 'updated_at': 300})}
+        ] + [None] * 1000
+        mock_get_user_tasks.return_value = [
+            ('task-1', {'status': 'completed', 'updated_at': 100}),
+            ('task-2', {'status': 'processing', 'updated_at': 200})
+        ]
+
+        response = self.client.get('/library/tasks/stream',
+                                   headers={'X-Forwarded-User': 'reader', 'Last-Event-ID': '150'})
+        body = response.get_data(as_text=True)
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        pubsub.subscribe.assert_called_once_with('task_events:reader')
+        self.assertNotIn('task-1', body)
+        self.assertIn('id: 200\nevent: task', body)
+        self.assertIn('id: 300\nevent: task', body)
+        pubsub.close.assert_called_once()
+
+    @patch('app.routes.library._task_stream_slots', threading.BoundedSemaphore(1))
+    @patch('app.routes.library.get_user_tasks', return_value=[])
+    @patch('app.routes.library.get_redis_pubsub_connection')
+    def test_tasks_stream_limit(self, mock_get_pubsub_redis, mock_get_user_tasks):
+        """Тест, что сверх лимита SSE-потоков возвращается 503, а закрытый поток освобождает место."""
+        first = self.client.get('/library/tasks/stream', buffered=False)
+        self.assertEqual(first.status_code, 200)
+
+        second = self.client.get('/library/tasks/stream')
+        self.assertEqual(second.status_code, 503)
+        self.assertEqual(mock_get_pubsub_redis.return_value.pubsub.call_count, 1)
+
+        first.close()
+        mock_get_pubsub_redis.return_value.pubsub.return_value.close.assert_called_once()
+        self.assertEqual(self.client.get('/library/tasks/stream', buffered=False).status_code, 200)
+
+    def _make_s3_object(self, data, **extra):
+        """Создает ответ get_object с потоковым телом."""
+        body = MagicMock()
+        body.iter_chunks.return_value = iter([data[:2], data[2:]])
+        response = {
+            'Body': body,
+            'ContentLength': len(data),
+            'ETag': '"abc"',
+            'LastModified': datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        }
+        response.update(extra)
+        return response
+
+    @patch('app.routes.library.get_s3_client')
+    def test_download_book_streams_range(self, mock_get_s3):
+        """Тест потоковой отдачи диапазона файла с кодом 206."""
+        mock_s3 = MagicMock()
+        mock_get_s3.return_value = mock_s3
+        mock_s3.get_object.return_value = self._make_s3_object(b'%PDF', ContentRange='bytes 0-3/100')
+
+        response = self.client.get('/library/download/book_1.pdf', headers={'Range': 'bytes=0-3'})
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, b'%PDF')
+        self.assertEqual(response.headers['Content-Range'], 'bytes 0-3/100')
+        self.assertEqual(response.headers['ETag'], '"abc"')
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(mock_s3.get_object.call_args.kwargs['Range'], 'bytes=0-3')
+        mock_s3.get_object.return_value['Body'].iter_chunks.assert_called_once_with(
+            chunk_size=Config.DOWNLOAD_CHUNK_SIZE)
+
+    @patch('app.routes.library.get_s3_client')
+    def test_download_book_if_range_mismatch_returns_full_file(self, mock_get_s3):
+        """Тест, что при изменившемся ETag (S3 отвечает 412 на IfMatch) отдается весь файл."""
+        mock_s3 = MagicMock()
+        mock_get_s3.return_value = mock_s3
+        mock_s3.get_object.side_effect = [
+            ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': 'Precondition Failed'}}, 'GetObject'),
+            self._make_s3_object(b'%PDF')
+        ]
+
+        response = self.client.get('/library/download/book_1.pdf',
+                                   headers={'Range': 'bytes=0-3', 'If-Range': '"abc"'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b'%PDF')
+        first_call, second_call = mock_s3.get_object.call_args_list
+        self.assertEqual((first_call.kwargs['IfMatch'], first_call.kwargs['Range']), ('"abc"', 'bytes=0-3'))
+        self.assertNotIn('Range', second_call.kwargs)
+        self.assertNotIn('IfMatch', second_call.kwargs)
+        mock_s3.head_object.assert_not_called()
+
+    @patch('app.routes.library.get_s3_client')
+    def test_download_book_invalid_range(self, mock_get_s3):
+        """Тест ответа 416 с размером файла в Content-Range."""
+        mock_s3 = MagicMock()
+        mock_get_s3.return_value = mock_s3
+        mock_s3.get_object.side_effect = ClientError(
+            {'Error': {'Code': 'InvalidRange', 'ActualObjectSize': '100'}}, 'GetObject')
+
+        response = self.client.get('/library/download/book_1.pdf', headers={'Range': 'bytes=200-300'})
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers['Content-Range'], 'bytes */100')
+
+    @patch('app.routes.library.get_s3_client')
+    def test_download_book_not_modified(self, mock_get_s3):
+        """Тест ответа 304 при совпадении ETag."""
+        mock_s3 = MagicMock()
+        mock_get_s3.return_value = mock_s3
+        mock_s3.get_object.side_effect = ClientError(
+            {'Error': {'Code': '304', 'Message': 'Not Modified'},
+             'ResponseMetadata': {'HTTPHeaders': {'etag': '"abc"'}}}, 'GetObject')
+
+        response = self.client.get('/library/download/book_1.pdf', headers={'If-None-Match': '"old", "abc"'})
+
+        self.assertEqual(response.status_code, 304)
+        # В ответе ETag объекта, а не список из If-None-Match
+        self.assertEqual(response.headers['ETag'], '"abc"')
+        self.assertEqual(mock_s3.get_object.call_args.kwargs['IfNoneMatch'], '"old", "abc"')
+
+    @patch.object(Config, 'MINIO_PUBLIC_ENDPOINT', 'https://minio.example.com')
+    @patch.object(Config, 'LIBRARY_DOWNLOAD_MODE', 'redirect')
+    @patch('app.routes.library.generate_download_url')
+    def test_download_book_redirects_to_presigned_url(self, mock_generate_url):
+        """Тест редиректа на presigned URL публичного адреса MinIO в режиме redirect."""
+        mock_generate_url.return_value = 'https://minio.example.com/library/book_1.pdf?X-Amz-Signature=abc'
+
+        response = self.client.get('/library/download/book_1.pdf')
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.headers['Location'], mock_generate_url.return_value)
+        self.assertEqual(response.headers['Cache-Control'], 'no-store')
+        mock_generate_url.assert_called_once_with('book_1.pdf', public=True)
+
+    @patch.object(Config, 'MINIO_PUBLIC_ENDPOINT', '')
+    @patch.object(Config, 'LIBRARY_DOWNLOAD_MODE', 'redirect')
+    @patch('app.routes.library.generate_download_url')
+    @patch('app.routes.library.get_s3_client')
+    def test_download_book_redirect_without_public_endpoint(self, mock_get_s3, mock_generate_url):
+        """Тест, что без публичного адреса MinIO книга отдается через Flask, а не редиректом."""
+        mock_s3 = MagicMock()
+        mock_get_s3.return_value = mock_s3
+        mock_s3.get_object.side_effect = ClientError(
+            {'Error': {'Code': '304', 'Message': 'Not Modified'}}, 'GetObject')
+
+        response = self.client.get('/library/download/book_1.pdf', headers={'If-None-Match': '"abc"'})
+
+        self.assertEqual(response.status_code, 304)
+        mock_generate_url.assert_not_called()
+
+    @patch.object(Config, 'LIBRARY_DOWNLOAD_MODE', 'accel')
+    @patch('app.routes.library.generate_download_url')
+    def test_download_book_accel_redirect(self, mock_generate_url):
+        """Тест передачи скачивания nginx через X-Accel-Redirect в режиме accel."""
+        mock_generate_url.return_value = 'http://minio:9000/library/book_1.pdf?X-Amz-Signature=abc'
+
+        response = self.client.get('/library/download/book_1.pdf')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Accel-Redirect'],
+                         f'{Config.LIBRARY_ACCEL_LOCATION}library/book_1.pdf?X-Amz-Signature=abc')
+
+    @patch('app.routes.library.save_task_status')
+    @patch('app.routes.library.publish_task', return_value=True)
+    def test_generate_large_books_priority(self, mock_publish, mock_save_status):
+        """Тест передачи приоритета задач больших книг в RabbitMQ."""
+        response = self.client.post('/library/generate-large-books', json={'count': 3})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([call.kwargs['priority'] for call in mock_publish.call_args_list], [9, 9, 5])
+
+        mock_publish.reset_mock()
+        response = self.client.post('/library/generate-large-books', json={'count': 2, 'priority': 'low'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([call.kwargs['priority'] for call in mock_publish.call_args_list], [0, 0])
+        self.assertEqual(mock_publish.call_args.args[1]['priority'], 'low')
+
+    @patch('app.routes.library.get_redis_connection')
+    @patch('app.routes.library.save_task_status')
+    @patch('app.routes.library.publish_task', return_value=True)
+    def test_generate_async_saves_queued_status(self, mock_publish, mock_save_status, mock_get_redis):
+        """Тест, что задача сразу после постановки в очередь видна пользователю со статусом queued."""
+        response = self.client.post('/library/generate-async', json={'count': 2})
+        self.assertEqual(response.status_code, 202)
+        task_id = response.get_json()['task_id']
+        mock_save_status.assert_called_once()
+        self.assertEqual(mock_save_status.call_args.args[1:3], (task_id, 'queued'))
+        self.assertEqual(mock_save_status.call_args.kwargs['user_id'], mock_publish.call_args.args[1]['user_id'])
+
+    @patch('app.routes.library.publish_task', return_value=True)
+    def test_generate_async_invalid_priority(self, mock_publish):
+        """Тест отказа в постановке задачи с неизвестным приоритетом."""
+        response = self.client.post('/library/generate-async', json={'priority': 'urgent'})
+        self.assertEqual(response.status_code, 400)
+        mock_publish.assert_not_called()
+
+    @patch('app.routes.library.register_book')
+    @patch('app.routes.library.reserve_book_numbers', return_value=None)
+    @patch('app.routes.library.get_s3_client')
+    def test_generate_new_books_without_book_numbers(self, mock_get_s3, mock_reserve, mock_register):
+        """Тест, что без зарезервированных номеров книги не генерируются (нет повторов номеров)."""
+        response = self.client.get('/library/generate-new-books')
+        self.assertEqual(response.status_code, 503)
+        mock_get_s3.return_value.put_object.assert_not_called()
+        mock_register.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
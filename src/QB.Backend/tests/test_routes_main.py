@@ -49,5 +49,10 @@ class TestMainRoutes(unittest.TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertIn('/auth/login', response.location)
 
+    def test_stats_requires_token(self):
+        """Тест, что /stats недоступен без токена."""
+        response = self.client.get('/stats')
+        self.assertEqual(response.status_code, 401)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,102 @@
+"""Тесты для каталога книг библиотеки."""
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+from app.services.book_catalog import register_book, list_catalog_page, CATALOG_KEY, CATALOG_INDEX_KEY, \
+    CATALOG_REBUILDING_KEY
+from app.services.s3_service import list_books_page, rebuild_catalog_from_bucket
+
+
+class TestBookCatalog(unittest.TestCase):
+    """Тесты для функций в book_catalog."""
+
+    @patch('app.services.book_catalog.get_redis_connection')
+    def test_register_book_writes_entry(self, mock_get_redis):
+        """Тест добавления загруженной книги в каталог."""
+        mock_redis_conn = MagicMock()
+        mock_get_redis.return_value = mock_redis_conn
+
+        result = register_book('book_1.pdf', 1024, {'title': 'Title 1', 'author': 'GPN'}, etag='"abc"')
+
+        self.assertTrue(result)
+        args = mock_redis_conn.eval.call_args.args
+        keys, (filename, payload) = args[2:2 + args[1]], args[2 + args[1]:]
+        # Книга пишется и во временные ключи, пока идет перестроение каталога
+        self.assertEqual((keys[0], keys[1], keys[-1]), (CATALOG_KEY, CATALOG_INDEX_KEY, CATALOG_REBUILDING_KEY))
+        self.assertEqual(filename, 'book_1.pdf')
+        entry = json.loads(payload)
+        self.assertEqual(entry['title'], 'Title 1')
+        self.assertEqual(entry['size'], 1024)
+        self.assertEqual(entry['etag'], '"abc"')
+
+    @patch('app.services.book_catalog.get_redis_connection')
+    def test_list_catalog_page_keyset(self, mock_get_redis):
+        """Тест чтения страницы каталога после cursor с определением следующей страницы."""
+        mock_redis_conn = MagicMock()
+        mock_get_redis.return_value = mock_redis_conn
+        pipe = mock_redis_conn.pipeline.return_value
+        pipe.execute.return_value = [1, ['book_2.pdf', 'book_3.pdf', 'book_4.pdf']]
+        mock_redis_conn.hmget.return_value = [
+            json.dumps({'filename': 'book_2.pdf'}),
+            json.dumps({'filename': 'book_3.pdf'}),
+        ]
+
+        books, next_cursor = list_catalog_page('book_1.pdf', 2)
+
+        self.assertEqual([book['filename'] for book in books], ['book_2.pdf', 'book_3.pdf'])
+        self.assertEqual(next_cursor, 'book_3.pdf')
+        pipe.zrangebylex.assert_called_once_with(
+            CATALOG_INDEX_KEY, '(book_1.pdf', '+', start=0, num=3)
+        mock_redis_conn.hmget.assert_called_once_with(CATALOG_KEY, ['book_2.pdf', 'book_3.pdf'])
+
+    @patch('app.services.book_catalog.get_redis_connection')
+    def test_list_catalog_page_not_built(self, mock_get_redis):
+        """Тест: пока каталог не построен, страница каталога недоступна."""
+        mock_redis_conn = MagicMock()
+        mock_get_redis.return_value = mock_redis_conn
+        mock_redis_conn.pipeline.return_value.execute.return_value = [0, []]
+
+        self.assertIsNone(list_catalog_page())
+        mock_redis_conn.hmget.assert_not_called()
+
+    @patch('app.services.s3_service.release_lock')
+    @patch('app.services.s3_service.acquire_lock', return_value='token')
+    @patch('app.services.s3_service.get_redis_connection')
+    @patch('app.services.s3_service.get_s3_client')
+    @patch('app.services.s3_service.start_catalog_rebuild')
+    @patch('app.services.s3_service.finish_catalog_rebuild')
+    @patch('app.services.s3_service.abort_catalog_rebuild')
+    def test_rebuild_catalog_keeps_catalog_on_listing_error(self, mock_abort, mock_finish, mock_start,
+                                                            mock_get_s3, mock_get_redis, mock_acquire,
+                                                            mock_release):
+        """Тест: ошибка листинга bucket'а не заменяет каталог пустым."""
+        mock_get_s3.return_value.list_objects_v2.side_effect = Exception("S3 недоступен")
+
+        self.assertIsNone(rebuild_catalog_from_bucket())
+        mock_start.assert_called_once()
+        mock_finish.assert_not_called()
+        mock_abort.assert_called_once()
+        mock_release.assert_called_once_with(mock_get_redis.return_value, mock_acquire.call_args.args[1], 'token')
+
+    @patch('app.services.s3_service.acquire_lock', return_value=None)
+    @patch('app.services.s3_service.get_redis_connection')
+    @patch('app.services.s3_service.start_catalog_rebuild')
+    def test_rebuild_catalog_skipped_when_locked(self, mock_start, mock_get_redis, mock_acquire):
+        """Тест: перестроение не запускается, пока его выполняет другой процесс."""
+        self.assertIsNone(rebuild_catalog_from_bucket())
+        mock_start.assert_not_called()
+
+    @patch('app.services.s3_service.list_books_from_s3')
+    @patch('app.services.s3_service.list_catalog_page')
+    def test_list_books_page_falls_back_to_s3(self, mock_list_catalog, mock_list_s3):
+        """Тест чтения страницы напрямую из S3, если каталог недоступен."""
+        mock_list_catalog.return_value = None
+        mock_list_s3.return_value = [{'filename': 'book_2.pdf'}, {'filename': 'book_3.pdf'}]
+
+        books, next_cursor = list_books_page('book_1.pdf', 2)
+
+        self.assertEqual(next_cursor, 'book_3.pdf')
+        mock_list_s3.assert_called_once_with(start_after='book_1.pdf', limit=2)
+
+if __name__ == '__main__':
+    unittest.main()
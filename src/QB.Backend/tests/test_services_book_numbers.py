@@ -0,0 +1,44 @@
+"""Тесты для счетчика номеров книг."""
+import unittest
+from unittest.mock import patch, MagicMock
+from app.services.book_numbers import reserve_book_numbers, BOOK_NUMBER_KEY
+from app.services.s3_service import seed_book_numbers_from_bucket
+
+
+class TestBookNumbers(unittest.TestCase):
+    """Тесты для функций в book_numbers."""
+
+    @patch('app.services.book_numbers.get_redis_connection')
+    def test_reserve_book_numbers_returns_block_start(self, mock_get_redis):
+        """Тест резервирования блока номеров одним INCRBY."""
+        mock_get_redis.return_value.incrby.return_value = 15
+
+        self.assertEqual(reserve_book_numbers(3), 13)
+        mock_get_redis.return_value.incrby.assert_called_once_with(BOOK_NUMBER_KEY, 3)
+
+    @patch('app.services.book_numbers.get_redis_connection')
+    def test_reserve_book_numbers_redis_error(self, mock_get_redis):
+        """Тест, что при недоступности Redis возвращается None."""
+        mock_get_redis.return_value.incrby.side_effect = Exception("Connection refused")
+        self.assertIsNone(reserve_book_numbers(3))
+
+    @patch('app.services.book_numbers.get_redis_connection')
+    def test_seed_counts_bucket_once(self, mock_get_redis):
+        """Тест инициализации счетчика по количеству PDF в bucket'е только при его отсутствии."""
+        mock_redis_conn = MagicMock()
+        mock_get_redis.return_value = mock_redis_conn
+        mock_s3 = MagicMock()
+        mock_s3.list_objects_v2.return_value = {
+            'Contents': [{'Key': 'book_1.pdf'}, {'Key': 'book_1.pdf.txt'}, {'Key': 'book_2.pdf'}]
+        }
+
+        mock_redis_conn.exists.return_value = 0
+        self.assertTrue(seed_book_numbers_from_bucket(mock_s3))
+        mock_redis_conn.set.assert_called_once_with(BOOK_NUMBER_KEY, 2, nx=True)
+
+        mock_redis_conn.exists.return_value = 1
+        seed_book_numbers_from_bucket(mock_s3)
+        mock_s3.list_objects_v2.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
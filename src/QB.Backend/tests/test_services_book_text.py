@@ -0,0 +1,102 @@
+"""Тесты для кэша текста книг."""
+import unittest
+from unittest.mock import patch, MagicMock
+import io
+from reportlab.pdfgen import canvas
+from app.services.book_text import (
+    get_book_text, get_book_page, store_book_text, book_text_cache, book_text_cache_key
+)
+
+
+def make_pdf(page_count):
+    """Создает PDF с подписанными страницами."""
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    for number in range(1, page_count + 1):
+        c.drawString(100, 750, f"Page number {number}")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+def make_range_s3(data):
+    """Создает mock S3 клиента, отдающего объект по Range-запросам."""
+    def get_object(**kwargs):
+        start, end = kwargs['Range'][len('bytes='):].split('-')
+        return {'Body': io.BytesIO(data[int(start):int(end) + 1])}
+    s3_client = MagicMock()
+    s3_client.get_object.side_effect = get_object
+    return s3_client
+
+
+class TestBookText(unittest.TestCase):
+    """Тесты для функций в book_text."""
+
+    def setUp(self):
+        """Очищает кэш процесса перед каждым тестом."""
+        book_text_cache.clear()
+
+    @patch('app.services.book_text.get_redis_connection')
+    def test_store_book_text_writes_sidecar(self, mock_get_redis):
+        """Тест сохранения текста книги рядом с PDF и в кэше."""
+        mock_s3 = MagicMock()
+        with patch('app.services.book_text.extract_text_from_pdf', return_value='Book text'):
+            self.assertTrue(store_book_text(mock_s3, 'book_1.pdf', b'%PDF', '"abc"'))
+
+        kwargs = mock_s3.put_object.call_args.kwargs
+        self.assertEqual(kwargs['Key'], 'book_1.pdf.txt')
+        self.assertEqual(kwargs['Metadata'], {'source-etag': 'abc'})
+        self.assertEqual(book_text_cache.get(book_text_cache_key('book_1.pdf', '"abc"')), 'Book text')
+
+    def test_store_book_text_without_etag(self):
+        """Тест, что без ETag загруженного PDF sidecar не сохраняется и ошибка не пробрасывается."""
+        mock_s3 = MagicMock()
+        self.assertFalse(store_book_text(mock_s3, 'book_1.pdf', b'%PDF', None))
+        mock_s3.put_object.assert_not_called()
+
+    @patch('app.services.book_text.get_redis_connection')
+    def test_get_book_text_reads_sidecar_once(self, mock_get_redis):
+        """Тест, что повторный просмотр берет текст из кэша без обращения к S3."""
+        mock_get_redis.return_value.get.return_value = None
+        mock_s3 = MagicMock()
+        mock_s3.get_object.return_value = {
+            'Body': MagicMock(read=MagicMock(return_value='Book text'.encode('utf-8'))),
+            'Metadata': {'source-etag': 'abc'}
+        }
+
+        self.assertEqual(get_book_text(mock_s3, 'book_1.pdf', '"abc"', 100), 'Book text')
+        self.assertEqual(get_book_text(mock_s3, 'book_1.pdf', '"abc"', 100), 'Book text')
+
+        mock_s3.get_object.assert_called_once()
+        self.assertEqual(mock_s3.get_object.call_args.kwargs['Key'], 'book_1.pdf.txt')
+
+    @patch('app.services.book_text._read_text_sidecar', return_value=None)
+    @patch('app.services.book_text.get_redis_connection')
+    def test_get_book_text_reads_pdf_by_ranges(self, mock_get_redis, mock_read_sidecar):
+        """Тест извлечения текста из PDF Range-запросами, если sidecar отсутствует."""
+        mock_get_redis.return_value.get.return_value = None
+        pdf_bytes = make_pdf(3)
+        mock_s3 = make_range_s3(pdf_bytes)
+
+        text = get_book_text(mock_s3, 'book_1.pdf', '"abc"', len(pdf_bytes))
+
+        self.assertIn('Page number 1', text)
+        self.assertTrue(all('Range' in call.kwargs for call in mock_s3.get_object.call_args_list))
+        self.assertEqual(mock_s3.get_object.call_args.kwargs['IfMatch'], '"abc"')
+        mock_get_redis.return_value.set.assert_called_once()
+
+    @patch('app.services.book_text.get_redis_connection')
+    def test_get_book_page_extracts_single_page(self, mock_get_redis):
+        """Тест постраничного чтения книги."""
+        mock_get_redis.return_value.get.return_value = None
+        pdf_bytes = make_pdf(5)
+        mock_s3 = make_range_s3(pdf_bytes)
+
+        page = get_book_page(mock_s3, 'book_1.pdf', '"abc"', len(pdf_bytes), 4)
+
+        self.assertEqual(page['page'], 4)
+        self.assertEqual(page['pages'], 5)
+        self.assertIn('Page number 4', page['text'])
+        self.assertIsNone(get_book_page(mock_s3, 'book_1.pdf', '"abc"', len(pdf_bytes), 6)['text'])
+
+if __name__ == '__main__':
+    unittest.main()
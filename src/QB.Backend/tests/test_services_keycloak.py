@@ -0,0 +1,121 @@
+"""Тесты для локальной проверки токенов Keycloak."""
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import time
+import jwt
+import requests
+from cryptography.hazmat.primitives.asymmetric import rsa
+from app.config import Config
+from app.services import keycloak_service
+from app.services.keycloak_service import (
+    keycloak_request,
+    KeycloakMetadataCache, validate_access_token, metadata_cache,
+    TOKEN_VALID, TOKEN_EXPIRED, TOKEN_INVALID, TOKEN_UNVERIFIED
+)
+
+ISSUER = "https://localhost:8443/realms/quotation-book"
+
+
+class TestKeycloakService(unittest.TestCase):
+    """Тесты для функций в keycloak_service."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Создает ключ подписи realm'а."""
+        cls.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(cls.private_key.public_key()))
+        jwk.update({'kid': 'key-1', 'use': 'sig', 'alg': 'RS256'})
+        cls.jwks = {'keys': [jwk]}
+
+    def setUp(self):
+        """Подменяет ответы Keycloak и сбрасывает кэш JWKS."""
+        patcher = patch('app.services.keycloak_service.keycloak_request', side_effect=self._keycloak_get)
+        self.addCleanup(patcher.stop)
+        self.mock_get = patcher.start()
+        self.addCleanup(self._reset_cache)
+        self._reset_cache()
+
+    def _reset_cache(self):
+        metadata_cache._discovery = None
+        metadata_cache._keys = {}
+        metadata_cache._fetched_at = 0
+
+    def _keycloak_get(self, method, url, **kwargs):
+        response = MagicMock()
+        response.json.return_value = {'issuer': ISSUER} if 'well-known' in url else self.jwks
+        return response
+
+    def _make_token(self, kid='key-1', **claims):
+        now = int(time.time())
+        payload = {'iss': ISSUER, 'aud': Config.KEYCLOAK_TOKEN_AUDIENCE, 'azp': Config.KEYCLOAK_CLIENT_ID,
+                   'iat': now, 'exp': now + 300, 'preferred_username': 'testuser'}
+        payload.update(claims)
+        return jwt.encode(payload, self.private_key, algorithm='RS256', headers={'kid': kid})
+
+    def test_valid_token(self):
+        """Тест проверки корректного токена с кэшированием JWKS."""
+        status, claims = validate_access_token(self._make_token())
+        self.assertEqual(status, TOKEN_VALID)
+        self.assertEqual(claims['preferred_username'], 'testuser')
+
+        validate_access_token(self._make_token())
+        # discovery + certs загружаются один раз
+        self.assertEqual(self.mock_get.call_count, 2)
+
+    def test_expired_token(self):
+        """Тест распознавания истекшего токена."""
+        now = int(time.time())
+        token = self._make_token(iat=now - 600, exp=now - 300)
+        self.assertEqual(validate_access_token(token)[0], TOKEN_EXPIRED)
+
+    def test_wrong_audience_and_issuer(self):
+        """Тест отклонения токена для другой аудитории или издателя."""
+        self.assertEqual(validate_access_token(self._make_token(aud='other'))[0], TOKEN_INVALID)
+        self.assertEqual(validate_access_token(self._make_token(iss='https://evil/realms/x'))[0], TOKEN_INVALID)
+
+    def test_unknown_kid_refreshes_jwks(self):
+        """Тест обновления JWKS при появлении токена с новым kid (ротация ключей)."""
+        validate_access_token(self._make_token())
+        metadata_cache._fetched_at -= Config.KEYCLOAK_JWKS_MIN_REFRESH_INTERVAL + 1
+
+        self.assertEqual(validate_access_token(self._make_token(kid='key-2'))[0], TOKEN_UNVERIFIED)
+        self.assertEqual(self.mock_get.call_count, 4)
+
+    def test_unknown_kid_within_min_refresh_interval(self):
+        """Тест, что токен с неизвестным kid не отклоняется, пока обновление JWKS ограничено интервалом."""
+        validate_access_token(self._make_token())
+
+        self.assertEqual(validate_access_token(self._make_token(kid='key-2'))[0], TOKEN_UNVERIFIED)
+        # JWKS повторно не запрашивается
+        self.assertEqual(self.mock_get.call_count, 2)
+
+    def test_keycloak_unavailable(self):
+        """Тест, что без JWKS токен не считается проверенным."""
+        self.mock_get.side_effect = Exception("Connection refused")
+        self.assertEqual(validate_access_token(self._make_token())[0], TOKEN_UNVERIFIED)
+
+    def test_stale_cache_refreshes_in_background(self):
+        """Тест фонового обновления устаревшего кэша без блокировки проверки."""
+        cache = KeycloakMetadataCache(ttl=60, min_refresh_interval=10)
+        cache._discovery, cache._keys, cache._fetched_at = {'issuer': ISSUER}, {'key-1': 'key'}, time.monotonic() - 61
+
+        with patch.object(cache, '_refresh_in_background') as mock_background:
+            self.assertEqual(cache.get('key-1'), ({'issuer': ISSUER}, 'key'))
+        mock_background.assert_called_once()
+
+    def test_keycloak_request_reuses_session(self):
+        """Тест, что запросы к Keycloak идут через одну сессию с таймаутами из Config."""
+        self.addCleanup(setattr, keycloak_service, '_http_session', None)
+        keycloak_service._http_session = None
+        with patch.object(requests.Session, 'request') as mock_request:
+            keycloak_request('GET', 'https://keycloak/first')
+            keycloak_request('GET', 'https://keycloak/second', timeout=1)
+
+        self.assertIs(keycloak_service.get_keycloak_session(), keycloak_service.get_keycloak_session())
+        self.assertEqual(mock_request.call_args_list[0].kwargs['timeout'],
+                         (Config.KEYCLOAK_CONNECT_TIMEOUT, Config.KEYCLOAK_READ_TIMEOUT))
+        self.assertEqual(mock_request.call_args_list[1].kwargs['timeout'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,9 @@
 import unittest
 from unittest.mock import patch, MagicMock
 # Импортируем тестируемую функцию
-from app.services.s3_service import list_books_from_s3
+from app.services.s3_service import list_books_from_s3, generate_download_url
+from app.config import Config
+from app import extensions
 
 
 class TestS3Service(unittest.TestCase):
@@ -87,5 +89,36 @@ class TestS3Service(unittest.TestCase):
         # Проверяем результат
         self.assertEqual(result, [])  # Должен вернуться пустой список
 
+    @patch('app.services.s3_service.get_s3_client')
+    def test_list_books_from_s3_follows_continuation_token(self, mock_get_s3_client):
+        """Тест обхода всех страниц листинга bucket'а (более 1000 ключей)."""
+        mock_s3_client = MagicMock()
+        mock_get_s3_client.return_value = mock_s3_client
+        mock_s3_client.list_objects_v2.side_effect = [
+            {
+                'Contents': [{'Key': 'book_1.pdf', 'Size': 1, 'LastModified': MagicMock()}],
+                'IsTruncated': True,
+                'NextContinuationToken': 'token-1'
+            },
+            {
+                'Contents': [{'Key': 'book_2.pdf', 'Size': 2, 'LastModified': MagicMock()}],
+                'IsTruncated': False
+            },
+        ]
+        mock_s3_client.head_object.return_value = {'Metadata': {}}
+
+        result = list_books_from_s3()
+
+        self.assertEqual([book['filename'] for book in result], ['book_1.pdf', 'book_2.pdf'])
+        second_call = mock_s3_client.list_objects_v2.call_args_list[1]
+        self.assertEqual(second_call.kwargs['ContinuationToken'], 'token-1')
+
+    @patch.object(extensions, 's3_presign_client', None)
+    @patch.object(Config, 'MINIO_PUBLIC_ENDPOINT', 'https://minio.example.com')
+    def test_generate_download_url_public_endpoint(self):
+        """Тест, что ссылка для браузера подписывается на публичный адрес MinIO."""
+        url = generate_download_url('book_1.pdf', public=True)
+        self.assertTrue(url.startswith(f'https://minio.example.com/{Config.MINIO_BUCKET_NAME}/book_1.pdf?'))
+
 if __name__ == '__main__':
     unittest.main()
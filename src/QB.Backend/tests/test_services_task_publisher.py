@@ -0,0 +1,68 @@
+"""Тесты для publisher'а задач RabbitMQ."""
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+import pika
+from app.services.task_publisher import TaskPublisher
+
+
+class TestTaskPublisher(unittest.TestCase):
+    """Тесты для TaskPublisher."""
+
+    def _make_connection(self):
+        """Создает mock соединения RabbitMQ с открытым каналом."""
+        connection = MagicMock()
+        connection.is_closed = False
+        connection.channel.return_value.is_closed = False
+        return connection
+
+    @patch('app.services.task_publisher.get_rabbitmq_connection')
+    def test_publish_reuses_connection_and_declares_queue_once(self, mock_get_connection):
+        """Проверяет, что соединение и объявление очереди переиспользуются между публикациями."""
+        connection = self._make_connection()
+        mock_get_connection.return_value = connection
+        publisher = TaskPublisher(pool_size=1, checkout_timeout=1)
+
+        publisher.publish('book_generation_queue', {'task_id': '1'})
+        publisher.publish('book_generation_queue', {'task_id': '2'})
+
+        mock_get_connection.assert_called_once()
+        channel = connection.channel.return_value
+        channel.confirm_delivery.assert_called_once()
+        channel.queue_declare.assert_called_once()
+        self.assertEqual(channel.basic_publish.call_count, 2)
+        body = channel.basic_publish.call_args.kwargs['body']
+        self.assertEqual(json.loads(body), {'task_id': '2'})
+
+    @patch('app.services.task_publisher.get_rabbitmq_connection')
+    def test_publish_reconnects_after_connection_loss(self, mock_get_connection):
+        """Проверяет прозрачное переподключение при разрыве соединения."""
+        broken, fresh = self._make_connection(), self._make_connection()
+        broken.channel.return_value.basic_publish.side_effect = pika.exceptions.StreamLostError()
+        mock_get_connection.side_effect = [broken, fresh]
+        publisher = TaskPublisher(pool_size=1, checkout_timeout=1)
+
+        publisher.publish('image_generation_queue', {'task_id': '1'}, priority=1)
+
+        fresh.channel.return_value.basic_publish.assert_called_once()
+        properties = fresh.channel.return_value.basic_publish.call_args.kwargs['properties']
+        self.assertEqual(properties.priority, 1)
+        self.assertEqual(publisher.stats()['available_channels'], 1)
+
+    @patch('app.services.task_publisher.get_rabbitmq_connection')
+    def test_publish_to_queue_with_previous_arguments(self, mock_get_connection):
+        """Проверяет публикацию в очередь, которую worker еще не перенес на новые аргументы."""
+        connection = self._make_connection()
+        closed_channel, channel = MagicMock(is_closed=True), MagicMock(is_closed=False)
+        closed_channel.queue_declare.side_effect = pika.exceptions.ChannelClosedByBroker(406, 'PRECONDITION_FAILED')
+        connection.channel.side_effect = [closed_channel, channel]
+        mock_get_connection.return_value = connection
+        publisher = TaskPublisher(pool_size=1, checkout_timeout=1)
+
+        publisher.publish('book_generation_queue', {'task_id': '1'})
+
+        channel.queue_declare.assert_called_once_with(queue='book_generation_queue', passive=True)
+        channel.basic_publish.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+"""Тесты для LRU кэша процесса."""
+import unittest
+from unittest.mock import patch
+from app.utils.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+    """Тесты для LRUCache."""
+
+    def test_evicts_least_recently_used(self):
+        """Проверяет вытеснение самой давно использованной записи."""
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['hits'], 3)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    @patch('app.utils.cache.time.monotonic')
+    def test_expired_entry_is_miss(self, mock_monotonic):
+        """Проверяет, что устаревшая запись не возвращается."""
+        mock_monotonic.return_value = 100
+        cache = LRUCache(maxsize=2, ttl=10)
+        cache.set('a', 1)
+
+        mock_monotonic.return_value = 111
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['size'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
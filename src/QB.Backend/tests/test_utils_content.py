@@ -5,6 +5,8 @@ from app.utils.content_generation import (
     generate_book_content,
     create_random_pdf_book,
     extract_text_from_pdf,
+    iter_pdf_text,
+    open_pdf_reader,
     get_random_quote
 )
 
@@ -49,6 +51,20 @@ class TestContentGeneration(unittest.TestCase):
         # Проверяет, что извлеченный текст не пустой
         self.assertIsInstance(extracted_text, str)
         self.assertTrue(extracted_text.strip()) # Проверяет, что строка не пуста после удаления пробелов.
+    def test_iter_pdf_text_stops_at_budget(self):
+        """Проверяет, что извлечение текста прекращается, как только набран лимит символов."""
+        from reportlab.pdfgen import canvas
+        buffer = io.BytesIO()
+        c = canvas.Canvas(buffer)
+        for number in range(1, 6):
+            c.drawString(100, 750, f"Page number {number}")
+            c.showPage()
+        c.save()
+
+        pages = list(iter_pdf_text(open_pdf_reader(buffer.getvalue()), max_chars=20))
+        # Первая страница короче лимита, со второй берется только остаток лимита
+        self.assertEqual(len(pages), 2)
+        self.assertEqual(len("".join(pages)), 20)
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""Тесты для серверного хранения сессии в Redis."""
+import unittest
+from unittest.mock import patch, MagicMock
+import json
+from flask import Flask, session
+from app.utils.session import RedisSessionInterface
+
+
+class TestRedisSession(unittest.TestCase):
+    """Тесты для RedisSessionInterface."""
+
+    def setUp(self):
+        """Создает приложение с сессией в Redis (хранилище подменено словарем)."""
+        self.store = {}
+        self.redis_conn = MagicMock()
+        self.redis_conn.get.side_effect = self.store.get
+        self.redis_conn.setex.side_effect = lambda key, ttl, value: self.store.__setitem__(key, value)
+        self.redis_conn.delete.side_effect = lambda key: self.store.pop(key, None)
+        patcher = patch('app.utils.session.get_redis_connection', return_value=self.redis_conn)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+        app = Flask(__name__)
+        app.secret_key = 'test'
+        app.session_interface = RedisSessionInterface()
+
+        @app.route('/login')
+        def login():
+            session['access_token'] = 'a' * 2000
+            session['refresh_token'] = 'r' * 2000
+            return ''
+
+        @app.route('/token')
+        def token():
+            return session.get('access_token', '')
+
+        @app.route('/logout')
+        def logout():
+            session.clear()
+            return ''
+
+        self.client = app.test_client()
+
+    def test_session_stored_in_redis(self):
+        """Тест, что токены хранятся в Redis, а cookie содержит только идентификатор сессии."""
+        response = self.client.get('/login')
+        cookie = response.headers['Set-Cookie']
+        self.assertLess(len(cookie), 200)
+        self.assertEqual(len(self.store), 1)
+        self.assertEqual(json.loads(next(iter(self.store.values())))['access_token'], 'a' * 2000)
+
+        self.assertEqual(self.client.get('/token').data.decode(), 'a' * 2000)
+        # Неизмененная сессия не перезаписывается, только продлевается
+        self.redis_conn.setex.assert_called_once()
+        self.redis_conn.expire.assert_called_once()
+
+    def test_session_cleared(self):
+        """Тест удаления сессии из Redis при очистке."""
+        self.client.get('/login')
+        response = self.client.get('/logout')
+        self.assertEqual(self.store, {})
+        self.assertIn('Expires=Thu, 01 Jan 1970', response.headers['Set-Cookie'])
+        self.assertEqual(self.client.get('/token').data.decode(), '')
+
+    def test_unknown_session_id(self):
+        """Тест, что неизвестный идентификатор сессии не используется для новой сессии."""
+        self.client.set_cookie('session', 'forged-id')
+        self.client.get('/login')
+        self.assertNotIn('session:forged-id', self.store)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+"""Тесты для генерации статических HTML страниц."""
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from app.config import Config
+from app.utils.static_files import generate_gallery_html, generate_library_html
+
+
+class TestStaticFiles(unittest.TestCase):
+    """Тесты для generate_gallery_html и generate_library_html."""
+
+    def setUp(self):
+        """Подменяет директорию статики временной."""
+        self.static_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.static_dir.cleanup)
+        patcher = patch.object(Config, 'STATIC_DIR', self.static_dir.name)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+    def _read(self, filename):
+        with open(os.path.join(self.static_dir.name, filename), encoding='utf-8') as f:
+            return f.read()
+
+    def test_gallery_html_written(self):
+        """Тест, что галерея записывается в gallery.html со списком изображений."""
+        open(os.path.join(self.static_dir.name, 'image_1.png'), 'wb').close()
+        generate_gallery_html()
+        content = self._read('gallery.html')
+        self.assertIn('/static/image_1.png', content)
+        self.assertNotIn('books-sentinel', content)
+
+    def test_library_html_keeps_next_cursor(self):
+        """Тест, что страница библиотеки содержит cursor следующей страницы для подгрузки."""
+        book = {'filename': 'book_1.pdf', 'title': 'Книга', 'author': 'GPN', 'description': '', 'size': 10}
+        content = generate_library_html([book], next_cursor='book_1.pdf')
+        self.assertIn('data-next-cursor="book_1.pdf"', content)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,12 +3,28 @@ import unittest
 from unittest.mock import patch, MagicMock
 import json
 import hashlib # Импортируем hashlib для хэширования
-from app.utils.task_helpers import cache_userinfo, get_cached_userinfo, invalidate_userinfo_cache
+from app.utils import task_helpers
+from app.utils.task_helpers import (
+    cache_userinfo, get_cached_userinfo, invalidate_userinfo_cache,
+    userinfo_l1_cache, USERINFO_INVALIDATION_CHANNEL,
+    acquire_token_refresh_lock, release_token_refresh_lock, get_token_refresh_result,
+    cache_rejected_token, is_token_rejected, rejected_token_l1_cache, get_rejected_token_cache_stats
+)
 from app.config import Config
 
 class TestTaskHelpers(unittest.TestCase):
     """Тесты для функций в task_helpers."""
 
+    def setUp(self):
+        """Сбрасывает L1 кэш и подписку на инвалидацию перед каждым тестом."""
+        userinfo_l1_cache.clear()
+        rejected_token_l1_cache.clear()
+        task_helpers._invalidation_listener = None
+        task_helpers._invalidation_listener_retry_at = 0
+        self.addCleanup(userinfo_l1_cache.clear)
+        self.addCleanup(rejected_token_l1_cache.clear)
+        self.addCleanup(setattr, task_helpers, '_invalidation_listener', None)
+
     def _hash_token(self, token):
         """Вспомогательная функция для хэширования токена с исп. sha256"""
         return hashlib.sha256(token.encode()).hexdigest()
@@ -83,6 +99,101 @@ class TestTaskHelpers(unittest.TestCase):
         self.assertTrue(result)
         # Проверяет, что был вызван метод delete у Redis клиента
         mock_redis_conn.delete.assert_called_once_with(expected_key)
+        # Остальные процессы оповещаются об инвалидации
+        mock_redis_conn.publish.assert_called_once_with(USERINFO_INVALIDATION_CHANNEL, expected_key)
+    @patch('app.utils.task_helpers.get_redis_connection')
+    def test_get_cached_userinfo_uses_l1_cache(self, mock_get_redis):
+        """Тест, что повторная проверка токена не обращается к Redis, а инвалидация сбрасывает L1."""
+        mock_redis_conn = MagicMock()
+        mock_get_redis.return_value = mock_redis_conn
+        test_token = "test_access_token_l1"
+        mock_redis_conn.get.return_value = json.dumps({"preferred_username": "l1user"})
+        hits_before = userinfo_l1_cache.stats()['hits']
+
+        self.assertEqual(get_cached_userinfo(test_token), {"preferred_username": "l1user"})
+        self.assertEqual(get_cached_userinfo(test_token), {"preferred_username": "l1user"})
+        mock_redis_conn.get.assert_called_once()
+        self.assertEqual(userinfo_l1_cache.stats()['hits'], hits_before + 1)
+
+        invalidate_userinfo_cache(test_token)
+        mock_redis_conn.get.return_value = None
+        self.assertIsNone(get_cached_userinfo(test_token))
+    @patch('app.utils.task_helpers.get_redis_connection')
+    def test_get_cached_userinfo_skips_l1_without_listener(self, mock_get_redis):
+        """Тест, что без подписки на инвалидацию L1 кэш не используется."""
+        mock_redis_conn = MagicMock()
+        mock_get_redis.return_value = mock_redis_conn
+        mock_redis_conn.pubsub.side_effect = Exception("Connection refused")
+        mock_redis_conn.get.return_value = json.dumps({"preferred_username": "user"})
+
+        get_cached_userinfo("token")
+        get_cached_userinfo("token")
+
+        self.assertEqual(mock_redis_conn.get.call_count, 2)
+    @patch('app.utils.task_helpers.get_redis_connection')
+    def test_rejected_token_cache(self, mock_get_redis):
+        """Тест кэша отклоненных токенов: Redis проверяется один раз, затем ответ берется из памяти."""
+        mock_redis_conn = MagicMock()
+        mock_get_redis.return_value = mock_redis_conn
+        expected_key = f"userinfo:rejected:{self._hash_token('revoked')}"
+        avoided_before = get_rejected_token_cache_stats()['keycloak_calls_avoided']
+
+        mock_redis_conn.exists.return_value = 0
+        self.assertFalse(is_token_rejected('revoked'))
+
+        # Токен отклонен в другом процессе
+        mock_redis_conn.exists.return_value = 1
+        self.assertTrue(is_token_rejected('revoked'))
+        self.assertTrue(is_token_rejected('revoked'))
+        self.assertEqual(mock_redis_conn.exists.call_count, 2)
+        self.assertEqual(get_rejected_token_cache_stats()['keycloak_calls_avoided'], avoided_before + 2)
+
+        self.assertTrue(cache_rejected_token('other'))
+        mock_redis_conn.setex.assert_called_once_with(
+            f"userinfo:rejected:{self._hash_token('other')}", Config.REJECTED_TOKEN_CACHE_TTL, "1")
+        mock_redis_conn.exists.assert_called_with(expected_key)
+    @patch('app.utils.task_helpers.get_redis_connection')
+    def test_acquire_token_refresh_lock(self, mock_get_redis):
+        """Тест захвата блокировки обновления токенов через SET NX."""
+        mock_redis_conn = MagicMock()
+        mock_get_redis.return_value = mock_redis_conn
+        expected_key = f"token_refresh:{self._hash_token('refresh')}:lock"
+
+        mock_redis_conn.set.return_value = True
+        lock_token = acquire_token_refresh_lock('refresh')
+        self.assertTrue(lock_token)
+        mock_redis_conn.set.assert_called_once_with(expected_key, lock_token, nx=True, ex=Config.TOKEN_REFRESH_LOCK_TTL)
+        # Блокировка переживает полный таймаут запроса в Keycloak
+        self.assertGreater(Config.TOKEN_REFRESH_LOCK_TTL, Config.KEYCLOAK_CONNECT_TIMEOUT + Config.KEYCLOAK_READ_TIMEOUT)
+
+        # Освобождение только владельцем блокировки
+        mock_redis_conn.eval.return_value = 0
+        release_token_refresh_lock('refresh', 'other-token')
+        self.assertEqual(mock_redis_conn.eval.call_args.args[2:], (expected_key, 'other-token'))
+        mock_redis_conn.delete.assert_not_called()
+
+        mock_redis_conn.set.return_value = None
+        self.assertFalse(acquire_token_refresh_lock('refresh'))
+
+        mock_redis_conn.set.side_effect = Exception("Connection refused")
+        self.assertIsNone(acquire_token_refresh_lock('refresh'))
+    @patch('app.utils.task_helpers.get_redis_connection')
+    def test_get_token_refresh_result_waits_for_lock_holder(self, mock_get_redis):
+        """Тест ожидания результата обновления, пока блокировку держит другой запрос."""
+        mock_redis_conn = MagicMock()
+        mock_get_redis.return_value = mock_redis_conn
+        tokens = {'access_token': 'new_token', 'refresh_token': 'new_refresh'}
+        mock_redis_conn.get.side_effect = [None, json.dumps(tokens)]
+        mock_redis_conn.exists.return_value = 1
+
+        self.assertEqual(get_token_refresh_result('refresh', timeout=1), tokens)
+
+        # Блокировка снята без результата - ожидание прекращается сразу
+        mock_redis_conn.get.side_effect = None
+        mock_redis_conn.get.return_value = None
+        mock_redis_conn.exists.return_value = 0
+        self.assertIsNone(get_token_refresh_result('refresh', timeout=1))
+        self.assertEqual(mock_redis_conn.get.call_count, 3)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,42 @@
+"""Тесты для статусов задач и индекса задач пользователя."""
+import unittest
+from unittest.mock import MagicMock
+import json
+from app.utils.task_status import save_task_status, get_user_tasks, TASK_STATUS_TTL
+
+
+class TestTaskStatus(unittest.TestCase):
+    """Тесты для функций в task_status."""
+
+    def test_save_task_status_updates_user_index(self):
+        """Тест записи статуса, обновления индекса задач пользователя и публикации события одним pipeline."""
+        redis_conn = MagicMock()
+        pipe = redis_conn.pipeline.return_value
+
+        task_data = save_task_status(redis_conn, 'task-1', 'processing', 'Генерация', 50, user_id='user')
+
+        pipe.hset.assert_called_once_with('task_status:task-1', mapping=task_data)
+        pipe.expire.assert_any_call('task_status:task-1', TASK_STATUS_TTL)
+        pipe.zadd.assert_called_once_with('user_tasks:user', {'task-1': task_data['updated_at']})
+        pipe.publish.assert_called_once_with('task_events:user', json.dumps(dict(task_data, task_id='task-1')))
+        pipe.execute.assert_called_once()
+
+    def test_get_user_tasks(self):
+        """Тест чтения задач пользователя без обхода всех ключей Redis."""
+        redis_conn = MagicMock()
+        index_pipe, status_pipe = MagicMock(), MagicMock()
+        redis_conn.pipeline.side_effect = [index_pipe, status_pipe]
+        index_pipe.execute.return_value = [0, ['task-1', 'task-2']]
+        status_pipe.execute.return_value = [
+            {'status': 'completed', 'message': 'Готово', 'progress': '100', 'updated_at': '1700000000'}, {}
+        ]
+
+        tasks = get_user_tasks(redis_conn, 'user')
+
+        self.assertEqual(tasks, [('task-1', {'status': 'completed', 'message': 'Готово',
+                                              'progress': 100, 'updated_at': 1700000000})])
+        self.assertEqual(status_pipe.hgetall.call_count, 2)
+        redis_conn.keys.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+"""Тесты для потребителя очередей worker'а."""
+import unittest
+from unittest.mock import MagicMock
+from app.worker.worker_main import ThreadSafeChannel
+
+
+class TestThreadSafeChannel(unittest.TestCase):
+    """Тесты для ThreadSafeChannel."""
+
+    def test_ack_scheduled_on_connection_thread(self):
+        """Тест, что ack/nack выполняются через add_callback_threadsafe, а не напрямую."""
+        connection = MagicMock()
+        channel = MagicMock()
+        safe_channel = ThreadSafeChannel(connection, channel)
+
+        safe_channel.basic_ack(delivery_tag=1)
+        safe_channel.basic_nack(delivery_tag=2, requeue=False)
+        channel.basic_ack.assert_not_called()
+        self.assertEqual(connection.add_callback_threadsafe.call_count, 2)
+
+        for call in connection.add_callback_threadsafe.call_args_list:
+            call.args[0]()
+        channel.basic_ack.assert_called_once_with(delivery_tag=1)
+        channel.basic_nack.assert_called_once_with(delivery_tag=2, requeue=False)
+
+    def test_ack_on_closed_connection(self):
+        """Тест, что ошибка закрытого соединения не прерывает обработчик задачи."""
+        connection = MagicMock()
+        connection.add_callback_threadsafe.side_effect = Exception("connection closed")
+        ThreadSafeChannel(connection, MagicMock()).basic_ack(delivery_tag=1)
+
+if __name__ == '__main__':
+    unittest.main()
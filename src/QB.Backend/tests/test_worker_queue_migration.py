@@ -0,0 +1,93 @@
+"""Тесты для переноса очередей задач на новые аргументы объявления."""
+import unittest
+from unittest.mock import patch, MagicMock
+import pika
+from app.worker.queue_migration import (
+    migrate_queue, migrate_task_queues, migration_queue_name, MIGRATION_LOCK_KEY
+)
+from app.utils.queues import BOOK_GENERATION_QUEUE, queue_arguments
+
+
+class TestQueueMigration(unittest.TestCase):
+    """Тесты для migrate_queue."""
+
+    def test_queue_with_current_arguments_not_migrated(self):
+        """Тест, что очередь с актуальными аргументами не пересоздается."""
+        channel = MagicMock()
+        # Временной очереди нет - пассивное объявление закрывает канал с 404
+        channel.queue_declare.side_effect = [None, pika.exceptions.ChannelClosedByBroker(404, 'NOT_FOUND')]
+        connection = MagicMock()
+        connection.channel.return_value = channel
+
+        self.assertFalse(migrate_queue(connection, BOOK_GENERATION_QUEUE))
+        channel.queue_delete.assert_not_called()
+
+    def test_queue_recreated_with_messages(self):
+        """Тест пересоздания очереди с переносом сообщений через временную очередь."""
+        temp_queue = migration_queue_name(BOOK_GENERATION_QUEUE)
+        queues = {BOOK_GENERATION_QUEUE: [b'task-1', b'task-2'], temp_queue: []}
+        channel = MagicMock()
+        channel.queue_declare.side_effect = [pika.exceptions.ChannelClosedByBroker(406, 'PRECONDITION_FAILED'),
+                                             None, None]
+        channel.basic_get.side_effect = lambda queue, auto_ack: (
+            (MagicMock(), MagicMock(), queues[queue].pop(0)) if queues[queue] else (None, None, None))
+        channel.basic_publish.side_effect = lambda exchange, routing_key, body, properties: \
+            queues[routing_key].append(body)
+        connection = MagicMock()
+        connection.channel.return_value = channel
+
+        self.assertTrue(migrate_queue(connection, BOOK_GENERATION_QUEUE))
+
+        self.assertEqual(queues[BOOK_GENERATION_QUEUE], [b'task-1', b'task-2'])
+        channel.queue_delete.assert_any_call(queue=BOOK_GENERATION_QUEUE, if_empty=True, if_unused=True)
+        channel.queue_delete.assert_any_call(queue=temp_queue, if_empty=True, if_unused=True)
+        self.assertEqual(channel.queue_declare.call_args.kwargs['arguments'], queue_arguments(BOOK_GENERATION_QUEUE))
+        self.assertEqual(queue_arguments(BOOK_GENERATION_QUEUE), {'x-max-priority': 9})
+
+    def test_leftover_temp_queue_not_deleted_while_draining(self):
+        """Тест, что непустая временная очередь (ее дочищает другой worker) не удаляется."""
+        channel = MagicMock()
+        channel.queue_declare.return_value = None
+        channel.basic_get.return_value = (None, None, None)
+        channel.queue_delete.side_effect = pika.exceptions.ChannelClosedByBroker(406, 'PRECONDITION_FAILED')
+        connection = MagicMock()
+        connection.channel.return_value = channel
+
+        self.assertFalse(migrate_queue(connection, BOOK_GENERATION_QUEUE))
+        channel.queue_delete.assert_called_once_with(queue=migration_queue_name(BOOK_GENERATION_QUEUE),
+                                                     if_empty=True, if_unused=True)
+
+    def test_old_queue_deleted_after_consumers_detach(self):
+        """Тест, что очередь с потребителями прежней версии удаляется только после их отключения."""
+        channel = MagicMock()
+        channel.queue_declare.side_effect = [pika.exceptions.ChannelClosedByBroker(406, 'PRECONDITION_FAILED'),
+                                             None, None]
+        channel.basic_get.return_value = (None, None, None)
+        channel.queue_delete.side_effect = [pika.exceptions.ChannelClosedByBroker(406, 'PRECONDITION_FAILED'),
+                                            None, None]
+        connection = MagicMock()
+        connection.channel.return_value = channel
+
+        self.assertTrue(migrate_queue(connection, BOOK_GENERATION_QUEUE))
+        connection.process_data_events.assert_called_once_with(time_limit=2)
+        self.assertEqual(channel.queue_delete.call_args_list[1].kwargs,
+                         {'queue': BOOK_GENERATION_QUEUE, 'if_empty': True, 'if_unused': True})
+
+    @patch('app.worker.queue_migration.migrate_queue')
+    @patch('app.worker.queue_migration.get_redis_connection')
+    def test_migration_waits_for_lock(self, mock_get_redis, mock_migrate_queue):
+        """Тест, что перенос начинается только после освобождения блокировки другим экземпляром."""
+        redis_conn = mock_get_redis.return_value
+        redis_conn.set.side_effect = [None, True]
+        connection = MagicMock()
+
+        migrate_task_queues(connection)
+
+        connection.process_data_events.assert_called_once_with(time_limit=1)
+        self.assertEqual(redis_conn.set.call_args.args[0], MIGRATION_LOCK_KEY)
+        self.assertTrue(mock_migrate_queue.called)
+        lock_token = redis_conn.set.call_args.args[1]
+        self.assertEqual(redis_conn.eval.call_args.args[2:], (MIGRATION_LOCK_KEY, lock_token))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+"""Тесты для supervisor'а процессов worker'а."""
+import unittest
+from unittest.mock import patch, MagicMock
+from app.worker import supervisor
+from app.worker.supervisor import WorkerSupervisor, parse_queue_settings
+from app.utils.queues import BOOK_GENERATION_QUEUE, LARGE_BOOK_GENERATION_QUEUE
+
+
+class TestWorkerSupervisor(unittest.TestCase):
+    """Тесты для WorkerSupervisor и настроек очередей."""
+
+    def test_parse_queue_settings(self):
+        """Тест разбора настроек очередей поверх значений по умолчанию."""
+        defaults = {BOOK_GENERATION_QUEUE: 2, LARGE_BOOK_GENERATION_QUEUE: 4}
+        settings = parse_queue_settings(f" {LARGE_BOOK_GENERATION_QUEUE}=8, unknown=3,{BOOK_GENERATION_QUEUE}=x",
+                                        defaults)
+        self.assertEqual(settings, {BOOK_GENERATION_QUEUE: 2, LARGE_BOOK_GENERATION_QUEUE: 8})
+
+    def _make_supervisor(self):
+        context = MagicMock()
+        context.Process.side_effect = lambda **kwargs: MagicMock(name=kwargs['name'])
+        target = MagicMock()
+        worker_supervisor = WorkerSupervisor({BOOK_GENERATION_QUEUE: (2, 3)}, target,
+                                             shutdown_timeout=0, context=context)
+        return worker_supervisor, context, target
+
+    def test_start_and_restart_crashed_child(self):
+        """Тест запуска процессов по очередям и перезапуска упавшего процесса."""
+        worker_supervisor, context, target = self._make_supervisor()
+        worker_supervisor.start()
+        self.assertEqual(context.Process.call_count, 2)
+        context.Process.assert_called_with(target=target, args=(BOOK_GENERATION_QUEUE, 3),
+                                           name=f"worker-{BOOK_GENERATION_QUEUE}-1")
+
+        crashed = worker_supervisor._children[(BOOK_GENERATION_QUEUE, 0)]
+        crashed.is_alive.return_value = False
+        worker_supervisor._children[(BOOK_GENERATION_QUEUE, 1)].is_alive.return_value = True
+
+        # Сразу после запуска процесс не перезапускается
+        worker_supervisor.check_children()
+        self.assertEqual(context.Process.call_count, 2)
+
+        with patch.object(supervisor, 'RESTART_DELAY', 0):
+            worker_supervisor.check_children()
+        self.assertEqual(context.Process.call_count, 3)
+        self.assertIsNot(worker_supervisor._children[(BOOK_GENERATION_QUEUE, 0)], crashed)
+
+    def test_stop_terminates_and_kills_stuck_children(self):
+        """Тест остановки: SIGTERM всем процессам, kill - не завершившимся вовремя."""
+        worker_supervisor, context, target = self._make_supervisor()
+        worker_supervisor.start()
+        for process in worker_supervisor._children.values():
+            process.is_alive.return_value = True
+
+        worker_supervisor.stop()
+
+        for process in worker_supervisor._children.values():
+            process.terminate.assert_called_once()
+            process.kill.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+"""Тесты для записи прогресса задач worker'а."""
+import unittest
+import json
+from unittest.mock import patch, MagicMock
+from app.worker.task_progress import TaskProgressReporter
+from app.worker.task_handlers import process_large_book_generation
+
+
+class TestTaskProgressReporter(unittest.TestCase):
+    """Тесты для TaskProgressReporter."""
+
+    @patch('app.worker.task_progress.save_task_status')
+    @patch('app.worker.task_progress.get_redis_connection')
+    def test_progress_is_throttled(self, mock_get_redis, mock_save):
+        """Тест, что промежуточный прогресс пишется с ограничением частоты, а смена статуса - сразу."""
+        reporter = TaskProgressReporter('task-1', 'user', interval=60)
+
+        self.assertTrue(reporter.update("processing", "Строка 50", 35))
+        for line in range(100, 1000, 50):
+            self.assertFalse(reporter.update("processing", f"Строка {line}", 40))
+        self.assertEqual(mock_save.call_count, 1)
+
+        self.assertTrue(reporter.update("completed", "Готово", 100))
+        mock_save.assert_called_with(mock_get_redis.return_value, 'task-1', "completed", "Готово", 100,
+                                     user_id='user')
+
+    @patch('app.worker.task_progress.save_task_status')
+    @patch('app.worker.task_progress.get_redis_connection')
+    def test_flush_writes_pending_progress(self, mock_get_redis, mock_save):
+        """Тест записи отложенного прогресса в flush()."""
+        reporter = TaskProgressReporter('task-1', interval=60)
+        reporter.update("processing", "Строка 50", 35)
+        reporter.update("processing", "Строка 100", 40)
+
+        reporter.flush()
+
+        mock_save.assert_called_with(mock_get_redis.return_value, 'task-1', "processing", "Строка 100", 40,
+                                     user_id=None)
+        self.assertEqual(mock_save.call_count, 2)
+
+    @patch('app.worker.task_handlers.retry_task')
+    @patch('app.worker.task_handlers.create_large_pdf_book', side_effect=RuntimeError("reportlab"))
+    @patch('app.worker.task_handlers.time.sleep')
+    @patch('app.worker.task_handlers.get_s3_client')
+    @patch('app.worker.task_handlers.TaskProgressReporter')
+    def test_handler_flushes_progress_on_error(self, mock_reporter_class, mock_get_s3, mock_sleep,
+                                               mock_create_book, mock_retry):
+        """Тест, что обработчик записывает отложенный прогресс при выходе с ошибкой."""
+        body = json.dumps({'task_id': 'task-1', 'user_id': 'user'}).encode()
+        process_large_book_generation(MagicMock(), MagicMock(), MagicMock(), body)
+
+        mock_retry.assert_called_once()
+        mock_reporter_class.return_value.flush.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
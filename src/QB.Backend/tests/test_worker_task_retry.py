@@ -0,0 +1,101 @@
+"""Тесты для повтора задач worker'а и очереди .dlq."""
+import unittest
+from unittest.mock import patch, MagicMock
+import pika
+from app.worker.task_retry import retry_task, dead_letter_task
+from app.worker.dlq import replay_dead_letters, _describe
+from app.worker.worker_main import ThreadSafeChannel
+from app.utils.queues import (
+    BOOK_GENERATION_QUEUE, RETRY_COUNT_HEADER, DEAD_LETTER_REASON_HEADER,
+    retry_delay, retry_queue_name, dead_letter_queue_name, declare_retry_queues
+)
+
+
+@patch('app.config.Config.TASK_RETRY_MAX_DELAY', 60)
+@patch('app.config.Config.TASK_RETRY_BASE_DELAY', 5)
+@patch('app.config.Config.TASK_MAX_ATTEMPTS', 3)
+class TestTaskRetry(unittest.TestCase):
+    """Тесты для retry_task, dead_letter_task и replay_dead_letters."""
+
+    def setUp(self):
+        self.channel = MagicMock()
+        # Обработчики работают с ThreadSafeChannel; колбэки потока соединения выполняются сразу
+        connection = MagicMock()
+        connection.add_callback_threadsafe.side_effect = lambda callback: callback()
+        self.safe_channel = ThreadSafeChannel(connection, self.channel)
+        self.method = MagicMock(routing_key=BOOK_GENERATION_QUEUE, delivery_tag=7)
+
+    def _published(self):
+        kwargs = self.channel.basic_publish.call_args.kwargs
+        return kwargs['routing_key'], kwargs['properties'].headers
+
+    def test_retry_delay_backoff(self):
+        """Тест экспоненциальной задержки с ограничением сверху."""
+        self.assertEqual([retry_delay(attempt) for attempt in range(1, 6)], [5, 10, 20, 40, 60])
+
+    def test_retry_goes_to_delay_queue(self):
+        """Тест, что повтор откладывается в очередь ожидания, а исходное сообщение подтверждается."""
+        properties = pika.BasicProperties(headers={RETRY_COUNT_HEADER: 1}, priority=1)
+        retry_task(self.safe_channel, self.method, properties, b'{}', "S3 недоступен")
+
+        routing_key, headers = self._published()
+        self.assertEqual(routing_key, retry_queue_name(BOOK_GENERATION_QUEUE, 10))
+        self.assertEqual(headers[RETRY_COUNT_HEADER], 2)
+        self.assertEqual(self.channel.basic_publish.call_args.kwargs['properties'].priority, 1)
+        self.assertTrue(self.channel.basic_publish.call_args.kwargs['mandatory'])
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=7)
+        self.channel.basic_nack.assert_not_called()
+
+    def test_retry_requeues_when_publish_not_confirmed(self):
+        """Тест, что исходное сообщение возвращается в очередь, если брокер не принял копию."""
+        self.channel.basic_publish.side_effect = pika.exceptions.NackError([])
+        retry_task(self.safe_channel, self.method, pika.BasicProperties(), b'{}', "S3 недоступен")
+
+        self.channel.basic_ack.assert_not_called()
+        self.channel.basic_nack.assert_called_once_with(delivery_tag=7, requeue=True)
+
+    def test_exhausted_retries_go_to_dlq(self):
+        """Тест переноса задачи в .dlq после TASK_MAX_ATTEMPTS попыток."""
+        properties = pika.BasicProperties(headers={RETRY_COUNT_HEADER: 2})
+        retry_task(self.safe_channel, self.method, properties, b'{}', "S3 недоступен")
+
+        routing_key, headers = self._published()
+        self.assertEqual(routing_key, dead_letter_queue_name(BOOK_GENERATION_QUEUE))
+        self.assertIn("S3 недоступен", headers[DEAD_LETTER_REASON_HEADER])
+        self.channel.basic_ack.assert_called_once_with(delivery_tag=7)
+
+    def test_declare_retry_queues(self):
+        """Тест объявления очередей ожидания с TTL и возвратом в исходную очередь."""
+        declare_retry_queues(self.channel, BOOK_GENERATION_QUEUE)
+        declared = {call.kwargs['queue']: call.kwargs.get('arguments') for call in self.channel.queue_declare.call_args_list}
+        self.assertEqual(set(declared), {retry_queue_name(BOOK_GENERATION_QUEUE, 5),
+                                         retry_queue_name(BOOK_GENERATION_QUEUE, 10),
+                                         dead_letter_queue_name(BOOK_GENERATION_QUEUE)})
+        arguments = declared[retry_queue_name(BOOK_GENERATION_QUEUE, 10)]
+        self.assertEqual(arguments['x-message-ttl'], 10000)
+        self.assertEqual(arguments['x-dead-letter-routing-key'], BOOK_GENERATION_QUEUE)
+
+    def test_replay_resets_attempts(self):
+        """Тест возврата задач из .dlq в очередь со сброшенным счетчиком попыток."""
+        dead_letter_task(self.safe_channel, self.method, pika.BasicProperties(headers={RETRY_COUNT_HEADER: 2}),
+                         b'{"task_id": "t1"}', "ошибка")
+        _, headers = self._published()
+        self.channel.basic_get.side_effect = [
+            (MagicMock(delivery_tag=1), pika.BasicProperties(headers=headers), b'{"task_id": "t1"}'),
+            (None, None, None),
+        ]
+        self.channel.basic_publish.reset_mock()
+
+        self.assertEqual(replay_dead_letters(self.channel, BOOK_GENERATION_QUEUE, 10), 1)
+        routing_key, headers = self._published()
+        self.assertEqual(routing_key, BOOK_GENERATION_QUEUE)
+        self.assertIsNone(headers)
+        self.channel.basic_ack.assert_called_with(delivery_tag=1)
+
+    def test_describe_tolerates_malformed_retry_header(self):
+        """Тест описания сообщения .dlq с некорректным заголовком счетчика попыток."""
+        properties = pika.BasicProperties(headers={RETRY_COUNT_HEADER: 'abc'})
+        self.assertEqual(_describe(properties, b'{"task_id": "t1"}')['attempts'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,4 +12,8 @@ logger = logging.getLogger(__name__)
 from app.worker.worker_main import main
 
 if __name__ == "__main__":
+    if sys.argv[1:2] == ['dlq']:
+        # Просмотр и повторная постановка задач из очередей .dlq
+        from app.worker.dlq import main as dlq_main
+        sys.exit(dlq_main(sys.argv[2:]))
     main()
\ No newline at end of file